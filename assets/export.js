@@ -0,0 +1,23 @@
+// Links to the export of the displayed data (see main.py, export_co2_development):
+// the query of the export route is built from the current inputs of the section, the data is streamed on download.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    export: {
+        co2_development_links: function(grouping, years, countries, references, store) {
+            const query = new URLSearchParams();
+            if (grouping) {
+                query.append('grouping', grouping);
+            }
+            (years || []).forEach(function(year) { query.append('years', year); });
+            (countries || []).forEach(function(country) { query.append('countries', country); });
+            // references as pairs of coordinates and location
+            (references || []).forEach(function(reference) {
+                query.append('coordinates', reference.coordinates || '');
+                query.append('location', reference.location || '');
+            });
+
+            return ['csv', 'parquet'].map(function(format) {
+                return store.url + '?' + query.toString() + '&format=' + format;
+            });
+        }
+    }
+});
@@ -0,0 +1,47 @@
+// Lazy rendering of the sections below the fold (see main.py, lazy_sections):
+// the visibility store of a section is set as soon as the section is scrolled into view
+// or reached through its navigation link, the figures of the section are rendered afterwards.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    lazy_sections: {
+        observer: null,
+
+        observe: function() {
+            const sections = arguments[arguments.length - 1];
+            const dash_clientside = window.dash_clientside;
+            const triggered = (dash_clientside.callback_context.triggered || []).map(function(item) {
+                return item.prop_id.split('.')[0];
+            });
+
+            // without IntersectionObserver (old browsers) all sections are rendered at once
+            if (!('IntersectionObserver' in window)) {
+                return sections.map(function() { return true; });
+            }
+
+            // initial call: observe the sections (each section only until it has been visible once)
+            if (dash_clientside.lazy_sections.observer === null) {
+                const observer = new IntersectionObserver(function(entries) {
+                    entries.forEach(function(entry) {
+                        if (entry.isIntersecting) {
+                            const section = sections.find(function(item) { return item.section === entry.target.id; });
+                            dash_clientside.set_props(section.store, {data: true});
+                            observer.unobserve(entry.target);
+                        }
+                    });
+                }, {rootMargin: '200px 0px'});
+
+                sections.forEach(function(item) {
+                    const element = document.getElementById(item.section);
+                    if (element) {
+                        observer.observe(element);
+                    }
+                });
+                dash_clientside.lazy_sections.observer = observer;
+            }
+
+            // navigation link clicked: section is rendered immediately
+            return sections.map(function(item) {
+                return triggered.includes(item.link) ? true : dash_clientside.no_update;
+            });
+        }
+    }
+});
@@ -0,0 +1,23 @@
+// Size and zoom state of the world heatmap (see main.py, global_anomalies): the size of the figure is
+// recorded on page load and the geo properties of every zoom or pan are merged into the map view,
+// so that the callback can choose the grid level and the visible cells.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    map_view: {
+        update: function(relayoutData, mapView) {
+            const graph = document.getElementById(window.dash_clientside.callback_context.inputs_list[0].id);
+            const view = Object.assign({}, mapView);
+
+            if (graph && graph.offsetWidth) {
+                view.width = graph.offsetWidth;
+                view.height = graph.offsetHeight;
+            }
+            Object.keys(relayoutData || {}).forEach(function(key) {
+                if (key.startsWith('geo.')) {
+                    view[key] = relayoutData[key];
+                }
+            });
+
+            return view;
+        }
+    }
+});
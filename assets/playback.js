@@ -0,0 +1,117 @@
+// Playback of the world heatmap (see main.py, playback_frames): the frames are streamed in chunks,
+// the grid geometry is set once and every frame only updates the colors of the grid cells.
+// Frames are differences to the previous frame (hundredths of °C as 16 bit integers, see stream_playback_frames).
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    playback: {
+        state: null,
+
+        stop: function(state) {
+            state.stopped = true;
+            clearInterval(state.timer);
+            if (state.reader) {
+                state.reader.cancel();
+            }
+            window.dash_clientside.set_props(state.settings.button, {children: 'Play'});
+            window.dash_clientside.playback.state = null;
+        },
+
+        start: function(state) {
+            const header = state.header;
+            const graph = state.graph;
+            const values = new Int16Array(header.latitudes.length);
+            values.fill(0);
+
+            // heatmap trace (colored by the color axis), geometry of the playback grid
+            const index = graph.data.findIndex(function(trace) {
+                return trace.marker && trace.marker.coloraxis === 'coloraxis';
+            });
+            const size = Math.min(graph.clientWidth / 360, graph.clientHeight / 180) * header.cell_size;
+            Plotly.restyle(graph, {lat: [header.latitudes], lon: [header.longitudes], 'marker.size': size}, [index]);
+            Plotly.relayout(graph, {'coloraxis.cmin': -Math.max(-header.range[0], header.range[1]),
+                                    'coloraxis.cmax': Math.max(-header.range[0], header.range[1])});
+
+            state.timer = setInterval(function() {
+                if (state.position >= state.frames.length) {
+                    // all frames shown (otherwise waiting for the next chunk)
+                    if (state.position >= header.labels.length) {
+                        window.dash_clientside.playback.stop(state);
+                    }
+                    return;
+                }
+                const delta = state.frames[state.position];
+                for (let cell = 0; cell < values.length; cell++) {
+                    values[cell] += delta[cell];
+                }
+                const colors = Array.from(values, function(value) {
+                    return value === header.missing ? null : value * header.scale;
+                });
+                Plotly.restyle(graph, {'marker.color': [colors]}, [index]);
+                window.dash_clientside.set_props(state.settings.label, {children: header.labels[state.position]});
+                state.position += 1;
+            }, state.settings.frame_duration);
+        },
+
+        toggle: function(n_clicks, step, layer, settings) {
+            const playback = window.dash_clientside.playback;
+
+            // running playback is stopped
+            if (playback.state !== null) {
+                playback.stop(playback.state);
+                return window.dash_clientside.no_update;
+            }
+            // only the grid cells are played back
+            if (layer !== 'grid') {
+                return window.dash_clientside.no_update;
+            }
+
+            const container = document.getElementById(settings.graph);
+            const state = {settings: settings, graph: container.querySelector('.js-plotly-plot'), header: null,
+                           frames: [], position: 0, stopped: false, timer: null, reader: null};
+            playback.state = state;
+
+            fetch(settings.url + step).then(function(response) {
+                const reader = response.body.getReader();
+                let buffer = new Uint8Array(0);
+                state.reader = reader;
+
+                function read() {
+                    return reader.read().then(function(result) {
+                        if (result.done || state.stopped) {
+                            return;
+                        }
+                        const joined = new Uint8Array(buffer.length + result.value.length);
+                        joined.set(buffer);
+                        joined.set(result.value, buffer.length);
+                        buffer = joined;
+
+                        // header line (JSON), the playback starts with the first frames
+                        if (state.header === null) {
+                            const end = buffer.indexOf(10);
+                            if (end < 0) {
+                                return read();
+                            }
+                            state.header = JSON.parse(new TextDecoder().decode(buffer.slice(0, end)));
+                            buffer = buffer.slice(end + 1);
+                            playback.start(state);
+                        }
+
+                        // complete frames of the chunk
+                        const frameBytes = state.header.latitudes.length * 2;
+                        while (buffer.length >= frameBytes) {
+                            state.frames.push(new Int16Array(buffer.slice(0, frameBytes).buffer));
+                            buffer = buffer.slice(frameBytes);
+                        }
+                        return read();
+                    });
+                }
+                return read();
+            }).catch(function() {
+                if (!state.stopped) {
+                    playback.stop(state);
+                }
+            });
+
+            return 'Stop';
+        }
+    }
+});
@@ -0,0 +1,89 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# APP OF THE LOAD TESTS: the dashboard with a local geocoder stub instead of Nominatim (no network access)
+# python -m benchmarks.geocoder_stub (development server on port 8051) or
+# gunicorn -c gunicorn.conf.py 'benchmarks.geocoder_stub:create_load_test_app()'
+import math
+import os
+import time
+
+# known places of the stub: (city, country, latitude, longitude)
+STUB_PLACES = [
+    ('Kassel', 'Germany', 51.3154546, 9.4924096),
+    ('Berlin', 'Germany', 52.5170365, 13.3888599),
+    ('Paris', 'France', 48.8588897, 2.3200410),
+    ('Delhi', 'India', 28.6517178, 77.2219388),
+    ('Niamey', 'Niger', 13.5248338, 2.1098163),
+    ('Lagos', 'Nigeria', 6.4550575, 3.3941795),
+    ('New York', 'United States', 40.7127281, -74.0060152),
+    ('Sao Paulo', 'Brazil', -23.5506507, -46.6333824),
+    ('Sydney', 'Australia', -33.8698439, 151.2082848),
+    ('Tokyo', 'Japan', 35.6768601, 139.7638947),
+]
+
+
+class StubLocation:
+    """
+    Result of the geocoder stub (same attributes as the results of geopy used by the dashboard)
+    """
+
+    def __init__(self, city, country, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.raw = {'address': {'city': city, 'country': country}}
+
+
+class StubGeolocator:
+    """
+    Local replacement of the Nominatim geocoder for load tests (see create_load_test_app). Only the places in
+    STUB_PLACES are known, reverse geocoding returns the nearest known place within max_distance degrees.
+    The latency of the geocoding service can be simulated via the environment variable GEOCODER_STUB_LATENCY
+    (seconds).
+    """
+
+    def __init__(self, max_distance=10):
+        """
+        :param max_distance: maximum distance in degrees for reverse geocoding (otherwise no location, i.e. oceans)
+        """
+        self.max_distance = max_distance
+        self.latency = float(os.environ.get('GEOCODER_STUB_LATENCY', 0))
+
+    def geocode(self, query):
+        """
+        :param query: location (city, country)
+        :return: location of the known place, None if unknown
+        """
+        time.sleep(self.latency)
+        for city, country, latitude, longitude in STUB_PLACES:
+            if query.lower().replace(' ', '') in (city.lower().replace(' ', ''),
+                                                  f'{city},{country}'.lower().replace(' ', '')):
+                return StubLocation(city, country, latitude, longitude)
+
+        return None
+
+    def reverse(self, coordinates, language=None):
+        """
+        :param coordinates: latitude, longitude
+        :param language: not used (always english)
+        :return: location of the nearest known place, None if too far away
+        """
+        time.sleep(self.latency)
+        latitude, longitude = coordinates
+        distance, place = min((math.hypot(place[2] - latitude, place[3] - longitude), place) for place in STUB_PLACES)
+        if distance > self.max_distance:
+            return None
+
+        return StubLocation(*place)
+
+
+def create_load_test_app():
+    """
+    Creates the Dash application with the geocoder stub (see create_app in main.py)
+
+    :return: Dash application
+    """
+    from main import create_app
+    return create_app(geolocator=StubGeolocator())
+
+
+if __name__ == '__main__':
+    create_load_test_app().run_server(port=8051)
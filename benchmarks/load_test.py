@@ -0,0 +1,446 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# LOAD TEST: python -m benchmarks.load_test --url http://127.0.0.1:8051 [--users 1 2 4 8 16] [--duration 30]
+# Replays realistic interaction sessions of concurrent users against the callback endpoint of a running app
+# (start the app with the geocoder stub, so geocoding does not use the network: python -m benchmarks.geocoder_stub).
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+# callbacks are identified by one of their outputs
+CALLBACK_NAMES = {
+    'preliminary_information.style': 'show_preliminary_info',
+    '00_output_txt_reference_headline.children': 'localize_reference',
+    '00_store_reference_pins.data': 'pin_reference',
+    '00_store_references.data': 'reference_context',
+    '01_output_fig_global_heatmap_temp_anomalies.figure': 'global_anomalies',
+    '02_output_fig_minmax_temp_anomaly.figure': 'local_anomalies',
+    '03_output_fig_temp_change_co2.figure': 'global_temperature_impact',
+    '04_output_fig_co2_dev.figure': 'co2_development',
+}
+
+# references known by the geocoder stub (see benchmarks/geocoder_stub.py)
+REFERENCE_LOCATIONS = ['Kassel, Germany', 'Paris, France', 'Delhi, India', 'Niamey, Niger', 'Lagos, Nigeria']
+
+
+class DashClient:
+    """
+    Minimal client of a Dash app: keeps the properties of the components (like the browser) and calls the
+    callbacks whose inputs changed, including chained callbacks
+    """
+
+    def __init__(self, url, dependencies, layout, recorder):
+        """
+        :param url: url of the app
+        :param dependencies: callback dependencies of the app (/_dash-dependencies)
+        :param layout: layout of the app (/_dash-layout)
+        :param recorder: records the latency and status of each callback request
+        """
+        parsed_url = urlparse(url)
+        self.host, self.port = parsed_url.hostname, parsed_url.port or 80
+        self.prefix = parsed_url.path.rstrip('/')
+        self.connection = None
+        self.dependencies = dependencies
+        self.recorder = recorder
+
+        self.state = {}
+        self.collect_props(layout)
+
+    def collect_props(self, component):
+        """
+        Collects the properties of all components with id of the layout (tree)
+
+        :param component: component of the layout
+        :return: no return
+        """
+        if isinstance(component, list):
+            for child in component:
+                self.collect_props(child)
+        elif isinstance(component, dict) and 'props' in component:
+            props = component['props']
+            if 'id' in props:
+                for prop, value in props.items():
+                    self.state[f"{props['id']}.{prop}"] = value
+            self.collect_props(props.get('children'))
+
+    def post(self, path, payload):
+        """
+        Posts JSON payload to the app (keep-alive connection, reconnected on errors)
+
+        :param path: path of the endpoint
+        :param payload: JSON payload
+        :return: status code, response body
+        """
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        try:
+            self.connection.request('POST', self.prefix + path, body=json.dumps(payload),
+                                    headers={'Content-Type': 'application/json'})
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+    def fetch(self, path, name, payload=None):
+        """
+        Requests a route outside of the callbacks (i.e. the streamed playback frames or the query API)
+        and reads the whole response
+
+        :param path: path of the route
+        :param name: name under which the latency is recorded
+        :param payload: JSON payload (posted), if given
+        :return: response body (None on errors)
+        """
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        start = time.perf_counter()
+        try:
+            if payload is None:
+                self.connection.request('GET', self.prefix + path)
+            else:
+                self.connection.request('POST', self.prefix + path, body=json.dumps(payload),
+                                        headers={'Content-Type': 'application/json'})
+            response = self.connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            self.recorder.record(name, time.perf_counter() - start, False)
+            return None
+        self.recorder.record(name, time.perf_counter() - start, response.status == 200)
+
+        return body
+
+    def call(self, dependency, changed_prop_ids):
+        """
+        Calls a callback with the current properties and updates them with the response
+
+        :param dependency: callback dependency
+        :param changed_prop_ids: ids of the properties that triggered the callback
+        :return: ids of the properties changed by the callback
+        """
+        def prop(item):
+            prop_id = f"{item['id']}.{item['property']}"
+            return {'id': item['id'], 'property': item['property'], 'value': self.state.get(prop_id)}
+
+        # clientside callbacks run in the browser only
+        if dependency.get('clientside_function'):
+            return []
+
+        output = dependency['output']
+        outputs = [{'id': prop_id.rsplit('.', 1)[0], 'property': prop_id.rsplit('.', 1)[1]}
+                   for prop_id in output.strip('.').split('...')]
+        payload = {'output': output,
+                   'outputs': outputs if output.startswith('..') else outputs[0],
+                   'inputs': [prop(item) for item in dependency['inputs']],
+                   'state': [prop(item) for item in dependency['state']],
+                   'changedPropIds': changed_prop_ids}
+
+        name = next((name for prop_id, name in CALLBACK_NAMES.items() if prop_id in output), output)
+        start = time.perf_counter()
+        try:
+            status, body = self.post('/_dash-update-component', payload)
+        except (OSError, http.client.HTTPException):
+            self.recorder.record(name, time.perf_counter() - start, False)
+            return []
+        # 204: no update (PreventUpdate)
+        self.recorder.record(name, time.perf_counter() - start, status in (200, 204))
+
+        if status != 200:
+            return []
+
+        changed = []
+        for component_id, props in json.loads(body)['response'].items():
+            for prop_name, value in props.items():
+                self.state[f'{component_id}.{prop_name}'] = value
+                changed.append(f'{component_id}.{prop_name}')
+
+        return changed
+
+    def load_page(self):
+        """
+        Calls the callbacks without suppressed initial call once (initial call on page load)
+
+        :return: no return
+        """
+        for dependency in self.dependencies:
+            if not dependency.get('prevent_initial_call'):
+                self.call(dependency, [])
+
+    def set_prop(self, prop_id, value):
+        """
+        Changes a property (user interaction) and calls all callbacks triggered by it, including chained callbacks
+
+        :param prop_id: id of the property (component id.property)
+        :param value: new value
+        :return: no return
+        """
+        self.state[prop_id] = value
+        changed_prop_ids, called = [prop_id], set()
+        while changed_prop_ids:
+            triggered = [(index, dependency) for index, dependency in enumerate(self.dependencies)
+                         if index not in called and any(f"{item['id']}.{item['property']}" in changed_prop_ids
+                                                        for item in dependency['inputs'])]
+            next_changed_prop_ids = []
+            for index, dependency in triggered:
+                called.add(index)
+                next_changed_prop_ids += self.call(dependency, changed_prop_ids)
+            changed_prop_ids = next_changed_prop_ids
+
+
+class Recorder:
+    """
+    Thread-safe collection of the latencies and errors per callback
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, latency, success):
+        with self.lock:
+            self.latencies[name].append(latency)
+            if not success:
+                self.errors[name] += 1
+
+
+def run_session(client, think_time, rng):
+    """
+    Replays one interaction session: page load, setting and pinning a reference location, setting a second one,
+    scrolling to and dragging the 02 year
+    slider and the 04 range slider, switching the treemap options, playing back, zooming and switching the layers
+    of the heatmap and clicking on it
+
+    :param client: DashClient
+    :param think_time: maximum pause between two interactions in seconds
+    :param rng: random generator
+    :return: no return
+    """
+    def pause():
+        time.sleep(rng.uniform(0, think_time))
+
+    # sections below the fold are rendered when scrolled into view (the viewport is tracked in the browser)
+    def scroll_to(section_store):
+        if not client.state.get(f'{section_store}.data'):
+            client.set_prop(f'{section_store}.data', True)
+
+    client.load_page()
+    pause()
+
+    # set reference location (geocoding, then the rendered sections are updated with the reference)
+    client.state['00_input_txt_location.value'] = rng.choice(REFERENCE_LOCATIONS)
+    client.set_prop('00_input_btn_reference_location.n_clicks', 1)
+    pause()
+
+    # pin the reference and set a second one (the rendered sections are updated with both references)
+    client.set_prop('00_input_btn_reference_pin.n_clicks', 1)
+    client.state['00_input_txt_location.value'] = rng.choice(REFERENCE_LOCATIONS)
+    client.set_prop('00_input_btn_reference_location.n_clicks', 1)
+    pause()
+
+    # drag 02 year slider (several intermediate values)
+    scroll_to('02_store_section_visible')
+    year_min, year_max = client.state['02_input_sld_years.min'], client.state['02_input_sld_years.max']
+    year = rng.randint(year_min, year_max)
+    for step in range(rng.randint(2, 5)):
+        year = min(year_max, max(year_min, year + rng.choice([-1, 1])))
+        client.set_prop('02_input_sld_years.value', year)
+    pause()
+
+    # drag 04 range slider
+    scroll_to('04_store_section_visible')
+    rsl_min, rsl_max = client.state['04_input_rsl_years.min'], client.state['04_input_rsl_years.max']
+    for step in range(rng.randint(2, 4)):
+        x_year = rng.randint(rsl_min, rsl_max - 1)
+        client.set_prop('04_input_rsl_years.value', [x_year, rng.randint(x_year + 1, rsl_max)])
+    pause()
+
+    # switch to treemap and through its options
+    scroll_to('03_store_section_visible')
+    client.set_prop('03_input_tab_worldmap_treemap.value', 'tree')
+    options = [option['value'] for option in client.state.get('03_input_ddl_treemap_grouping_options.options', [])
+               if not option.get('disabled')]
+    for option in rng.sample(options, min(3, len(options))):
+        client.set_prop('03_input_ddl_treemap_grouping_options.value', option)
+    pause()
+
+    # play the heatmap back (frames streamed outside of the callbacks)
+    client.fetch(f"/_playback/{rng.choice(['month', 'year'])}", 'playback')
+    pause()
+
+    # query the anomaly series of a point and of a batch of points (JSON and Arrow)
+    client.fetch(f'/api/anomalies/point?lat={rng.uniform(-90, 90):.2f}&lon={rng.uniform(-180, 180):.2f}'
+                 f'&start={rng.randrange(1990, 2000)}', 'api point')
+    client.fetch('/api/anomalies/batch', 'api batch',
+                 {'coordinates': [[rng.uniform(-90, 90), rng.uniform(-180, 180)] for _ in range(100)],
+                  'format': rng.choice(['json', 'arrow'])})
+    pause()
+
+    # export a bounding box of the anomalies and the co2 development view
+    latitude, longitude = rng.randrange(-80, 60), rng.randrange(-180, 150)
+    client.fetch(f'/api/export/anomalies?lat_min={latitude}&lat_max={latitude + 20}&lon_min={longitude}'
+                 f'&lon_max={longitude + 30}&format={rng.choice(["csv", "parquet", "netcdf"])}', 'export anomalies')
+    client.fetch(f'/api/export/co2_development?grouping=grouping%23continent&years=1997&years=2015'
+                 f'&format={rng.choice(["csv", "parquet"])}', 'export co2_development')
+    pause()
+
+    # zoom into the world map (finer grid, only the visible cells) and out again
+    client.set_prop('01_output_fig_global_heatmap_temp_anomalies.relayoutData',
+                    {'geo.projection.scale': rng.choice([2, 4, 8]), 'geo.center.lon': rng.uniform(-180, 180),
+                     'geo.center.lat': rng.uniform(-60, 60)})
+    client.set_prop('01_output_fig_global_heatmap_temp_anomalies.relayoutData',
+                    {'geo.projection.scale': 1, 'geo.center.lon': 0, 'geo.center.lat': 0})
+    pause()
+
+    # switch the world map to another layer (countries, trends, rolling means, climatology) and back
+    client.set_prop('01_input_tab_map_layers.value',
+                    rng.choice(['countries', 'trend', 'rolling_mean', 'climatology']))
+    client.set_prop('01_input_tab_map_layers.value', 'grid')
+    pause()
+
+    # click on the heatmap (reverse geocoding of the clicked point)
+    latitude, longitude = rng.randrange(-59, 60, 2), rng.randrange(-179, 180, 2)
+    client.set_prop('01_output_fig_global_heatmap_temp_anomalies.clickData',
+                    {'points': [{'lat': latitude, 'lon': longitude, 'marker.color': rng.uniform(-2, 2)}]})
+    pause()
+
+
+def fetch_json(url, path):
+    """
+    :param url: url of the app
+    :param path: path of the endpoint
+    :return: JSON response
+    """
+    parsed_url = urlparse(url)
+    connection = http.client.HTTPConnection(parsed_url.hostname, parsed_url.port or 80, timeout=120)
+    connection.request('GET', parsed_url.path.rstrip('/') + path)
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f'{path}: HTTP {response.status}')
+
+    return json.loads(body)
+
+
+def percentile(values, share):
+    """
+    :param values: sorted values
+    :param share: percentile as share (i.e. 0.95)
+    :return: value of the percentile (nearest rank)
+    """
+    return values[min(len(values) - 1, max(0, int(round(share * len(values) + 0.5)) - 1))]
+
+
+def run_stage(url, dependencies, users, duration, think_time, seed):
+    """
+    Runs sessions of the given number of concurrent users for the given duration
+
+    :param url: url of the app
+    :param dependencies: callback dependencies of the app
+    :param users: number of concurrent users
+    :param duration: duration of the stage in seconds (running sessions are finished)
+    :param think_time: maximum pause between two interactions in seconds
+    :param seed: seed of the random generators
+    :return: results of the stage (throughput, latencies and errors per callback)
+    """
+    recorder = Recorder()
+    end_time = time.perf_counter() + duration
+    sessions = []
+
+    def user(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.perf_counter() < end_time:
+            # each session is a new page load (new browser tab)
+            client = DashClient(url, dependencies, fetch_json(url, '/_dash-layout'), recorder)
+            run_session(client, think_time, rng)
+            sessions.append(index)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        for future in [executor.submit(user, index) for index in range(users)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    callbacks = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        latencies = sorted(latencies)
+        callbacks[name] = {'requests': len(latencies),
+                           'errors': recorder.errors[name],
+                           'error_rate': recorder.errors[name] / len(latencies),
+                           'p50': percentile(latencies, 0.5),
+                           'p95': percentile(latencies, 0.95),
+                           'p99': percentile(latencies, 0.99),
+                           'mean': statistics.mean(latencies)}
+
+    requests = sum(result['requests'] for result in callbacks.values())
+    errors = sum(result['errors'] for result in callbacks.values())
+    all_latencies = sorted(latency for latencies in recorder.latencies.values() for latency in latencies)
+
+    return {'users': users,
+            'duration': elapsed,
+            'sessions': len(sessions),
+            'requests': requests,
+            'throughput': requests / elapsed,
+            'error_rate': errors / requests if requests else 0,
+            'p50': percentile(all_latencies, 0.5) if all_latencies else None,
+            'p95': percentile(all_latencies, 0.95) if all_latencies else None,
+            'p99': percentile(all_latencies, 0.99) if all_latencies else None,
+            'callbacks': callbacks}
+
+
+def print_stage(stage):
+    """
+    Prints throughput, error rate and latencies per callback of a stage
+
+    :param stage: results of the stage (see run_stage)
+    :return: no return
+    """
+    print(f"\n{stage['users']} users: {stage['sessions']} sessions, {stage['requests']} requests, "
+          f"{stage['throughput']:.1f} requests/s, error rate {stage['error_rate']:.1%}")
+    print(f"  {'callback':<28}{'requests':>10}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, result in stage['callbacks'].items():
+        print(f"  {name:<28}{result['requests']:>10}{result['errors']:>8}{result['p50'] * 1000:>8.0f}ms"
+              f"{result['p95'] * 1000:>8.0f}ms{result['p99'] * 1000:>8.0f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test of the callbacks of a running app')
+    parser.add_argument('--url', default='http://127.0.0.1:8051', help='url of the running app')
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help='numbers of concurrent users (one stage per number, ramped up in the given order)')
+    parser.add_argument('--duration', type=float, default=30, help='duration of each stage in seconds')
+    parser.add_argument('--think-time', type=float, default=1.0,
+                        help='maximum pause between two interactions of a user in seconds')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random interactions')
+    parser.add_argument('--output', default=None, help='filepath of the JSON report '
+                                                       '(default: benchmarks/results/load-test-<timestamp>.json)')
+    args = parser.parse_args()
+
+    app_dependencies = fetch_json(args.url, '/_dash-dependencies')
+
+    report = {'created': datetime.now().isoformat(timespec='seconds'), 'url': args.url,
+              'duration': args.duration, 'think_time': args.think_time, 'stages': []}
+    for number_of_users in args.users:
+        print(f'Stage with {number_of_users} concurrent users ({args.duration:.0f}s)', file=sys.stderr)
+        report['stages'].append(run_stage(args.url, app_dependencies, number_of_users, args.duration,
+                                          args.think_time, args.seed))
+        print_stage(report['stages'][-1])
+
+    output = Path(args.output or f"benchmarks/results/load-test-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f'\nReport written to {output}')
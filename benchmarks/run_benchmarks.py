@@ -0,0 +1,562 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# BENCHMARK SUITE: python -m benchmarks.run_benchmarks [--scales 1 2 4] [--baseline benchmarks/results/<file>.json]
+# Times the loading and enrichment of the data, the processing functions and figure builders of dash_processing.py
+# and the callbacks of main.py (called directly) on synthetic data of several scales.
+import argparse
+import copy
+import gzip
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+from benchmarks.synthetic_data import create_synthetic_data
+from utils.data_loading import read_config_file, read_nasa_file, read_co2_data, read_cc_mapping, \
+    read_country_groupings, read_geo_data, write_geo_cache, read_geo_cache
+from utils.data_processing import co2_data_filter, co2_data_add_continents, co2_data_add_groupings, \
+    co2_data_build_indexes, co2_data_build_year_matrices, co2_data_build_impact_view, \
+    co2_data_build_treemap_hierarchies, anomaly_data_build_matrix, anomaly_data_build_pyramid, \
+    anomaly_data_build_sketches, anomaly_data_cell_trends, anomaly_data_rolling_means, anomaly_data_climatology, \
+    anomaly_data_encode_frames, anomaly_data_map_countries, anomaly_data_build_country_means
+from utils.dash_processing import group_df, filter_df, xy_filter_df, extract_min_max_mean_anomalies, \
+    extract_percentile_anomalies, create_polar_line_figure, create_line_figure, create_treemap_figure, rank_top_df, \
+    create_co2_consumption_fig, create_co2_comparison_fig, add_marker, add_country_shape, extract_country, \
+    collect_references, resolve_references, gather_reference_anomalies, reference_co2_df, stream_playback_frames, \
+    compact_figure_arrays, FIGURE_ARRAY_PROPERTIES
+from utils.data_store import create_datasets, load_datasets, protect
+from utils.api import query_anomalies, to_json_response, to_arrow_response, select_cells, select_periods, \
+    anomaly_export_blocks, anomaly_export_frames, stream_csv, stream_parquet, stream_netcdf
+
+REFERENCE_LOCATION = 'Kassel, Germany'
+REFERENCE_COORDINATES = '51.3, 9.5'
+# pinned references (sites spread over the grid, the countries of the first five exist in the synthetic data)
+REFERENCE_PINS = [{'coordinates': f'{latitude}, {longitude}', 'location': f'Site {i}, {country}'}
+                  for i, (latitude, longitude, country) in enumerate([
+                      (48.85, 2.35, 'France'), (28.6, 77.2, 'India'), (13.5, 2.1, 'Niger'), (6.5, 3.4, 'Nigeria'),
+                      (-33.9, 151.2, 'Australia'), (40.7, -74.0, 'United States'), (-23.5, -46.6, 'Brazil'),
+                      (35.7, 139.7, 'Japan'), (55.8, 37.6, 'Russia')])]
+REFERENCE_ZOOM = {'geo.projection.scale': 4, 'geo.center.lon': 9.5, 'geo.center.lat': 51.3}
+
+
+def time_function(function, repeat, setup=None):
+    """
+    Calls the function repeatedly and measures the wall time of each call
+
+    :param function: function without parameters
+    :param repeat: number of calls
+    :param setup: function called before each call (not measured)
+    :return: timings (min, median, mean in seconds, number of calls)
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return {'min': min(timings), 'median': statistics.median(timings), 'mean': statistics.mean(timings),
+            'repeat': repeat}
+
+
+def benchmark_loading(config, repeat):
+    """
+    Benchmarks of reading the sources and the co2 enrichment chain
+
+    :param config: configuration data (filepaths of the synthetic data)
+    :param repeat: number of calls per benchmark
+    :return: dictionary of timings per benchmark
+    """
+    filepaths = config['filepaths']
+    data_information = config['data_information']
+    results = {}
+
+    # NetCDF processing (one-time in production), afterwards the JSON-File is read
+    results['read_nasa_file (NetCDF)'] = time_function(
+        lambda: read_nasa_file(filepaths['nasa_nc_data'], filepaths['nasa_json_data']), max(1, repeat // 3),
+        setup=lambda: Path(filepaths['nasa_json_data']).unlink(missing_ok=True))
+    results['read_nasa_file (JSON)'] = time_function(
+        lambda: read_nasa_file(filepaths['nasa_nc_data'], filepaths['nasa_json_data']), repeat)
+    results['read_geo_data'] = time_function(
+        lambda: read_geo_data(filepaths['geo_data'], data_information['geo_data_columns']), repeat)
+    # GeoParquet copy of the country shapes, read on every start after the first one
+    write_geo_cache(read_geo_data(filepaths['geo_data'], data_information['geo_data_columns']),
+                    filepaths['geo_data_cache'], 'benchmark')
+    results['read_geo_cache'] = time_function(
+        lambda: read_geo_cache(filepaths['geo_data_cache'], 'benchmark', data_information['geo_data_columns']),
+        repeat)
+
+    sources = {}
+    results['read_co2_data'] = time_function(
+        lambda: sources.update(co2=read_co2_data(filepaths['owid_co2_data'])), repeat)
+    results['read_cc_mapping'] = time_function(
+        lambda: sources.update(cc=read_cc_mapping(filepaths['country_continent_mappings'])), repeat)
+    results['read_country_groupings'] = time_function(
+        lambda: sources.update(groupings=read_country_groupings(filepaths['country_grouping_mappings'])), repeat)
+
+    steps = {}
+    results['co2_data_filter'] = time_function(lambda: steps.update(filtered=co2_data_filter(
+        sources['co2'], data_information['co2_data_columns'], data_information['co2_data_na_columns'],
+        *data_information['co2_data_default_years'])), repeat)
+    results['co2_data_add_continents'] = time_function(lambda: steps.update(continents=co2_data_add_continents(
+        steps['filtered'], sources['cc'], data_information['co2_data_drop_cc_combinations'])), repeat)
+    results['co2_data_add_groupings'] = time_function(lambda: steps.update(groupings=co2_data_add_groupings(
+        steps['continents'], *sources['groupings'])), repeat)
+
+    def co2_enrichment_chain():
+        df = co2_data_filter(read_co2_data(filepaths['owid_co2_data']), data_information['co2_data_columns'],
+                             data_information['co2_data_na_columns'], *data_information['co2_data_default_years'])
+        df = co2_data_add_continents(df, read_cc_mapping(filepaths['country_continent_mappings']),
+                                     data_information['co2_data_drop_cc_combinations'])
+        return co2_data_add_groupings(df, *read_country_groupings(filepaths['country_grouping_mappings']))
+
+    results['co2 enrichment chain (total)'] = time_function(co2_enrichment_chain, repeat)
+
+    # precomputations of the co2 data (indexes, matrices, impact view, treemap hierarchies)
+    grouping_columns = [option['value'].split('#')[1]
+                        for option in config['dash_information']['04_input_ddl_grouping_options']
+                        if option['value'].split('#')[0] == 'grouping']
+    results['co2_data_build_indexes'] = time_function(lambda: steps.update(indexed=co2_data_build_indexes(
+        steps['groupings'], data_information['co2_data_index_columns'])), repeat)
+    results['co2_data_build_year_matrices'] = time_function(
+        lambda: co2_data_build_year_matrices(steps['indexed'][0], grouping_columns), repeat)
+    results['co2_data_build_impact_view'] = time_function(lambda: steps.update(view=co2_data_build_impact_view(
+        steps['indexed'][0], config['dash_information']['03_df_co2_columns'],
+        pd.read_csv(filepaths['owid_co2_codebook']).set_index('column'))), repeat)
+    results['co2_data_build_treemap_hierarchies'] = time_function(lambda: co2_data_build_treemap_hierarchies(
+        steps['view']['df'], config['dash_information']['03_input_ddl_treemap_options']), repeat)
+
+    return results
+
+
+def benchmark_processing(config, datasets, repeat):
+    """
+    Benchmarks of the processing functions and figure builders of dash_processing.py
+    (inputs prepared as in the callbacks)
+
+    :param config: configuration data
+    :param datasets: loaded dataset handles (see create_datasets)
+    :param repeat: number of calls per benchmark
+    :return: dictionary of timings per benchmark
+    """
+    dash_information = config['dash_information']
+    results = {}
+
+    # 02 temperature anomalies
+    df_anomaly = datasets['anomaly_data'].get()
+    df_polar = df_anomaly[df_anomaly['Year'] == df_anomaly['Year'].min()]
+    results['extract_min_max_mean_anomalies'] = time_function(lambda: extract_min_max_mean_anomalies(df_polar),
+                                                              repeat)
+
+    month_dict = config['data_information']['month_number']
+    df_polar_min_max_mean = pd.concat(extract_min_max_mean_anomalies(df_polar))
+    df_polar_min_max_mean['Month'] = df_polar_min_max_mean['Month'].map(month_dict)
+    min_value, max_value = df_anomaly['Anomaly'].min(), df_anomaly['Anomaly'].max()
+    results['create_polar_line_figure'] = time_function(lambda: create_polar_line_figure(
+        df_polar_min_max_mean, min_value, max_value, list(month_dict.values())), repeat)
+
+    # 02 percentile bands from the quantile sketches
+    sketches = datasets['anomaly_sketches'].get()
+    years = sorted(set(df_anomaly['Year']))
+    results['anomaly_data_build_sketches'] = time_function(lambda: anomaly_data_build_sketches(
+        datasets['anomaly_matrix'].get(), config['data_information']['anomaly_data_sketch_bin_width'],
+        config['data_information']['anomaly_data_sketch_range']), repeat)
+    results['extract_percentile_anomalies'] = time_function(lambda: extract_percentile_anomalies(
+        sketches, years[:1], [5, 25, 50, 75, 95]), repeat)
+    results['extract_percentile_anomalies (all years)'] = time_function(lambda: extract_percentile_anomalies(
+        sketches, years, [5, 25, 50, 75, 95]), repeat)
+    df_percentiles = extract_percentile_anomalies(sketches, years[:1], [5, 25, 50, 75, 95])
+    results['create_polar_line_figure (percentiles)'] = time_function(lambda: create_polar_line_figure(
+        df_polar_min_max_mean, min_value, max_value, list(month_dict.values()), df_percentiles), repeat)
+
+    df_line = df_anomaly[['Anomaly', 'Year']].groupby('Year').mean().reset_index()
+    df_line['Type'] = 'global mean values'
+    results['create_line_figure'] = time_function(lambda: create_line_figure(
+        df_line, df_line['Anomaly'].min(), df_line['Anomaly'].max()), repeat)
+
+    # 01 map layers and playback (anomaly matrix, grid pyramid, cell statistics, playback frames, spatial join,
+    # country means)
+    gdf_countries = datasets['geo_data'].get()
+    anomaly_matrix = datasets['anomaly_matrix'].get()
+    results['anomaly_data_build_matrix'] = time_function(lambda: anomaly_data_build_matrix(df_anomaly), repeat)
+    results['anomaly_data_build_pyramid'] = time_function(lambda: anomaly_data_build_pyramid(
+        anomaly_matrix, config['data_information']['anomaly_data_pyramid_factors']), repeat)
+    results['anomaly_data_cell_trends'] = time_function(lambda: anomaly_data_cell_trends(
+        anomaly_matrix['matrix'], anomaly_matrix['periods'],
+        config['data_information']['anomaly_data_trend_min_periods']), repeat)
+    results['anomaly_data_rolling_means'] = time_function(lambda: anomaly_data_rolling_means(
+        anomaly_matrix['matrix'], config['data_information']['anomaly_data_rolling_window'],
+        config['data_information']['anomaly_data_rolling_min_periods']), repeat)
+    results['anomaly_data_climatology'] = time_function(lambda: anomaly_data_climatology(
+        anomaly_matrix['matrix'], anomaly_matrix['periods']), repeat)
+    results['anomaly_data_encode_frames (month)'] = time_function(lambda: anomaly_data_encode_frames(
+        anomaly_matrix['matrix'], anomaly_matrix['periods'], 'month'), repeat)
+    results['anomaly_data_encode_frames (year)'] = time_function(lambda: anomaly_data_encode_frames(
+        anomaly_matrix['matrix'], anomaly_matrix['periods'], 'year'), repeat)
+    playback = datasets['anomaly_playback'].get()
+    results['stream_playback_frames (month)'] = time_function(lambda: b''.join(stream_playback_frames(
+        playback, 'month', config['dash_information']['01_playback']['chunk_frames'])), repeat)
+    results['anomaly_data_map_countries'] = time_function(lambda: anomaly_data_map_countries(
+        anomaly_matrix['latitudes'], anomaly_matrix['longitudes'], anomaly_matrix['cell_size'], gdf_countries), repeat)
+    results['anomaly_data_build_country_means'] = time_function(lambda: anomaly_data_build_country_means(
+        anomaly_matrix, datasets['grid_country_mapping'].get()), repeat)
+
+    # query API (batch of coordinates)
+    coordinates = np.random.default_rng(0).uniform([-90, -180], [90, 180], (1000, 2)).tolist()
+    query = query_anomalies(anomaly_matrix, coordinates)
+    results['query_anomalies (1000 coordinates)'] = time_function(lambda: query_anomalies(
+        anomaly_matrix, coordinates), repeat)
+    results['to_json_response (1000 coordinates)'] = time_function(lambda: to_json_response(query), repeat)
+    results['to_arrow_response (1000 coordinates)'] = time_function(lambda: to_arrow_response(query), repeat)
+
+    # streamed exports (whole grid, all periods)
+    lat_positions, lon_positions = select_cells(anomaly_matrix, -90, 90, -180, 180)
+    periods = select_periods(anomaly_matrix, None, None)
+    chunk_periods = config['data_information']['api_export_chunk_periods']
+
+    def export_frames():
+        return anomaly_export_frames(anomaly_matrix, lat_positions, lon_positions, anomaly_export_blocks(
+            anomaly_matrix, lat_positions, lon_positions, periods, chunk_periods))
+
+    results['export anomalies (csv)'] = time_function(lambda: sum(map(len, stream_csv(export_frames()))), repeat)
+    results['export anomalies (parquet)'] = time_function(lambda: sum(map(len, stream_parquet(export_frames()))),
+                                                          repeat)
+    results['export anomalies (netcdf)'] = time_function(lambda: sum(map(len, stream_netcdf(
+        anomaly_matrix, lat_positions, lon_positions, anomaly_export_blocks(
+            anomaly_matrix, lat_positions, lon_positions, periods, chunk_periods),
+        config['data_information']['api_export_block_size']))), repeat)
+
+    # 01 reference on the world map
+    results['add_marker'] = time_function(lambda: add_marker(go.Figure(), 51, 9), repeat)
+    results['add_country_shape'] = time_function(lambda: add_country_shape(
+        go.Figure(), gdf_countries, extract_country(REFERENCE_LOCATION, dash_information['01_countryname_changes'])),
+        repeat)
+
+    # 03 co2 impact
+    co2_impact = datasets['co2_impact'].get()
+    results['create_treemap_figure'] = time_function(lambda: create_treemap_figure(
+        co2_impact['treemap_hierarchies']['all#continent'], co2_impact['view']['min_value'],
+        co2_impact['view']['max_value']), repeat)
+    results['rank_top_df'] = time_function(lambda: rank_top_df(co2_impact['view'], 20,
+                                                               [extract_country(REFERENCE_LOCATION)]), repeat)
+
+    # 00 references (resolved once per reference change, the data is gathered per section for all references)
+    co2_data = datasets['co2_data'].get()
+    df_co2, indexes, matrices = co2_data['df'], co2_data['indexes'], co2_data['matrices']
+    anomaly_matrix = datasets['anomaly_matrix'].get()
+    for name, pins in [('1 reference', None), ('10 references', REFERENCE_PINS)]:
+        references = collect_references(REFERENCE_COORDINATES, REFERENCE_LOCATION, pins)
+        results[f'resolve_references ({name})'] = time_function(lambda: resolve_references(
+            references, anomaly_matrix, dash_information['01_countryname_changes']), repeat)
+        resolved = resolve_references(references, anomaly_matrix, dash_information['01_countryname_changes'])
+        results[f'gather_reference_anomalies ({name})'] = time_function(
+            lambda: gather_reference_anomalies(anomaly_matrix, resolved), repeat)
+        results[f'reference_co2_df ({name})'] = time_function(lambda: reference_co2_df(resolved, df_co2, indexes),
+                                                              repeat)
+    df_reference = reference_co2_df(resolved, df_co2, indexes)
+
+    # 04 co2 consumption
+    results['group_df'] = time_function(lambda: group_df(
+        df_co2, set(dash_information['04_df_co2_columns_grouping']), 'continent', df_reference), repeat)
+    results['filter_df'] = time_function(lambda: filter_df(
+        df_co2, indexes, set(dash_information['04_df_co2_columns_filter']), 'continent', 'Europe',
+        df_reference), repeat)
+    results['xy_filter_df'] = time_function(lambda: xy_filter_df(
+        matrices, 'country', indexes['countries']['continent']['Europe'], 1997, 2015, df_reference), repeat)
+
+    df_development = filter_df(df_co2, indexes, set(dash_information['04_df_co2_columns_filter']), 'continent',
+                               'Europe', df_reference)
+    df_comparison = xy_filter_df(matrices, 'country', indexes['countries']['continent']['Europe'], 1997, 2015,
+                                 df_reference)
+    results['create_co2_consumption_fig'] = time_function(lambda: create_co2_consumption_fig(
+        df_development, 'country', 1997, 2015), repeat)
+    results['create_co2_comparison_fig'] = time_function(lambda: create_co2_comparison_fig(
+        df_comparison, 'country', 1997, 2015), repeat)
+
+    return results
+
+
+def benchmark_callbacks(main, repeat):
+    """
+    Benchmarks of the callbacks of main.py, called directly (without geocoding, the reference is given).
+    The sections below the fold are benchmarked via their render functions (without the on-demand rendering).
+
+    :param main: main module (configuration and datasets replaced by the synthetic ones)
+    :param repeat: number of calls per benchmark
+    :return: dictionary of timings per benchmark
+    """
+    year = int(main.datasets['anomaly_data'].get()['Year'].min())
+    reference = main.reference_context(REFERENCE_COORDINATES, REFERENCE_LOCATION)
+    references = main.reference_context(REFERENCE_COORDINATES, REFERENCE_LOCATION, REFERENCE_PINS)
+    cases = {
+        'reference_context': (main.reference_context, (REFERENCE_COORDINATES, REFERENCE_LOCATION)),
+        'reference_context (10 references)': (main.reference_context,
+                                              (REFERENCE_COORDINATES, REFERENCE_LOCATION, REFERENCE_PINS)),
+        'global_anomalies': (main.global_anomalies, ('grid', None, None, None, None, None)),
+        'global_anomalies (reference)': (main.global_anomalies, ('grid', reference, None, None, None, None)),
+        'global_anomalies (10 references)': (main.global_anomalies, ('grid', references, None, None, None, None)),
+        'global_anomalies (countries, reference)': (main.global_anomalies,
+                                                    ('countries', reference, None, None, None, None)),
+        'global_anomalies (small screen)': (main.global_anomalies,
+                                            ('grid', None, None, None, {'width': 360, 'height': 300}, None)),
+        'global_anomalies (trend)': (main.global_anomalies, ('trend', None, None, None, None, None)),
+        'global_anomalies (zoomed)': (main.global_anomalies, ('grid', None, None, REFERENCE_ZOOM, None, None)),
+        'local_anomalies': (main.render_local_anomalies, (year, None)),
+        'local_anomalies (reference)': (main.render_local_anomalies, (year, reference)),
+        'local_anomalies (10 references)': (main.render_local_anomalies, (year, references)),
+        'global_temperature_impact (world)': (main.render_global_temperature_impact, ('world', 'all#continent', None)),
+        'global_temperature_impact (tree, reference)': (main.render_global_temperature_impact,
+                                                        ('tree', 'all#continent', reference)),
+        'global_temperature_impact (tree, 10 references)': (main.render_global_temperature_impact,
+                                                            ('tree', 'all#continent', references)),
+        'co2_development (grouping)': (main.render_co2_development,
+                                       ('grouping#continent', [1997, 2015], None, reference)),
+        'co2_development (filter)': (main.render_co2_development,
+                                     ('filter#continent#Europe', [1997, 2015], None, reference)),
+        'co2_development (filter, 10 references)': (main.render_co2_development,
+                                                    ('filter#continent#Europe', [1997, 2015], None, references)),
+        'co2_development (customized)': (main.render_co2_development,
+                                         ('customized', [1997, 2015], ['Germany', 'France', 'India'], None)),
+    }
+
+    return {f'callback {name}': time_function(lambda function=function, args=args: function(*args), repeat)
+            for name, (function, args) in cases.items()}
+
+
+def figure_arrays_to_lists(fig):
+    """
+    :param fig: figure (changed in place)
+    :return: figure with the numeric arrays as lists (plain JSON transport)
+    """
+    for trace in fig.data:
+        properties = trace.to_plotly_json()
+        for name in FIGURE_ARRAY_PROPERTIES:
+            parent, _, prop = name.rpartition('.')
+            value = properties.get(parent, {}).get(prop) if parent else properties.get(prop)
+            if value is not None and not isinstance(value, (str, dict)):
+                # reset first, values equal to the current ones are ignored
+                trace[name] = None
+                trace[name] = np.asarray(value).tolist()
+
+    return fig
+
+
+def benchmark_transport(main, repeat):
+    """
+    Comparison of the transport of the figures to the browser: encode time (JSON serialization as done by Dash)
+    and size (plain and gzip compressed) of the figures with plain JSON lists, with the typed arrays of plotly
+    (float64) and with the compact binary arrays (see compact_figure_arrays, including the conversion)
+
+    :param main: main module (configuration and datasets replaced by the synthetic ones)
+    :param repeat: number of calls per benchmark
+    :return: dictionary of timings and sizes (bytes, gzip_bytes) per figure and transport
+    """
+    year = int(main.datasets['anomaly_data'].get()['Year'].min())
+    min_length = main.config['dash_information']['general']['figure_arrays']['min_length']
+    figures = {
+        'global_anomalies': main.global_anomalies('grid', None, None, None, None, None)[0],
+        'global_anomalies (zoomed)': main.global_anomalies('grid', None, None, REFERENCE_ZOOM, None, None)[0],
+        'local_anomalies (polar)': main.render_local_anomalies(year, None)[0],
+        'global_temperature_impact (tree)': main.render_global_temperature_impact('tree', 'all#continent',
+                                                                                  None)[0],
+        'co2_development': main.render_co2_development('filter#continent#Europe', [1997, 2015], None, None)[0],
+    }
+    # figures are copied before each call (not measured), the lists of the JSON transport are created with the copy
+    transports = {
+        'json': (lambda fig: figure_arrays_to_lists(go.Figure(fig)), to_json_plotly),
+        'typed float64': (go.Figure, to_json_plotly),
+        'binary': (go.Figure, lambda fig: to_json_plotly(compact_figure_arrays(fig, min_length))),
+    }
+
+    results = {}
+    for name, fig in figures.items():
+        for transport, (prepare, encode) in transports.items():
+            figure_copy = {}
+            result = time_function(lambda: encode(figure_copy['fig']), repeat,
+                                   setup=lambda: figure_copy.update(fig=prepare(fig)))
+            encoded = encode(prepare(fig)).encode()
+            result['bytes'] = len(encoded)
+            result['gzip_bytes'] = len(gzip.compress(encoded))
+            results[f'transport {name} ({transport})'] = result
+
+    return results
+
+
+def scaling_exponents(results, scales):
+    """
+    Estimates how each benchmark scales with the data size: exponent of the power law fitted to the median times
+    (0 = constant, 1 = linear, 2 = quadratic in the scale factor)
+
+    :param results: timings per benchmark and scale
+    :param scales: scale factors
+    :return: dictionary of exponents per benchmark (None if only one scale)
+    """
+    exponents = {}
+    for name, timings in results.items():
+        points = [(np.log(scale), np.log(timings[str(scale)]['median']))
+                  for scale in scales if str(scale) in timings and timings[str(scale)]['median'] > 0]
+        if len(points) < 2:
+            exponents[name] = None
+        else:
+            x, y = np.array(points).T
+            exponents[name] = round(float(np.polyfit(x, y, 1)[0]), 2)
+
+    return exponents
+
+
+def compare_results(report, baseline, threshold):
+    """
+    Compares the median times with a stored baseline report
+
+    :param report: benchmark report
+    :param baseline: baseline benchmark report
+    :param threshold: relative slowdown that is flagged as regression (i.e. 0.2 = 20 % slower)
+    :return: list of regressions (benchmark, scale, baseline median, median, ratio)
+    """
+    regressions = []
+    for name, timings in report['results'].items():
+        for scale, timing in timings.items():
+            baseline_timing = baseline['results'].get(name, {}).get(scale)
+            if baseline_timing is None or baseline_timing['median'] <= 0:
+                continue
+
+            ratio = timing['median'] / baseline_timing['median']
+            if ratio > 1 + threshold:
+                regressions.append({'benchmark': name, 'scale': scale, 'baseline_median': baseline_timing['median'],
+                                    'median': timing['median'], 'ratio': round(ratio, 2)})
+
+    return regressions
+
+
+def print_report(report):
+    """
+    Prints median times per benchmark and scale (in ms) and the scaling exponents
+
+    :param report: benchmark report
+    :return: no return
+    """
+    scales = list(report['scales'])
+    print(f"{'benchmark':<56}" + ''.join(f'{"scale " + scale:>14}' for scale in scales) + f'{"exponent":>10}')
+    for name, timings in report['results'].items():
+        medians = ''.join(f"{timings[scale]['median'] * 1000:>12.1f}ms" if scale in timings else f'{"-":>14}'
+                          for scale in scales)
+        exponent = report['scaling'][name]
+        print(f'{name:<56}{medians}{"-" if exponent is None else exponent:>10}')
+
+    # sizes of the figure transports (plain / gzip compressed)
+    sizes = {name: timings for name, timings in report['results'].items()
+             if any('bytes' in timing for timing in timings.values())}
+    if sizes:
+        print(f"{'figure transport size (kB, gzip kB)':<56}" + ''.join(f'{"scale " + scale:>14}' for scale in scales))
+        for name, timings in sizes.items():
+            print(f'{name:<56}' + ''.join(
+                f"{timings[scale]['bytes'] / 1000:>7.0f} ({timings[scale]['gzip_bytes'] / 1000:>4.0f})"
+                if scale in timings else f'{"-":>14}' for scale in scales))
+
+
+def run_benchmarks(scales, grid_factor, repeat, data_dirpath):
+    """
+    Runs all benchmarks on synthetic data of the given scales
+
+    :param scales: scale factors of the synthetic data
+    :param grid_factor: refinement of the 2° grid of the temperature anomalies
+    :param repeat: number of calls per benchmark
+    :param data_dirpath: path to directory of the synthetic data
+    :return: benchmark report
+    """
+    # callbacks use the module globals of main.py, which are replaced by the synthetic data for each scale
+    import main
+
+    report = {'created': datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'versions': {'numpy': np.__version__, 'pandas': pd.__version__},
+              'repeat': repeat,
+              'grid_factor': grid_factor,
+              'scales': {},
+              'results': {}}
+
+    for scale in scales:
+        print(f'Scale {scale}: creating synthetic data')
+        filepaths, parameters = create_synthetic_data(Path(data_dirpath) / f'scale-{scale}', scale, grid_factor)
+        report['scales'][str(scale)] = parameters
+
+        config = copy.deepcopy(read_config_file())
+        config['filepaths'].update(filepaths)
+
+        print(f'Scale {scale}: loading and enrichment')
+        results = benchmark_loading(config, repeat)
+
+        main.config = protect(config)
+        main.datasets = create_datasets(main.config)
+        main.co2_data_window.cache_clear()
+        load_datasets(main.datasets.values())
+
+        print(f'Scale {scale}: processing and figures')
+        results.update(benchmark_processing(config, main.datasets, repeat))
+        print(f'Scale {scale}: callbacks')
+        results.update(benchmark_callbacks(main, repeat))
+        print(f'Scale {scale}: figure transport')
+        results.update(benchmark_transport(main, repeat))
+
+        for name, timing in results.items():
+            report['results'].setdefault(name, {})[str(scale)] = timing
+
+    report['scaling'] = scaling_exponents(report['results'], scales)
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the data loading, processing and callbacks')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 2, 4],
+                        help='scale factors of the synthetic data (countries, years of temperature anomalies)')
+    parser.add_argument('--grid-factor', type=int, default=1,
+                        help='refinement of the 2° grid of the temperature anomalies (2 = 1° grid)')
+    parser.add_argument('--repeat', type=int, default=5, help='number of calls per benchmark')
+    parser.add_argument('--data-dir', default=None, help='directory of the synthetic data (default: temporary)')
+    parser.add_argument('--output', default=None, help='filepath of the JSON report '
+                                                       '(default: benchmarks/results/benchmark-<timestamp>.json)')
+    parser.add_argument('--baseline', default=None, help='JSON report to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown compared to the baseline that is flagged as regression')
+    args = parser.parse_args()
+
+    # integer scales are written without decimals (i.e. "2" instead of "2.0")
+    scales = [int(scale) if float(scale).is_integer() else scale for scale in args.scales]
+
+    if args.data_dir is None:
+        with tempfile.TemporaryDirectory() as data_dirpath:
+            benchmark_report = run_benchmarks(scales, args.grid_factor, args.repeat, data_dirpath)
+    else:
+        benchmark_report = run_benchmarks(scales, args.grid_factor, args.repeat, args.data_dir)
+
+    print_report(benchmark_report)
+
+    output = Path(args.output or f"benchmarks/results/benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as report_file:
+        json.dump(benchmark_report, report_file, indent=2)
+    print(f'Report written to {output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            benchmark_regressions = compare_results(benchmark_report, json.load(baseline_file), args.threshold)
+
+        for regression in benchmark_regressions:
+            print(f"REGRESSION {regression['benchmark']} (scale {regression['scale']}): "
+                  f"{regression['baseline_median'] * 1000:.1f}ms -> {regression['median'] * 1000:.1f}ms "
+                  f"({regression['ratio']}x)")
+
+        if benchmark_regressions:
+            sys.exit(1)
+        print('No regressions compared to the baseline')
@@ -0,0 +1,255 @@
+from datetime import date
+from pathlib import Path
+import json
+
+import numpy as np
+import pandas as pd
+
+# names of the real data, so that the options of the dashboard (config.yaml) match the synthetic data
+CONTINENTS = ['Africa', 'Asia', 'Europe', 'North America', 'South America', 'Oceania']
+REGIONS = ['East Asia & Pacific', 'Europe & Central Asia', 'Latin America & Caribbean', 'Middle East & North Africa',
+           'North America', 'South Asia', 'Sub-Saharan Africa']
+INCOME_GROUPS = ['High income', 'Upper middle income', 'Lower middle income', 'Low income']
+# countries used as reference in the benchmarks
+REFERENCE_COUNTRIES = [('Germany', 'DEU', 'Europe'), ('France', 'FRA', 'Europe'), ('India', 'IND', 'Asia'),
+                       ('Niger', 'NER', 'Africa'), ('Nigeria', 'NGA', 'Africa')]
+
+
+def scale_parameters(scale, grid_factor=1):
+    """
+    Translates a scale factor into the size of the synthetic data.
+    Scale 1 corresponds to the number of countries of the real data, but only 2 years of temperature anomalies.
+
+    :param scale: scale factor (more countries, more years of temperature anomalies)
+    :param grid_factor: refinement of the 2° grid of the temperature anomalies (i.e. 2 = 1° grid)
+    :return: dictionary of the data sizes
+    """
+    return {'countries': max(len(REFERENCE_COUNTRIES), int(round(200 * scale))),
+            'anomaly_years': max(1, int(round(2 * scale))),
+            'grid_factor': grid_factor,
+            'co2_years': (1750, 2022),
+            'polygon_vertices': 256}
+
+
+def create_countries(number, rng):
+    """
+    Creates synthetic countries (reference countries first) with continent, region, income group and memberships
+
+    :param number: number of countries
+    :param rng: numpy random generator
+    :return: countries as Pandas Dataframe
+    """
+    countries = [{'country': name, 'iso_code': iso_code, 'continent': continent}
+                 for name, iso_code, continent in REFERENCE_COUNTRIES]
+    for i in range(len(countries), number):
+        countries.append({'country': f'Country {i:04d}', 'iso_code': f'X{i:04d}',
+                          'continent': CONTINENTS[rng.integers(len(CONTINENTS))]})
+
+    df = pd.DataFrame(countries)
+    df['Region'] = rng.choice(REGIONS, len(df))
+    df['Income group'] = rng.choice(INCOME_GROUPS, len(df))
+    df['EU member'] = (df['continent'] == 'Europe') & (rng.random(len(df)) < 0.6)
+    df['OECD member'] = df['EU member'] | (rng.random(len(df)) < 0.1)
+
+    return df
+
+
+def write_co2_data(df_countries, years, filepath, rng):
+    """
+    Writes synthetic CO2-Data (format of "Our World in Data", including aggregates like 'World')
+
+    :param df_countries: countries (see create_countries)
+    :param years: first and last year
+    :param filepath: filepath to CSV-File
+    :param rng: numpy random generator
+    :return: no return
+    """
+    year = np.arange(years[0], years[1] + 1)
+    n_countries, n_years = len(df_countries), len(year)
+
+    population = rng.uniform(1e5, 1e9, n_countries)[:, None] * np.linspace(0.3, 1, n_years)[None, :]
+    co2_per_capita = rng.uniform(0.1, 20, n_countries)[:, None] * np.linspace(0.05, 1, n_years)[None, :]
+    co2 = co2_per_capita * population / 1e6
+    consumption_co2 = co2 * rng.uniform(0.7, 1.3, (n_countries, 1))
+    # consumption based emissions are only available since 1990
+    consumption_co2[:, year < 1990] = np.nan
+    temperature_change_from_co2 = np.cumsum(co2, axis=1) * 1e-6
+
+    df = pd.DataFrame({'country': np.repeat(df_countries['country'].to_numpy(), n_years),
+                       'iso_code': np.repeat(df_countries['iso_code'].to_numpy(), n_years),
+                       'year': np.tile(year, n_countries),
+                       'population': population.ravel(),
+                       'co2': co2.ravel(),
+                       'consumption_co2': consumption_co2.ravel(),
+                       'consumption_co2_per_capita': (consumption_co2 * 1e6 / population).ravel(),
+                       'temperature_change_from_co2': temperature_change_from_co2.ravel()})
+
+    # aggregates without iso_code (are removed by the enrichment)
+    df_world = df.groupby('year', as_index=False)[['population', 'co2', 'consumption_co2',
+                                                   'temperature_change_from_co2']].sum()
+    df_world['country'] = 'World'
+    df_world['consumption_co2_per_capita'] = df_world['consumption_co2'] * 1e6 / df_world['population']
+
+    pd.concat([df, df_world], ignore_index=True).to_csv(filepath, index=False)
+
+
+def write_co2_codebook(filepath):
+    """
+    Writes codebook of the synthetic CO2-Data
+
+    :param filepath: filepath to CSV-File
+    :return: no return
+    """
+    descriptions = {
+        'country': 'Geographic location.',
+        'year': 'Year of observation.',
+        'iso_code': 'ISO 3166-1 alpha-3 code.',
+        'population': 'Population by country.',
+        'co2': 'Annual total emissions of carbon dioxide (CO₂), excluding land-use change, measured in million '
+               'tonnes. This is based on territorial emissions.',
+        'consumption_co2': 'Annual consumption-based emissions of carbon dioxide (CO₂), measured in million '
+                           'tonnes. Consumption-based emissions are adjusted for trade.',
+        'consumption_co2_per_capita': 'Annual consumption-based emissions of carbon dioxide (CO₂), measured in '
+                                      'tonnes per person. Consumption-based emissions are adjusted for trade.',
+        'temperature_change_from_co2': 'Change in global mean surface temperature (in °C) caused by CO₂ emissions. '
+                                       'This measures each country\'s contribution to global mean surface '
+                                       'temperature rise.'}
+
+    pd.DataFrame({'column': list(descriptions), 'description': list(descriptions.values()),
+                  'source': 'Synthetic data'}).to_csv(filepath, index=False)
+
+
+def write_country_mappings(df_countries, cc_filepath, grouping_filepath):
+    """
+    Writes synthetic country-continent mapping (CSV) and World Bank country groupings (XLSX)
+
+    :param df_countries: countries (see create_countries)
+    :param cc_filepath: filepath to CSV-File
+    :param grouping_filepath: filepath to XLSX-File
+    :return: no return
+    """
+    pd.DataFrame({'Continent_Name': df_countries['continent'], 'Continent_Code': df_countries['continent'].str[:2],
+                  'Country_Name': df_countries['country'], 'Two_Letter_Country_Code': df_countries['iso_code'].str[:2],
+                  'Three_Letter_Country_Code': df_countries['iso_code'],
+                  'Country_Number': np.arange(len(df_countries))}).to_csv(cc_filepath, index=False)
+
+    df_economies = pd.DataFrame({'Economy': df_countries['country'], 'Code': df_countries['iso_code'],
+                                 'Region': df_countries['Region'], 'Income group': df_countries['Income group'],
+                                 'Lending category': None})
+    df_groups = pd.concat([
+        pd.DataFrame({'GroupCode': 'EUU', 'GroupName': 'European Union',
+                      'CountryCode': df_countries.loc[df_countries['EU member'], 'iso_code'],
+                      'CountryName': df_countries.loc[df_countries['EU member'], 'country']}),
+        pd.DataFrame({'GroupCode': 'OED', 'GroupName': 'OECD members',
+                      'CountryCode': df_countries.loc[df_countries['OECD member'], 'iso_code'],
+                      'CountryName': df_countries.loc[df_countries['OECD member'], 'country']})])
+
+    with pd.ExcelWriter(grouping_filepath) as writer:
+        df_economies.to_excel(writer, sheet_name='List of economies', index=False)
+        df_groups.to_excel(writer, sheet_name='Groups', index=False)
+
+
+def write_geo_data(df_countries, vertices, filepath):
+    """
+    Writes synthetic country shapes (polygons on a regular raster) as GeoJSON
+
+    :param df_countries: countries (see create_countries)
+    :param vertices: number of vertices per polygon
+    :param filepath: filepath to GeoJSON-File
+    :return: no return
+    """
+    columns = int(np.ceil(np.sqrt(len(df_countries) * 2)))
+    width, height = 360 / columns, 180 / int(np.ceil(len(df_countries) / columns))
+    angle = np.linspace(0, 2 * np.pi, vertices)
+
+    features = []
+    for i, (country, iso_code) in enumerate(zip(df_countries['country'], df_countries['iso_code'])):
+        center_lon = -180 + (i % columns + 0.5) * width
+        center_lat = -90 + (i // columns + 0.5) * height
+        ring = np.column_stack([center_lon + np.cos(angle) * width * 0.45,
+                                center_lat + np.sin(angle) * height * 0.45]).round(4)
+        ring[-1] = ring[0]
+        features.append({'type': 'Feature', 'properties': {'ADMIN': country, 'ISO_A3': iso_code},
+                         'geometry': {'type': 'Polygon', 'coordinates': [ring.tolist()]}})
+
+    with open(filepath, 'w') as geo_file:
+        json.dump({'type': 'FeatureCollection', 'features': features}, geo_file)
+
+
+def write_nasa_nc_data(anomaly_years, grid_factor, filepath, rng):
+    """
+    Writes synthetic gridded monthly temperature anomalies (format of GISTEMP v4 NetCDF-File, 2° grid by default),
+    starting 1990 (earlier periods are skipped by read_nasa_file anyway)
+
+    :param anomaly_years: number of years
+    :param grid_factor: refinement of the 2° grid (grid points at the odd degrees are kept)
+    :param filepath: filepath to NetCDF-File
+    :param rng: numpy random generator
+    :return: no return
+    """
+    import netCDF4
+
+    step = 2 / grid_factor
+    lat = np.arange(-89, 89 + step / 2, step)
+    lon = np.arange(-179, 179 + step / 2, step)
+    months = [(year, month) for year in range(1990, 1990 + anomaly_years) for month in range(1, 13)]
+
+    nc_dataset = netCDF4.Dataset(filepath, 'w')
+    nc_dataset.createDimension('lat', len(lat))
+    nc_dataset.createDimension('lon', len(lon))
+    nc_dataset.createDimension('time', None)
+    nc_dataset.createVariable('lat', 'f4', ('lat',))[:] = lat
+    nc_dataset.createVariable('lon', 'f4', ('lon',))[:] = lon
+    nc_dataset.createVariable('time', 'i4', ('time',))[:] = [(date(year, month, 15) - date(1800, 1, 1)).days
+                                                             for year, month in months]
+    temp_anomaly = nc_dataset.createVariable('tempanomaly', 'i2', ('time', 'lat', 'lon'), fill_value=32767)
+    temp_anomaly.scale_factor = 0.01
+
+    # warming trend with noise, polar regions partly without values (as in the real data)
+    values = rng.normal(0, 1.2, (len(months), len(lat), len(lon))) + np.linspace(0.2, 1.2, len(months))[:, None, None]
+    values[:, np.abs(lat) > 80, :] = np.nan
+    temp_anomaly[:] = np.ma.masked_array(np.nan_to_num(values), mask=np.isnan(values))
+
+    nc_dataset.close()
+
+
+def create_synthetic_data(dirpath, scale=1, grid_factor=1, seed=0):
+    """
+    Creates synthetic but realistic input data of the dashboard at the given scale
+
+    :param dirpath: path to directory of the synthetic data
+    :param scale: scale factor (see scale_parameters)
+    :param grid_factor: refinement of the 2° grid of the temperature anomalies
+    :param seed: seed of the random generator
+    :return: filepaths of the synthetic data (keys as in config.yaml), data sizes
+    """
+    directory = Path(dirpath)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    parameters = scale_parameters(scale, grid_factor)
+
+    filepaths = {'geo_data': str(directory / 'countries.geojson'),
+                 'geo_data_cache': str(directory / 'countries.parquet'),
+                 'grid_country_mapping': str(directory / 'grid-country-mapping.parquet'),
+                 'nasa_nc_data': str(directory / 'gistemp.nc'),
+                 'nasa_json_data': str(directory / 'gistemp.json'),
+                 'owid_co2_data': str(directory / 'owid-co2-data.csv'),
+                 'owid_co2_codebook': str(directory / 'owid-co2-codebook.csv'),
+                 'owid_co2_partitions': str(directory / 'owid-co2-partitions'),
+                 'country_continent_mappings': str(directory / 'country-and-continent-codes-list.csv'),
+                 'country_grouping_mappings': str(directory / 'CLASS.xlsx'),
+                 'shared_data_store': str(directory / 'shared-store'),
+                 'startup_profile': str(directory / 'startup-profile.json')}
+
+    df_countries = create_countries(parameters['countries'], rng)
+    write_co2_data(df_countries, parameters['co2_years'], filepaths['owid_co2_data'], rng)
+    write_co2_codebook(filepaths['owid_co2_codebook'])
+    write_country_mappings(df_countries, filepaths['country_continent_mappings'],
+                           filepaths['country_grouping_mappings'])
+    write_geo_data(df_countries, parameters['polygon_vertices'], filepaths['geo_data'])
+    write_nasa_nc_data(parameters['anomaly_years'], parameters['grid_factor'], filepaths['nasa_nc_data'], rng)
+
+    # the JSON-File is created from the NetCDF-File by read_nasa_file
+    Path(filepaths['nasa_json_data']).unlink(missing_ok=True)
+
+    return filepaths, parameters
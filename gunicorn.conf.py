@@ -0,0 +1,32 @@
+# ----------------------------------------------------------------------------------------------------------------------
+# PRODUCTION SERVING: gunicorn -c gunicorn.conf.py
+# The shared datasets (sources and the arrays derived from them, see shared_datasets) are loaded and derived once
+# by the gunicorn master process and published as memory-mappable files. Each worker attaches them read-only
+# (see create_app in main.py), so their buffers are shared by all workers instead of being built per worker.
+import multiprocessing
+import os
+
+from utils.data_loading import read_config_file
+from utils.data_store import create_datasets, publish_datasets
+
+wsgi_app = 'main:create_app()'
+bind = os.environ.get('BIND', '0.0.0.0:8051')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# several request threads per worker, the datasets and the configuration are read-only (see protect)
+threads = int(os.environ.get('THREADS', 4))
+
+
+def on_starting(server):
+    """
+    Publishes the shared datasets before the workers are started
+
+    :param server: gunicorn arbiter
+    :return: no return
+    """
+    config = read_config_file()
+    dirpath = config['filepaths']['shared_data_store']
+
+    publish_datasets(create_datasets(config), config['data_information']['shared_datasets'], dirpath)
+
+    # inherited by the workers
+    os.environ['DATA_STORE_DIR'] = dirpath
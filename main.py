@@ -1,14 +1,35 @@
+import os
+import sys
+import time
+from functools import lru_cache
+
+from utils.profiling import *
+
+# ----------------------------------------------------------------------------------------------------------------------
+# STARTUP PROFILING (python main.py --profile-startup or environment variable PROFILE_STARTUP=1):
+# import times of the heavy libraries, wall time, CPU time, peak RSS delta and output size of each loading stage
+if '--profile-startup' in sys.argv or os.environ.get('PROFILE_STARTUP'):
+    enable_profiling()
+    profile_imports(['numpy', 'pandas', 'pyarrow', 'yaml', 'plotly', 'dash', 'dash_bootstrap_components',
+                     'geopandas', 'netCDF4', 'geopy'])
+
 # import interactivity-framework dash and needed components
-from dash import Dash, dcc, Output, Input, State, html, dash_table, no_update
+from dash import Dash, dcc, Output, Input, State, html, dash_table, no_update, callback, clientside_callback, \
+    ClientsideFunction, ctx
 import dash_bootstrap_components as dbc
+from flask import Response, abort, current_app, request
 
 from utils.data_loading import *
 from utils.data_processing import *
 from utils.dash_processing import *
+from utils.data_store import *
+from utils.api import register_api, QueryError, error_response, export_format, export_response, stream_csv, \
+    stream_parquet
 
 # ----------------------------------------------------------------------------------------------------------------------
 
-config = read_config_file()
+# read-only configuration, shared by all threads
+config = protect(read_config_file())
 
 # ----------------------------------------------------------------------------------------------------------------------
 # EXTRACT DEFAULT VALUES
@@ -16,654 +37,994 @@ default_height = int(config['dash_information']['general']['default_padding_valu
 default_color = config['dash_information']['general']['default_color_hex']
 default_table_style = config['dash_information']['general']['default_table_style']
 
-# ----------------------------------------------------------------------------------------------------------------------
-# EXTRACT FILEPATHS
-filepath_content_data = config['filepaths']['content_data']
-filepath_geo_data = config['filepaths']['geo_data']
-filepath_nasa_nc_data = config['filepaths']['nasa_nc_data']
-filepath_nasa_json_data = config['filepaths']['nasa_json_data']
-filepath_owid_co2_data = config['filepaths']['owid_co2_data']
-filepath_owid_co2_codebook = config['filepaths']['owid_co2_codebook']
-filepath_country_continent_mappings = config['filepaths']['country_continent_mappings']
-filepath_country_grouping_mappings = config['filepaths']['country_grouping_mappings']
-
 # ----------------------------------------------------------------------------------------------------------------------
 # EXTRACT DASHBOARD CONTENT
-content = read_content_file(filepath_content_data)
+content = read_content_file(config['filepaths']['content_data'])
 
 # ----------------------------------------------------------------------------------------------------------------------
-# LOAD GEOJSON FOR COUNTRY BORDERS
-gdf_countries = read_geo_data(filepath_geo_data)
+# DATASETS: lazily loaded handles, each dataset is only loaded on first use by the section that needs it
+# (anomaly data, geo data, co2 data incl. enrichment, co2 codebook, co2 impact)
+datasets = create_datasets(config)
+
+co2_data_default_years = config['data_information']['co2_data_default_years']
+
+# default values of the section inputs (the figures of this default state are embedded in the layout)
+default_inputs = {
+    '01_input_tab_map_layers': 'grid',
+    '03_input_tab_worldmap_treemap': 'world',
+    '03_input_ddl_treemap_grouping_options': 'all#continent',
+    '04_input_ddl_grouping_options': 'grouping#Income group',
+    '04_input_rsl_years': [1997, 2015],
+}
+
+# sections below the fold, rendered only when scrolled into view or reached through the navigation
+# (section id: navigation link id, visibility store id)
+lazy_sections = {
+    '02_comparison_temperature_anomalies': ('02_link', '02_store_section_visible'),
+    '03_co2_impact_on_temperature': ('03_link', '03_store_section_visible'),
+    '04_global_co2_consumption': ('04_link', '04_store_section_visible'),
+}
+
+
+@lru_cache(maxsize=4)
+def co2_data_window(year_min, year_max):
+    """
+    Provides co2 data, indexes and matrices of the given year window.
+    The default window is kept in memory, other windows are read from the needed partitions only.
 
-# ----------------------------------------------------------------------------------------------------------------------
-# LOAD GLOBAL TEMPERATURE ANOMALIES: NASA FILE (original: nc; edited: json)
-df_anomaly_heatmap = read_nasa_file(filepath_nasa_nc_data, filepath_nasa_json_data)
-giss_data_latest_date = df_anomaly_heatmap['Period'].max()
+    :param year_min: first year of the window
+    :param year_max: last year of the window
+    :return: co2 data of the year window as dictionary (dataframe, indexes, matrices)
+    """
+    if [year_min, year_max] == co2_data_default_years:
+        return datasets['co2_data'].get()
 
-# ----------------------------------------------------------------------------------------------------------------------
-# LOAD, EDIT AND ENRICH GLOBAL CO2 DATA: OWID (Our World In Data)
-co2_data_columns = config['data_information']['co2_data_columns']
-co2_data_na_columns = config['data_information']['co2_data_na_columns']
-co2_data_drop_cc_combinations = config['data_information']['co2_data_drop_cc_combinations']
+    # make sure the partitions are up-to-date
+    datasets['co2_partitions'].get()
 
-df_cc_mapping = read_cc_mapping(filepath_country_continent_mappings)
-df_countries_by_income, df_countries_eu, df_countries_oecd = read_country_groupings(filepath_country_grouping_mappings)
+    return read_co2_data_window(config, year_min, year_max)
 
-df_co2_data = read_co2_data(filepath_owid_co2_data)
-df_co2_data = co2_data_filter(df_co2_data, co2_data_columns, co2_data_na_columns)
-df_co2_data = co2_data_add_continents(df_co2_data, df_cc_mapping, co2_data_drop_cc_combinations)
-df_co2_data = co2_data_add_groupings(df_co2_data, df_countries_by_income, df_countries_eu, df_countries_oecd)
 
-# ----------------------------------------------------------------------------------------------------------------------
-# LOAD CO2 DATA CODEBOOK: OWID (Our World In Data)
-df_co2_codebook = read_co2_data_codebook(filepath_owid_co2_codebook)
-data_columns_information = config['data_columns_information']
-for data_column in data_columns_information:
-    if data_column['data_source_column'] == 'CO2 and Greenhouse Gas Emissions (Our World in Data)':
-        data_column['data_description'] = df_co2_codebook.loc[data_column['data_column'], 'description']
+def figure_transport(fig):
+    """
+    Opt-in binary transport of the large figure arrays (dash_information.general.figure_arrays,
+    see compact_figure_arrays)
 
-# ----------------------------------------------------------------------------------------------------------------------
+    :param fig: figure
+    :return: figure with compact typed arrays if enabled, otherwise the unchanged figure
+    """
+    settings = config['dash_information']['general']['figure_arrays']
 
-# Create the Dash application
-app = Dash(__name__, external_stylesheets=[dbc.themes.UNITED], title='Explorative Analysis of clima crisis')
-
-# Definiere das Layout
-app.layout = dbc.Container(
-    html.Div([
-
-        # --------------------------------------------------------------------------------------------------------------
-        # Preliminary information
-        dbc.Row(
-            dbc.Col([
-                html.Div('Preliminary information'),
-                dcc.Checklist(id='checkbox_show_again', options=[{'label': "Don't show again", 'value': 'disable'}]),
-                html.Button('Close', id='hide_button'),
-                ],
-                width=12,
-            ), style={'opacity': 1, 'transition': 'opacity 0.5s'},
-            id='preliminary_information'),
-
-        # --------------------------------------------------------------------------------------------------------------
-        # HEADLINE WITH BACKGROUND IMAGE
-        dbc.Row(
-            dbc.Col(
-                html.Div(children=[
-                    html.H1(children=content['00_header']['title'],
-                            id='00_header_title',
-                            style={'color': 'white', 'text-align': 'center'}),
-                    html.H4(children=content['00_header']['subtitle'],
-                            id='00_header_subtitle',
-                            style={'color': 'white', 'text-align': 'center',
-                                   'paddingTop': default_height, 'paddingBottom': default_height})
-                ], style={'background-image': 'url(/assets/header_bg.png)',
-                          'background-repeat': 'no-repeat',
-                          'background-size': 'cover',
-                          'height': '30vh',
-                          'display': 'flex',
-                          'flex-direction': 'column',
-                          'justify-content': 'flex-end'}),
-                width=12),
-            id='00_header'),
-
-        # --------------------------------------------------------------------------------------------------------------
-        # 00 NAVIGATION LINKS AND REFERENCE INPUT
-        dbc.Row([
-            # 00.1 NAVIGATION LINKS
-            dbc.Row([
-                dbc.Col(
-                    html.Div(),
-                    width=1),
+    return compact_figure_arrays(fig, settings['min_length']) if settings['binary'] else fig
 
-                dbc.Col(
-                    html.Div([
-                        html.A('Introduction', href='#00_header',
-                               id='00_link', className='nav-link', n_clicks=0),
-                        html.A('Global heatmap', href='#01_global_temperature_anomalies',
-                               id='01_link', className='nav-link', n_clicks=0),
-                        html.A('Temperature anomalies', href='#02_comparison_temperature_anomalies',
-                               id='02_link', className='nav-link', n_clicks=0),
-                        html.A('CO₂ impact', href='#03_co2_impact_on_temperature',
-                               id='03_link', className='nav-link', n_clicks=0),
-                        html.A('CO₂ consumption', href='#04_global_co2_consumption',
-                               id='04_link', className='nav-link', n_clicks=0),
-                        html.A('Data & Information', href='#05_data_and_information',
-                               id='05_link', className='nav-link', n_clicks=0),
-                    ], className='nav d-flex justify-content-between'),
-                    width=10),
 
-                dbc.Col(
-                    html.Div(),
-                    width=1),
-            ], style={'backgroundColor': '#FFFFFF', 'height': 35, 'fontSize': '1.125rem', 'font-weight': 'bold'}),
+def current_data_version():
+    """
+    :return: version of the data (latest period of the anomaly data, fingerprint of the co2 data)
+    """
+    return datasets['anomaly_data'].get()['Period'].max(), datasets['co2_partitions'].get()['fingerprint']
 
-            # 00.2 SEPARATION LINE
-            dbc.Row(
-                dbc.Col(
-                    html.Hr(style={'height': 5}),
-                    width=12, style={'backgroundColor': '#FFFFFF'}
-                )
-            ),
 
-            # 00.3 REFERENCE HEADLINE
-            dbc.Row([
-                dbc.Col(
-                    html.Div(children=content['00_navigation_and_reference']['reference_intro'],
-                             id='00_navigation_and_reference_reference_intro'),
-                    width=8, style={'text-align': 'left', 'backgroundColor': '#FFFFFF', 'font-weight': 'bold'}
-                ),
-                dbc.Col(
-                    html.Div(children=content['00_navigation_and_reference']['reference_headline_default'],
-                             id='00_output_txt_reference_headline',
-                             style={'text-align': 'center', 'font-weight': 'bold'}),
-                    width=4
-                )
-            ], style={'background-color': '#FFFFFF'}),
-
-            # 00.4 INPUT & OUTPUT REFERENCE
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        dcc.Input(id='00_input_txt_coordinates', type='text', value='', style={'width': '80%'},
-                                  placeholder='Enter Coordinates'),
-                        html.Button('Find', id='00_input_btn_reference_coordinates', n_clicks=0)
-                    ]),
-                    width=4,
-                    style={'text-align': 'center', 'backgroundColor': '#FFFFFF'}
-                ),
+def default_arguments():
+    """
+    Arguments of the render functions of the sections below the fold in their default state (no reference)
 
-                dbc.Col(
-                    html.Div([
-                        dcc.Input(id='00_input_txt_location', type='text', value='', style={'width': '80%'},
-                                  placeholder='Enter location'),
-                        html.Button('Find', id='00_input_btn_reference_location', n_clicks=0)
-                    ]),
-                    width=4,
-                    style={'text-align': 'center', 'backgroundColor': '#FFFFFF'}
-                ),
+    :return: arguments per render function
+    """
+    df_anomaly_heatmap = datasets['anomaly_data'].get()
 
-                dbc.Col(
-                    html.Div([
-                        html.Div(id='00_output_txt_reference_location',
-                                 style={'text-align': 'right'})
-                    ]),
-                    width=2,
-                    style={'backgroundColor': '#FFFFFF'}
-                ),
+    return {'render_local_anomalies': (df_anomaly_heatmap['Year'].min(), None),
+            'render_global_temperature_impact': (default_inputs['03_input_tab_worldmap_treemap'],
+                                                 default_inputs['03_input_ddl_treemap_grouping_options'], None),
+            'render_co2_development': (default_inputs['04_input_ddl_grouping_options'],
+                                       default_inputs['04_input_rsl_years'], None, None)}
 
-                dbc.Col(
-                    html.Div([
-                        html.Div(id='00_output_txt_reference_coordinates',
-                                 style={'text-align': 'right'})
-                    ]),
-                    width=2
-                )
-            ], style={'paddingTop': default_height, 'background-color': '#FFFFFF'}),
-
-            # 00.5 SEPARATION LINE
-            dbc.Row(
-                dbc.Col(
-                    html.Hr(style={'height': 5}),
-                    width=12, style={'backgroundColor': '#FFFFFF'}
-                )
-            ),
 
-        ], id='00_navigation_and_reference', className="sticky-top", style={'margin': '0.025rem'}),
+def app_geolocator():
+    """
+    :return: geocoder of the app handling the current request (see create_app), None for the default geocoder
+    """
+    return current_app.config.get('GEOLOCATOR')
 
-        # --------------------------------------------------------------------------------------------------------------
-        # 01 INTRODUCTION AND WORLD HEATMAP (GLOBAL TEMPERATURE ANOMALIES)
-        dbc.Row([
-            # 01.1 INTRODUCTION
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        html.H5('Introduction'),
-                        html.Hr(),
-                        html.Div(children=content['01_global_temperature_anomalies']['content_header'],
-                                 id='01_global_temperature_anomalies_txt_content',
-                                 style={'text-align': 'left', 'paddingTop': default_height}),
-                        html.Div(children=content['01_global_temperature_anomalies']['content_description'],
-                                 id='01_global_temperature_anomalies_txt_content_description',
-                                 style={'text-align': 'left'}),
-                    ]),
-                    width=12
-                )
-            ]),
 
-            # 01.2 FILLED SEPARATION LINE
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        html.Div(style={'background-color': default_color, 'height': default_height}),
-                    ]),
-                    width=12
-                ),
+@lru_cache(maxsize=1)
+def read_app_state(state_version):
+    """
+    Reads the state of the app which is changed at runtime (see read_state_file) once per version of the state file.
 
-            ], style={'paddingTop': default_height * 2}),
+    :param state_version: version of the state file (inode and modification time, None if not written yet)
+    :return: read-only state data
+    """
+    return protect(read_state_file(config['filepaths']['app_state'],
+                                   {'show_preliminary_info': config['show_preliminary_info']}))
 
-            # 01.3 HEADLINE GLOBAL TEMPERATURE ANOMALIES AND TEXTUAL OUTPUT TEMPERATURE ANOMALY REFERENCE LOCATIONS
-            dbc.Row([
-                dbc.Col(width=3),
 
-                dbc.Col(
-                    html.Div([
-                        html.H5(children=f"{content['01_global_temperature_anomalies']['header_figure']} "
-                                         f"from {giss_data_latest_date}",
-                                id='01_global_temperature_anomalies_header_figure',
-                                style={'text-align': 'center', 'font-weight': 'bold'}),
-                        html.Div(style={'background-color': default_color, 'height': default_height}),
-                        html.Div(children=content['01_global_temperature_anomalies']['reference_temp_anomaly_default'],
-                                 id='01_output_txt_reference_temp_anomaly',
-                                 style={'text-align': 'center', 'font-weight': 'bold'}),
-                        html.Div(children=content['01_global_temperature_anomalies']['figdata_temp_anomaly_default'],
-                                 id='01_output_txt_figdata_temp_anomaly',
-                                 style={'text-align': 'center', 'font-weight': 'bold'})
-                    ]),
-                    width=6
-                ),
+def app_state():
+    """
+    Provides the state of the app which is changed at runtime, the state file is only read again after it changed
+    (it is replaced as a whole, see update_state_file).
 
-                dbc.Col(width=3)
-            ], style={'paddingTop': default_height}),
+    :return: read-only state data
+    """
+    try:
+        stat = os.stat(config['filepaths']['app_state'])
+        state_version = (stat.st_ino, stat.st_mtime_ns)
+    except FileNotFoundError:
+        state_version = None
 
-            # 01.4 FIGURE WORLD HEATMAP (GLOBAL TEMPERATURE ANOMALIES)
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        dcc.Graph(id='01_output_fig_global_heatmap_temp_anomalies',
-                                  config=config['dash_information']['general']['fig_config'],
-                                  style={'height': '60vh'}),
-                    ]),
-                    width=12
-                )
+    return read_app_state(state_version)
 
-            ]),
 
-            # 01.5 CONCLUSION
-            dbc.Row([
-                dbc.Col(width=3),
+@lru_cache(maxsize=1)
+def render_default_state(data_version):
+    """
+    Renders the outputs of all sections in their default state (default inputs, no reference) once per data version.
+    They are embedded in the layout (sections below the fold: on demand), so a page load does not need any callback.
 
-                dbc.Col(
-                    html.Div([
-                        html.Div(children='Conclusions:', style={'text-align': 'left', 'font-weight': 'bold'}),
-                        html.Div(children=content['01_global_temperature_anomalies']['figure_description'],
-                                 id='01_global_temperature_anomalies_txt_figure_description',
-                                 style={'text-align': 'left', 'paddingTop': default_height}),
-                    ]),
-                    width=6
-                ),
+    :param data_version: version of the data (latest period of the anomaly data, fingerprint of the co2 data)
+    :return: output properties of the default state as dictionary (component id.property)
+    """
+    arguments = default_arguments()
+
+    fig_heatmap, _, _ = global_anomalies(default_inputs['01_input_tab_map_layers'], None, None, None, None, None)
+    fig_polar_line, fig_line = render_local_anomalies(*arguments['render_local_anomalies'])
+    fig_impact, fig_ranking, style_input_ddl_treemap = render_global_temperature_impact(
+        *arguments['render_global_temperature_impact'])
+    fig_development, fig_comparison, style_input_chkl_countries = render_co2_development(
+        *arguments['render_co2_development'])
+
+    return {'01_output_fig_global_heatmap_temp_anomalies.figure': fig_heatmap,
+            '02_output_fig_minmax_temp_anomaly.figure': fig_polar_line,
+            '02_output_fig_mean_temp_anomalies.figure': fig_line,
+            '03_output_fig_temp_change_co2.figure': fig_impact,
+            '03_output_fig_temp_change_co2_ranking.figure': fig_ranking,
+            '03_input_ddl_treemap_grouping_options.style': style_input_ddl_treemap,
+            '04_output_fig_co2_dev.figure': fig_development,
+            '04_output_fig_co2_cmp.figure': fig_comparison,
+            '04_input_chkl_countries.style': style_input_chkl_countries}
+
+
+def render_lazy_section(render_function, outputs, visible, arguments):
+    """
+    Renders the outputs of a section below the fold on demand: nothing before the section is visible
+    (the placeholders of the layout remain), the outputs of the default state are taken from the cache.
+
+    :param render_function: render function of the section
+    :param outputs: output properties of the section (component id.property, in order of the render function)
+    :param visible: True if the section has been scrolled into view or reached through the navigation
+    :param arguments: arguments of the render function (inputs of the section)
+    :return: outputs of the section
+    """
+    if not visible:
+        return tuple(no_update for _ in outputs)
 
-                dbc.Col(width=3)
-            ]),
-        ], id='01_global_temperature_anomalies'),
+    if tuple(arguments) == default_arguments()[render_function.__name__]:
+        default_state = render_default_state(current_data_version())
+        return tuple(default_state[output] for output in outputs)
 
-        # --------------------------------------------------------------------------------------------------------------
-        # 02 DIRECT COMPARISON GLOBAL AND LOCAL TEMPERATURE ANOMALIES
-        dbc.Row([
-            # 02.1 HEADLINES
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        html.H5(children=content['02_comparison_temperature_anomalies']['header_left'],
-                                id='02_comparison_temperature_anomalies_header_left',
-                                style={'text-align': 'center', 'font-weight': 'bold'}),
-                        html.Div(style={'background-color': default_color, 'height': default_height}),
-                    ]),
-                    width=3,
-                    style={'align-self': 'end'}
-                ),
+    return render_function(*arguments)
 
-                dbc.Col(width=6),
 
-                dbc.Col(
-                    html.Div([
-                        html.H5(children=content['02_comparison_temperature_anomalies']['header_right'],
-                                id='02_comparison_temperature_anomalies_header_right',
-                                style={'text-align': 'center', 'font-weight': 'bold'}),
-                        html.Div(style={'background-color': default_color, 'height': default_height}),
-                    ]),
-                    width=3,
-                    style={'align-self': 'end'}
-                ),
+# ----------------------------------------------------------------------------------------------------------------------
+def playback_frames(step):
+    """
+    Route of the heatmap playback: streams the delta encoded frames per month or per year in chunks
+    (see stream_playback_frames and /assets/playback.js)
 
-            ], style={'height': '25vh'}),
+    :param step: month or year
+    :return: streamed response
+    """
+    if step not in ('month', 'year'):
+        abort(404)
 
-            # 02.2 CHAPTER CONTENT
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        html.Div(children=content['02_comparison_temperature_anomalies']['content_01'],
-                                 id='02_comparison_temperature_anomalies_content_01', style={'text-align': 'center'}),
-                        html.Div(children=content['02_comparison_temperature_anomalies']['content_02'],
-                                 id='02_comparison_temperature_anomalies_content_02', style={'text-align': 'center'})
-                    ]),
-                    width=12
-                )
-            ], style={'paddingTop': default_height * 2}),
-
-            # 02.3 YEAR-SLIDER INPUT
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        html.Hr(),
-                        dcc.Slider(
-                            id='02_input_sld_years',
-                            min=df_anomaly_heatmap['Year'].min(),
-                            max=df_anomaly_heatmap['Year'].max(),
-                            value=df_anomaly_heatmap['Year'].min(),
-                            marks={str(year): str(year) if year % 5 == 0 else ''
-                                   for year in df_anomaly_heatmap['Year'].unique()},
-                            step=None
-                        ),
-                    ]),
-                    width=6
-                ),
+    return Response(stream_playback_frames(datasets['anomaly_playback'].get(), step,
+                                           config['dash_information']['01_playback']['chunk_frames']),
+                    mimetype='application/octet-stream')
 
-                dbc.Col(width=6),
-            ], style={'paddingTop': default_height}),
 
-            # 02.4 FIGURE OUTPUTS
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        dcc.Graph(id='02_output_fig_minmax_temp_anomaly',
-                                  config=config['dash_information']['general']['fig_config']),
-                    ]),
-                    width=6
-                ),
+def export_co2_development():
+    """
+    Route of the export of the co2 development view of section 04 (see co2_development_view), streamed as CSV or
+    Parquet in chunks of rows: /api/export/co2_development?grouping=<option>&years=<first>&years=<last>
+    [&countries=<country>...][&coordinates=<coordinates>&location=<location>...][&format=csv|parquet]
 
-                dbc.Col(
-                    html.Div([
-                        dcc.Graph(id='02_output_fig_mean_temp_anomalies',
-                                  config=config['dash_information']['general']['fig_config'])
-                    ]),
-                    width=6
-                ),
-            ])
-        ], id='02_comparison_temperature_anomalies'),
+    :return: streamed response (download)
+    """
+    try:
+        data_format = export_format(('csv', 'parquet'))
+        grouping_option = request.args.get('grouping', default_inputs['04_input_ddl_grouping_options'])
+        if grouping_option not in [option['value'] for option in
+                                   config['dash_information']['04_input_ddl_grouping_options']
+                                   if not option.get('disabled')]:
+            raise QueryError('unknown grouping')
+        xy_years = request.args.getlist('years', type=int) or default_inputs['04_input_rsl_years']
+        if len(xy_years) != 2:
+            raise QueryError('years must be given as first and last year')
+
+        # references as pairs of coordinates and location (in order)
+        pins = [{'coordinates': coordinates, 'location': location} for coordinates, location
+                in zip(request.args.getlist('coordinates'), request.args.getlist('location'))]
+        for pin in pins:
+            try:
+                if pin['coordinates']:
+                    extract_lat_lon(pin['coordinates'])
+            except (ValueError, OverflowError):
+                raise QueryError('coordinates must be given as "<latitude>, <longitude>"')
+        references = reference_context(None, None, pins)
+        df_development = co2_development_view(grouping_option, xy_years, request.args.getlist('countries'),
+                                              references)['df']
+        if df_development is None:
+            raise QueryError('no countries selected')
+    except QueryError as error:
+        return error_response(error)
+
+    chunk_rows = config['data_information']['api_export_chunk_rows']
+    # at least one (empty) chunk: the file has a header / schema even without rows
+    frames = (df_development.iloc[first:first + chunk_rows]
+              for first in range(0, max(len(df_development), 1), chunk_rows))
+
+    return export_response(stream_csv(frames) if data_format == 'csv' else stream_parquet(frames), data_format,
+                           'co2-development')
+
+
+def serve_layout():
+    """
+    Creates the layout of the dashboard on page load.
+    Only the datasets needed by the input components (years, countries, data descriptions) are loaded.
+    The outputs of the default state are embedded (rendered once per data version), no initial callbacks are needed.
 
-        # --------------------------------------------------------------------------------------------------------------
-        # 03 WORLDMAP / TREEMAP IMPACT CO2 TO TEMPERATURE
-        dbc.Row([
-            # 03.1 HEADLINES AND DESCRIPTION OF CO2 EMISSION IMPACT
-            dbc.Row([
-                dbc.Col(width=2),
+    :return: layout of the dashboard
+    """
+    df_anomaly_heatmap = datasets['anomaly_data'].get()
+    giss_data_latest_date = df_anomaly_heatmap['Period'].max()
 
-                dbc.Col(
-                    html.Div([
-                        html.H5(children=content['03_co2_impact_on_temperature']['header'],
-                                id='03_co2_impact_on_temperature_header',
-                                style={'text-align': 'center', 'font-weight': 'bold'}),
-                        html.Div(style={'background-color': default_color, 'height': default_height}),
-                    ]),
-                    width=8,
-                    style={'align-self': 'end'}
-                ),
+    co2_data_manifest = datasets['co2_partitions'].get()
+    df_co2_data = datasets['co2_data'].get()['df']
 
-                dbc.Col(width=2),
+    # outputs of the default state, placeholders for the figures of the sections below the fold
+    default_state = render_default_state((giss_data_latest_date, co2_data_manifest['fingerprint']))
+    placeholder_figure = create_placeholder_figure(content['general']['placeholder_figure'])
 
-            ], style={'height': '25vh'}),
+    # the setting may be changed at runtime, so it is read from the state file (shared config is read-only)
+    if app_state()['show_preliminary_info']:
+        style_preliminary_information = {'opacity': 1, 'transition': 'opacity 0.5s'}
+    else:
+        style_preliminary_information = {'display': 'none'}
 
-            # 03.2 CONCLUSION, TAB AND DROPDOWN INPUT, FIGURE OUTPUTS
-            dbc.Row([
-                dbc.Col([
-                    html.Hr(),
-                    html.Div(children=content['03_co2_impact_on_temperature']['content_01'],
-                             id='03_co2_impact_on_temperature_txt_content_01',
-                             style={'text-align': 'left', 'paddingTop': default_height}),
-                    html.Div(children=content['03_co2_impact_on_temperature']['content_02'],
-                             id='03_co2_impact_on_temperature_txt_content_02',
-                             style={'text-align': 'left', 'paddingTop': default_height})
-                ],
-                    style={'width': 2, 'paddingTop': default_height * 4}
-                ),
+    # data descriptions of the main used data columns (from codebook)
+    df_co2_codebook = datasets['co2_codebook'].get()
+    data_columns_information = [dict(data_column) for data_column in config['data_columns_information']]
+    for data_column in data_columns_information:
+        if data_column['data_source_column'] == 'CO2 and Greenhouse Gas Emissions (Our World in Data)':
+            data_column['data_description'] = df_co2_codebook.loc[data_column['data_column'], 'description']
 
-                dbc.Col(
-                    html.Div([
-                        dcc.Tabs(
-                            id="03_input_tab_worldmap_treemap", value='world',
-                            children=[
-                                dcc.Tab(label='Worldmap', value='world'),
-                                dcc.Tab(label='Treemap', value='tree')
-                            ]),
-                        dcc.Dropdown(
-                            id='03_input_ddl_treemap_grouping_options',
-                            options=config['dash_information']['03_input_ddl_treemap_options'],
-                            value='all#continent',
-                            placeholder='Select a grouping',
-                            style={'opacity': 1, 'transition': 'opacity 0.5s'}
-                        ),
-                        dcc.Graph(id='03_output_fig_temp_change_co2',
-                                  config=config['dash_information']['general']['fig_config'],
-                                  style={'height': '50vh'})
-                    ]),
-                    width=8
-                ),
+    # Definiere das Layout
+    layout = dbc.Container(
+        html.Div([
 
+            # --------------------------------------------------------------------------------------------------------------
+            # Preliminary information
+            dbc.Row(
                 dbc.Col([
-                    html.Hr(),
-                    html.Div(children=content['03_co2_impact_on_temperature']['header_fig_ranking'],
-                             id='03_co2_impact_on_temperature_header_fig_ranking',
-                             style={'text-align': 'left', 'font-weight': 'bold'}),
-                    dcc.Graph(id='03_output_fig_temp_change_co2_ranking',
-                              config=config['dash_information']['general']['fig_config'])
-                ],
-                    style={'width': 2, 'paddingTop': default_height * 4}
-                ),
-            ]),
-        ], id='03_co2_impact_on_temperature'),
+                    html.Div('Preliminary information'),
+                    dcc.Checklist(id='checkbox_show_again', options=[{'label': "Don't show again", 'value': 'disable'}]),
+                    html.Button('Close', id='hide_button', n_clicks=0),
+                    ],
+                    width=12,
+                ), style=style_preliminary_information,
+                id='preliminary_information'),
 
-        # --------------------------------------------------------------------------------------------------------------
-        # 04 CO2 CONSUMPTION AND COMPARISON OF CO2 CONSUMPTION
-        dbc.Row([
-            # 04.1 HEADLINES
-            dbc.Row([
+            # --------------------------------------------------------------------------------------------------------------
+            # HEADLINE WITH BACKGROUND IMAGE
+            dbc.Row(
                 dbc.Col(
-                    html.Div([
-                        html.H5(children=content['04_global_co2_consumption']['header_left'],
-                                id='04_global_co2_consumption_header_left',
-                                style={'text-align': 'center', 'font-weight': 'bold'}),
-                        html.Div(style={'background-color': default_color, 'height': default_height})
-                    ]),
-                    width=3,
-                    style={'align-self': 'end'}
+                    html.Div(children=[
+                        html.H1(children=content['00_header']['title'],
+                                id='00_header_title',
+                                style={'color': 'white', 'text-align': 'center'}),
+                        html.H4(children=content['00_header']['subtitle'],
+                                id='00_header_subtitle',
+                                style={'color': 'white', 'text-align': 'center',
+                                       'paddingTop': default_height, 'paddingBottom': default_height})
+                    ], style={'background-image': 'url(/assets/header_bg.png)',
+                              'background-repeat': 'no-repeat',
+                              'background-size': 'cover',
+                              'height': '30vh',
+                              'display': 'flex',
+                              'flex-direction': 'column',
+                              'justify-content': 'flex-end'}),
+                    width=12),
+                id='00_header'),
+
+            # --------------------------------------------------------------------------------------------------------------
+            # 00 NAVIGATION LINKS AND REFERENCE INPUT
+            dbc.Row([
+                # 00.1 NAVIGATION LINKS
+                dbc.Row([
+                    dbc.Col(
+                        html.Div(),
+                        width=1),
+
+                    dbc.Col(
+                        html.Div([
+                            html.A('Introduction', href='#00_header',
+                                   id='00_link', className='nav-link', n_clicks=0),
+                            html.A('Global heatmap', href='#01_global_temperature_anomalies',
+                                   id='01_link', className='nav-link', n_clicks=0),
+                            html.A('Temperature anomalies', href='#02_comparison_temperature_anomalies',
+                                   id='02_link', className='nav-link', n_clicks=0),
+                            html.A('CO₂ impact', href='#03_co2_impact_on_temperature',
+                                   id='03_link', className='nav-link', n_clicks=0),
+                            html.A('CO₂ consumption', href='#04_global_co2_consumption',
+                                   id='04_link', className='nav-link', n_clicks=0),
+                            html.A('Data & Information', href='#05_data_and_information',
+                                   id='05_link', className='nav-link', n_clicks=0),
+                        ], className='nav d-flex justify-content-between'),
+                        width=10),
+
+                    dbc.Col(
+                        html.Div(),
+                        width=1),
+                ], style={'backgroundColor': '#FFFFFF', 'height': 35, 'fontSize': '1.125rem', 'font-weight': 'bold'}),
+
+                # 00.2 SEPARATION LINE
+                dbc.Row(
+                    dbc.Col(
+                        html.Hr(style={'height': 5}),
+                        width=12, style={'backgroundColor': '#FFFFFF'}
+                    )
                 ),
 
-                dbc.Col(width=6),
-
-                dbc.Col(
-                    html.Div([
-                        html.H5(children=content['04_global_co2_consumption']['header_right'],
-                                id='04_global_co2_consumption_header_right',
-                                style={'text-align': 'center', 'font-weight': 'bold'}),
-                        html.Div(style={'background-color': default_color, 'height': default_height})
-                    ]),
-                    width=3,
-                    style={'align-self': 'end'}
+                # 00.3 REFERENCE HEADLINE
+                dbc.Row([
+                    dbc.Col(
+                        html.Div(children=content['00_navigation_and_reference']['reference_intro'],
+                                 id='00_navigation_and_reference_reference_intro'),
+                        width=8, style={'text-align': 'left', 'backgroundColor': '#FFFFFF', 'font-weight': 'bold'}
+                    ),
+                    dbc.Col(
+                        html.Div(children=content['00_navigation_and_reference']['reference_headline_default'],
+                                 id='00_output_txt_reference_headline',
+                                 style={'text-align': 'center', 'font-weight': 'bold'}),
+                        width=4
+                    )
+                ], style={'background-color': '#FFFFFF'}),
+
+                # 00.4 INPUT & OUTPUT REFERENCE
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            dcc.Input(id='00_input_txt_coordinates', type='text', value='', style={'width': '80%'},
+                                      placeholder='Enter Coordinates'),
+                            html.Button('Find', id='00_input_btn_reference_coordinates', n_clicks=0)
+                        ]),
+                        width=4,
+                        style={'text-align': 'center', 'backgroundColor': '#FFFFFF'}
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            dcc.Input(id='00_input_txt_location', type='text', value='', style={'width': '80%'},
+                                      placeholder='Enter location'),
+                            html.Button('Find', id='00_input_btn_reference_location', n_clicks=0)
+                        ]),
+                        width=4,
+                        style={'text-align': 'center', 'backgroundColor': '#FFFFFF'}
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            html.Div(children='', id='00_output_txt_reference_location',
+                                     style={'text-align': 'right'})
+                        ]),
+                        width=2,
+                        style={'backgroundColor': '#FFFFFF'}
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            html.Div(children='', id='00_output_txt_reference_coordinates',
+                                     style={'text-align': 'right'}),
+                            # pinned references (coordinates and location of each)
+                            dcc.Store(id='00_store_reference_pins', data=[]),
+                            # resolved references (grid cells and countries) shared by all sections
+                            dcc.Store(id='00_store_references'),
+                            # visibility of the sections below the fold (set in the browser, see lazy_sections.js)
+                            dcc.Store(id='00_store_lazy_sections',
+                                      data=[{'section': section, 'link': link, 'store': store}
+                                            for section, (link, store) in lazy_sections.items()]),
+                            *[dcc.Store(id=store, data=False) for link, store in lazy_sections.values()]
+                        ]),
+                        width=2
+                    )
+                ], style={'paddingTop': default_height, 'background-color': '#FFFFFF'}),
+
+                # 00.5 PINNED REFERENCES
+                dbc.Row([
+                    dbc.Col(
+                        html.Div(children=content['00_navigation_and_reference']['reference_pins_default'],
+                                 id='00_output_txt_reference_pins'),
+                        width=8,
+                        style={'text-align': 'left', 'backgroundColor': '#FFFFFF'}
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            html.Button('Pin reference', id='00_input_btn_reference_pin', n_clicks=0),
+                            html.Button('Clear pins', id='00_input_btn_reference_clear', n_clicks=0)
+                        ]),
+                        width=4,
+                        style={'text-align': 'center', 'backgroundColor': '#FFFFFF'}
+                    )
+                ], style={'paddingTop': default_height, 'background-color': '#FFFFFF'}),
+
+                # 00.6 SEPARATION LINE
+                dbc.Row(
+                    dbc.Col(
+                        html.Hr(style={'height': 5}),
+                        width=12, style={'backgroundColor': '#FFFFFF'}
+                    )
                 ),
 
-            ], style={'height': '25vh'}),
+            ], id='00_navigation_and_reference', className="sticky-top", style={'margin': '0.025rem'}),
 
-            # 04.2 CHAPTER CONTENT
+            # --------------------------------------------------------------------------------------------------------------
+            # 01 INTRODUCTION AND WORLD HEATMAP (GLOBAL TEMPERATURE ANOMALIES)
             dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        html.Div(children=content['04_global_co2_consumption']['content_01'],
-                                 id='04_global_co2_consumption_content_01', style={'text-align': 'center'}),
-                        html.Div(children=content['04_global_co2_consumption']['content_02'],
-                                 id='04_global_co2_consumption_content_02', style={'text-align': 'center'}),
-                        html.Div(children=content['04_global_co2_consumption']['content_03'],
-                                 id='04_global_co2_consumption_content_03', style={'text-align': 'center'}),
-                    ]),
-                    width=12,
-                    style={'paddingTop': default_height * 2}
-                )
-            ]),
-
-            # 04.2 CHAPTER CONTENT
+                # 01.1 INTRODUCTION
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.H5('Introduction'),
+                            html.Hr(),
+                            html.Div(children=content['01_global_temperature_anomalies']['content_header'],
+                                     id='01_global_temperature_anomalies_txt_content',
+                                     style={'text-align': 'left', 'paddingTop': default_height}),
+                            html.Div(children=content['01_global_temperature_anomalies']['content_description'],
+                                     id='01_global_temperature_anomalies_txt_content_description',
+                                     style={'text-align': 'left'}),
+                        ]),
+                        width=12
+                    )
+                ]),
+
+                # 01.2 FILLED SEPARATION LINE
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.Div(style={'background-color': default_color, 'height': default_height}),
+                        ]),
+                        width=12
+                    ),
+
+                ], style={'paddingTop': default_height * 2}),
+
+                # 01.3 HEADLINE GLOBAL TEMPERATURE ANOMALIES AND TEXTUAL OUTPUT TEMPERATURE ANOMALY REFERENCE LOCATIONS
+                dbc.Row([
+                    dbc.Col(width=3),
+
+                    dbc.Col(
+                        html.Div([
+                            html.H5(children=f"{content['01_global_temperature_anomalies']['header_figure']} "
+                                             f"from {giss_data_latest_date}",
+                                    id='01_global_temperature_anomalies_header_figure',
+                                    style={'text-align': 'center', 'font-weight': 'bold'}),
+                            html.Div(style={'background-color': default_color, 'height': default_height}),
+                            html.Div(children=content['01_global_temperature_anomalies']['reference_temp_anomaly_default'],
+                                     id='01_output_txt_reference_temp_anomaly',
+                                     style={'text-align': 'center', 'font-weight': 'bold'}),
+                            html.Div(children=content['01_global_temperature_anomalies']['figdata_temp_anomaly_default'],
+                                     id='01_output_txt_figdata_temp_anomaly',
+                                     style={'text-align': 'center', 'font-weight': 'bold'})
+                        ]),
+                        width=6
+                    ),
+
+                    dbc.Col(width=3)
+                ], style={'paddingTop': default_height}),
+
+                # 01.4 FIGURE WORLD HEATMAP (GLOBAL TEMPERATURE ANOMALIES) WITH SELECTABLE MAP LAYERS
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            dcc.Tabs(
+                                id='01_input_tab_map_layers',
+                                value=default_inputs['01_input_tab_map_layers'],
+                                children=[dcc.Tab(label=layer['label'], value=layer['value'])
+                                          for layer in config['dash_information']['01_input_tab_map_layers']]),
+                            dcc.Graph(id='01_output_fig_global_heatmap_temp_anomalies',
+                                      figure=default_state['01_output_fig_global_heatmap_temp_anomalies.figure'],
+                                      config=config['dash_information']['general']['fig_config'],
+                                      style={'height': '60vh'}),
+                            dcc.Store(id='01_store_map_view'),
+                        ]),
+                        width=12
+                    )
+
+                ]),
+
+                # 01.4.1 PLAYBACK OF THE WORLD HEATMAP (GRID CELLS) PER MONTH OR PER YEAR
+                dbc.Row([
+                    dbc.Col(width=3),
+
+                    dbc.Col(
+                        html.Div([
+                            dcc.RadioItems(id='01_input_rdi_playback_step',
+                                           options=config['dash_information']['01_playback']['step_options'],
+                                           value='year', inline=True,
+                                           inputStyle={'margin-left': '10px', 'margin-right': '5px'}),
+                            html.Button('Play', id='01_input_btn_playback', n_clicks=0,
+                                        style={'margin-left': '10px'}),
+                            html.Div(children='', id='01_output_txt_playback_period',
+                                     style={'margin-left': '10px', 'font-weight': 'bold'}),
+                            dcc.Store(id='01_store_playback',
+                                      data={'url': '/_playback/',
+                                            'graph': '01_output_fig_global_heatmap_temp_anomalies',
+                                            'label': '01_output_txt_playback_period',
+                                            'button': '01_input_btn_playback',
+                                            'frame_duration':
+                                                config['dash_information']['01_playback']['frame_duration']}),
+                        ], style={'display': 'flex', 'justify-content': 'center', 'align-items': 'center'}),
+                        width=6
+                    ),
+
+                    dbc.Col(width=3)
+                ], style={'paddingTop': default_height}),
+
+                # 01.5 CONCLUSION
+                dbc.Row([
+                    dbc.Col(width=3),
+
+                    dbc.Col(
+                        html.Div([
+                            html.Div(children='Conclusions:', style={'text-align': 'left', 'font-weight': 'bold'}),
+                            html.Div(children=content['01_global_temperature_anomalies']['figure_description'],
+                                     id='01_global_temperature_anomalies_txt_figure_description',
+                                     style={'text-align': 'left', 'paddingTop': default_height}),
+                        ]),
+                        width=6
+                    ),
+
+                    dbc.Col(width=3)
+                ]),
+            ], id='01_global_temperature_anomalies'),
+
+            # --------------------------------------------------------------------------------------------------------------
+            # 02 DIRECT COMPARISON GLOBAL AND LOCAL TEMPERATURE ANOMALIES
             dbc.Row([
-                dbc.Col(
-                    html.Div([
+                # 02.1 HEADLINES
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.H5(children=content['02_comparison_temperature_anomalies']['header_left'],
+                                    id='02_comparison_temperature_anomalies_header_left',
+                                    style={'text-align': 'center', 'font-weight': 'bold'}),
+                            html.Div(style={'background-color': default_color, 'height': default_height}),
+                        ]),
+                        width=3,
+                        style={'align-self': 'end'}
+                    ),
+
+                    dbc.Col(width=6),
+
+                    dbc.Col(
+                        html.Div([
+                            html.H5(children=content['02_comparison_temperature_anomalies']['header_right'],
+                                    id='02_comparison_temperature_anomalies_header_right',
+                                    style={'text-align': 'center', 'font-weight': 'bold'}),
+                            html.Div(style={'background-color': default_color, 'height': default_height}),
+                        ]),
+                        width=3,
+                        style={'align-self': 'end'}
+                    ),
+
+                ], style={'height': '25vh'}),
+
+                # 02.2 CHAPTER CONTENT
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.Div(children=content['02_comparison_temperature_anomalies']['content_01'],
+                                     id='02_comparison_temperature_anomalies_content_01', style={'text-align': 'center'}),
+                            html.Div(children=content['02_comparison_temperature_anomalies']['content_02'],
+                                     id='02_comparison_temperature_anomalies_content_02', style={'text-align': 'center'})
+                        ]),
+                        width=12
+                    )
+                ], style={'paddingTop': default_height * 2}),
+
+                # 02.3 YEAR-SLIDER INPUT
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.Hr(),
+                            dcc.Slider(
+                                id='02_input_sld_years',
+                                min=df_anomaly_heatmap['Year'].min(),
+                                max=df_anomaly_heatmap['Year'].max(),
+                                value=df_anomaly_heatmap['Year'].min(),
+                                marks={str(year): str(year) if year % 5 == 0 else ''
+                                       for year in df_anomaly_heatmap['Year'].unique()},
+                                step=None
+                            ),
+                        ]),
+                        width=6
+                    ),
+
+                    dbc.Col(width=6),
+                ], style={'paddingTop': default_height}),
+
+                # 02.4 FIGURE OUTPUTS
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            dcc.Graph(id='02_output_fig_minmax_temp_anomaly',
+                                      figure=placeholder_figure,
+                                      config=config['dash_information']['general']['fig_config']),
+                        ]),
+                        width=6
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            dcc.Graph(id='02_output_fig_mean_temp_anomalies',
+                                      figure=placeholder_figure,
+                                      config=config['dash_information']['general']['fig_config'])
+                        ]),
+                        width=6
+                    ),
+                ])
+            ], id='02_comparison_temperature_anomalies'),
+
+            # --------------------------------------------------------------------------------------------------------------
+            # 03 WORLDMAP / TREEMAP IMPACT CO2 TO TEMPERATURE
+            dbc.Row([
+                # 03.1 HEADLINES AND DESCRIPTION OF CO2 EMISSION IMPACT
+                dbc.Row([
+                    dbc.Col(width=2),
+
+                    dbc.Col(
+                        html.Div([
+                            html.H5(children=content['03_co2_impact_on_temperature']['header'],
+                                    id='03_co2_impact_on_temperature_header',
+                                    style={'text-align': 'center', 'font-weight': 'bold'}),
+                            html.Div(style={'background-color': default_color, 'height': default_height}),
+                        ]),
+                        width=8,
+                        style={'align-self': 'end'}
+                    ),
+
+                    dbc.Col(width=2),
+
+                ], style={'height': '25vh'}),
+
+                # 03.2 CONCLUSION, TAB AND DROPDOWN INPUT, FIGURE OUTPUTS
+                dbc.Row([
+                    dbc.Col([
+                        html.Hr(),
+                        html.Div(children=content['03_co2_impact_on_temperature']['content_01'],
+                                 id='03_co2_impact_on_temperature_txt_content_01',
+                                 style={'text-align': 'left', 'paddingTop': default_height}),
+                        html.Div(children=content['03_co2_impact_on_temperature']['content_02'],
+                                 id='03_co2_impact_on_temperature_txt_content_02',
+                                 style={'text-align': 'left', 'paddingTop': default_height})
+                    ],
+                        style={'width': 2, 'paddingTop': default_height * 4}
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            dcc.Tabs(
+                                id="03_input_tab_worldmap_treemap",
+                                value=default_inputs['03_input_tab_worldmap_treemap'],
+                                children=[
+                                    dcc.Tab(label='Worldmap', value='world'),
+                                    dcc.Tab(label='Treemap', value='tree')
+                                ]),
+                            dcc.Dropdown(
+                                id='03_input_ddl_treemap_grouping_options',
+                                options=config['dash_information']['03_input_ddl_treemap_options'],
+                                value=default_inputs['03_input_ddl_treemap_grouping_options'],
+                                placeholder='Select a grouping',
+                                style=default_state['03_input_ddl_treemap_grouping_options.style']
+                            ),
+                            dcc.Graph(id='03_output_fig_temp_change_co2',
+                                      figure=placeholder_figure,
+                                      config=config['dash_information']['general']['fig_config'],
+                                      style={'height': '50vh'})
+                        ]),
+                        width=8
+                    ),
+
+                    dbc.Col([
                         html.Hr(),
-                        dcc.RangeSlider(
-                            id='04_input_rsl_years',
-                            min=df_co2_data['year'].min(),
-                            max=df_co2_data['year'].max(),
-                            value=[1997, 2015],
-                            marks={str(year): str(year) if year % 2 == 0 else ''
-                                   for year in df_co2_data['year'].unique()},
-                            step=None
-                        ),
-                    ]),
-                    width=12
-                )
-            ], style={'paddingTop': default_height}),
-
-            # 04.3 FIGURE OUTPUTS
+                        html.Div(children=content['03_co2_impact_on_temperature']['header_fig_ranking'],
+                                 id='03_co2_impact_on_temperature_header_fig_ranking',
+                                 style={'text-align': 'left', 'font-weight': 'bold'}),
+                        dcc.Graph(id='03_output_fig_temp_change_co2_ranking',
+                                  figure=placeholder_figure,
+                                  config=config['dash_information']['general']['fig_config'])
+                    ],
+                        style={'width': 2, 'paddingTop': default_height * 4}
+                    ),
+                ]),
+            ], id='03_co2_impact_on_temperature'),
+
+            # --------------------------------------------------------------------------------------------------------------
+            # 04 CO2 CONSUMPTION AND COMPARISON OF CO2 CONSUMPTION
             dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        html.Hr()
-                    ]),
-                    width=5
-                ),
+                # 04.1 HEADLINES
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.H5(children=content['04_global_co2_consumption']['header_left'],
+                                    id='04_global_co2_consumption_header_left',
+                                    style={'text-align': 'center', 'font-weight': 'bold'}),
+                            html.Div(style={'background-color': default_color, 'height': default_height})
+                        ]),
+                        width=3,
+                        style={'align-self': 'end'}
+                    ),
+
+                    dbc.Col(width=6),
+
+                    dbc.Col(
+                        html.Div([
+                            html.H5(children=content['04_global_co2_consumption']['header_right'],
+                                    id='04_global_co2_consumption_header_right',
+                                    style={'text-align': 'center', 'font-weight': 'bold'}),
+                            html.Div(style={'background-color': default_color, 'height': default_height})
+                        ]),
+                        width=3,
+                        style={'align-self': 'end'}
+                    ),
+
+                ], style={'height': '25vh'}),
+
+                # 04.2 CHAPTER CONTENT
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.Div(children=content['04_global_co2_consumption']['content_01'],
+                                     id='04_global_co2_consumption_content_01', style={'text-align': 'center'}),
+                            html.Div(children=content['04_global_co2_consumption']['content_02'],
+                                     id='04_global_co2_consumption_content_02', style={'text-align': 'center'}),
+                            html.Div(children=content['04_global_co2_consumption']['content_03'],
+                                     id='04_global_co2_consumption_content_03', style={'text-align': 'center'}),
+                        ]),
+                        width=12,
+                        style={'paddingTop': default_height * 2}
+                    )
+                ]),
+
+                # 04.2 CHAPTER CONTENT
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.Hr(),
+                            dcc.RangeSlider(
+                                id='04_input_rsl_years',
+                                min=min(co2_data_manifest['years']),
+                                max=max(co2_data_manifest['years']),
+                                value=default_inputs['04_input_rsl_years'],
+                                marks={str(year): str(year) if year % (2 if len(co2_data_manifest['years']) <= 40
+                                                                       else 10) == 0 else ''
+                                       for year in co2_data_manifest['years']},
+                                step=None
+                            ),
+                        ]),
+                        width=12
+                    )
+                ], style={'paddingTop': default_height}),
+
+                # 04.3 FIGURE OUTPUTS
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.Hr()
+                        ]),
+                        width=5
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            dcc.Dropdown(
+                                id='04_input_ddl_grouping_options',
+                                options=config['dash_information']['04_input_ddl_grouping_options'],
+                                value=default_inputs['04_input_ddl_grouping_options'],
+                                placeholder='Select a grouping'
+                            ),
+                        ]),
+                        width=2
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            html.Hr()
+                        ]),
+                        width=5
+                    ),
+                ]),
+
+                # 04.3 FIGURE OUTPUTS
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            dcc.Graph(id='04_output_fig_co2_dev',
+                                      figure=placeholder_figure,
+                                      config=config['dash_information']['general']['fig_config']),
+                        ]),
+                        width=5
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            dcc.Checklist(id='04_input_chkl_countries',
+                                          options=[{'label': country, 'value': country}
+                                                   for country in df_co2_data['country'].unique()],
+                                          style=default_state['04_input_chkl_countries.style'])
+                        ]),
+                        width=2
+                    ),
+
+                    dbc.Col(
+                        html.Div([
+                            dcc.Graph(id='04_output_fig_co2_cmp',
+                                      figure=placeholder_figure,
+                                      config=config['dash_information']['general']['fig_config'])
+                        ]),
+                        width=5
+                    ),
+                ]),
+
+                # 04.4 EXPORT OF THE DISPLAYED DATA (LINKS UPDATED CLIENTSIDE, SEE /assets/export.js)
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.Span('Download the displayed data: '),
+                            html.A('CSV', id='04_output_lnk_export_csv', href='', style={'margin-left': '5px'}),
+                            html.A('Parquet', id='04_output_lnk_export_parquet', href='',
+                                   style={'margin-left': '10px'}),
+                            dcc.Store(id='04_store_export', data={'url': '/api/export/co2_development'}),
+                        ], style={'text-align': 'right'}),
+                        width=12
+                    )
+                ]),
+            ], id='04_global_co2_consumption'),
+
+            # --------------------------------------------------------------------------------------------------------------
+            # 05 DATA & INFORMATION
+            dbc.Row([
+                # 05.1 DATA & INFORMATION TABLES
+                dbc.Row([
+                    dbc.Col(
+                        html.Div([
+                            html.Div(style={'background-color': default_color, 'height': default_height}),
+                            html.H5('Data Sources', style={'paddingTop': default_height}),
+                            html.Hr(),
+                            dash_table.DataTable(
+                                id='data_sources',
+                                columns=[
+                                    {'name': 'Data', 'id': 'data', 'presentation': 'markdown'},
+                                    {'name': 'Occurrences', 'id': 'occurrences', 'presentation': 'markdown'},
+                                    {'name': 'Homepage', 'id': 'link_homepage', 'presentation': 'markdown'},
+                                    {'name': 'Direkt data link', 'id': 'link_data', 'presentation': 'markdown'},
+                                ],
+                                data=config['data_sources'],
+                                style_cell=default_table_style,
+                            ),
+                            html.Hr(),
+                            html.H5('Main used data columns'),
+                            html.Hr(),
+                            dash_table.DataTable(
+                                id='data_columns_information',
+                                columns=[
+                                    {'name': 'Data column', 'id': 'data_column'},
+                                    {'name': 'Data source', 'id': 'data_source_column'},
+                                    {'name': 'Description', 'id': 'data_description'},
+                                ],
+                                data=data_columns_information,
+                                style_cell=default_table_style,
+                            ),
+                            html.Hr(),
+                            html.H5('Further information'),
+                            html.Hr(),
+                            dash_table.DataTable(
+                                id='further_information',
+                                columns=[
+                                    {'name': 'Organization', 'id': 'organization', 'presentation': 'markdown'},
+                                    {'name': 'Homepage', 'id': 'link', 'presentation': 'markdown'},
+                                ],
+                                data=config['further_information'],
+                                style_cell=default_table_style,
+                            ),
+                            html.Hr(),
+                            html.Div(children='© Christopher Wegner, 2023',
+                                     style={'background-color': default_color, 'height': default_height,
+                                            'text-align': 'right', 'color': 'white', 'paddingRight': 10}),
+                        ]),
+                        width=12,
+                        style={'align-self': 'end'}
+                    ),
+                ], style={'height': '140vh'}),
+            ], id='05_data_and_information'),
+            ]),
+        fluid=True)
 
-                dbc.Col(
-                    html.Div([
-                        dcc.Dropdown(
-                            id='04_input_ddl_grouping_options',
-                            options=config['dash_information']['04_input_ddl_grouping_options'],
-                            value='grouping#Income group',
-                            placeholder='Select a grouping'
-                        ),
-                    ]),
-                    width=2
-                ),
+    layout = html.Div([
+        html.Script('''
+            function scrollToId(id) {
+                var element = document.getElementById(id);
+                var rect = element.getBoundingClientRect();
+                var offset = rect.top - 500;  // Hier definieren wir den Offset von 120 Pixeln
+                window.scrollBy({ top: offset, behavior: 'smooth' });
+            }
+        '''),
+        layout
+    ])
 
-                dbc.Col(
-                    html.Div([
-                        html.Hr()
-                    ]),
-                    width=5
-                ),
-            ]),
+    return layout
 
-            # 04.3 FIGURE OUTPUTS
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        dcc.Graph(id='04_output_fig_co2_dev',
-                                  config=config['dash_information']['general']['fig_config']),
-                    ]),
-                    width=5
-                ),
 
-                dbc.Col(
-                    html.Div([
-                        dcc.Checklist(id='04_input_chkl_countries',
-                                      options=[{'label': country, 'value': country}
-                                               for country in df_co2_data['country'].unique()],
-                                      style={'height': '350px', 'border': '2px solid #000000', 'overflowY': 'scroll',
-                                             'opacity': 1, 'transition': 'opacity 0.5s'})
-                    ]),
-                    width=2
-                ),
+def create_app(geolocator=None):
+    """
+    Creates the Dash application. Only the datasets configured for preloading are loaded at startup,
+    all others are not loaded before they are needed.
 
-                dbc.Col(
-                    html.Div([
-                        dcc.Graph(id='04_output_fig_co2_cmp',
-                                  config=config['dash_information']['general']['fig_config'])
-                    ]),
-                    width=5
-                ),
-            ]),
+    :param geolocator: geocoder of the reference locations (optional, i.e. a stub for load tests, see
+                       benchmarks/geocoder_stub.py), Nominatim if not given
+    :return: Dash application
+    """
+    # production serving (see gunicorn.conf.py): attach the datasets published by the parent process read-only,
+    # they are memory-mapped on first use and shared by all workers
+    attached_datasets = []
+    if os.environ.get('DATA_STORE_DIR'):
+        attached_datasets = attach_datasets(datasets, os.environ['DATA_STORE_DIR'])
 
+    # load the datasets needed at startup concurrently (independent sources in parallel), report the load times
+    start = time.perf_counter()
+    load_datasets([datasets[name] for name in config['data_information']['preload_datasets']
+                   if name not in attached_datasets])
+    for dataset in sorted(datasets.values(), key=lambda dataset: -(dataset.load_time or 0)):
+        if dataset.load_time is not None:
+            print(f'Loaded {dataset.name} in {dataset.load_time:.2f}s')
+    print(f'Loaded datasets in {time.perf_counter() - start:.2f}s')
 
-        ], id='04_global_co2_consumption'),
+    if profiling_enabled():
+        profile_report = create_profile_report()
+        print_profile_report(profile_report)
+        write_profile_report(profile_report, config['filepaths']['startup_profile'])
 
-        # --------------------------------------------------------------------------------------------------------------
-        # 05 DATA & INFORMATION
-        dbc.Row([
-            # 05.1 DATA & INFORMATION TABLES
-            dbc.Row([
-                dbc.Col(
-                    html.Div([
-                        html.Div(style={'background-color': default_color, 'height': default_height}),
-                        html.H5('Data Sources', style={'paddingTop': default_height}),
-                        html.Hr(),
-                        dash_table.DataTable(
-                            id='data_sources',
-                            columns=[
-                                {'name': 'Data', 'id': 'data', 'presentation': 'markdown'},
-                                {'name': 'Occurrences', 'id': 'occurrences', 'presentation': 'markdown'},
-                                {'name': 'Homepage', 'id': 'link_homepage', 'presentation': 'markdown'},
-                                {'name': 'Direkt data link', 'id': 'link_data', 'presentation': 'markdown'},
-                            ],
-                            data=config['data_sources'],
-                            style_cell=default_table_style,
-                        ),
-                        html.Hr(),
-                        html.H5('Main used data columns'),
-                        html.Hr(),
-                        dash_table.DataTable(
-                            id='data_columns_information',
-                            columns=[
-                                {'name': 'Data column', 'id': 'data_column'},
-                                {'name': 'Data source', 'id': 'data_source_column'},
-                                {'name': 'Description', 'id': 'data_description'},
-                            ],
-                            data=data_columns_information,
-                            style_cell=default_table_style,
-                        ),
-                        html.Hr(),
-                        html.H5('Further information'),
-                        html.Hr(),
-                        dash_table.DataTable(
-                            id='further_information',
-                            columns=[
-                                {'name': 'Organization', 'id': 'organization', 'presentation': 'markdown'},
-                                {'name': 'Homepage', 'id': 'link', 'presentation': 'markdown'},
-                            ],
-                            data=config['further_information'],
-                            style_cell=default_table_style,
-                        ),
-                        html.Hr(),
-                        html.Div(children='© Christopher Wegner, 2023',
-                                 style={'background-color': default_color, 'height': default_height,
-                                        'text-align': 'right', 'color': 'white', 'paddingRight': 10}),
-                    ]),
-                    width=12,
-                    style={'align-self': 'end'}
-                ),
-            ], style={'height': '140vh'}),
-        ], id='05_data_and_information'),
-        ]),
-    fluid=True)
+    app = Dash(__name__, external_stylesheets=[dbc.themes.UNITED], title='Explorative Analysis of clima crisis')
+
+    # layout is created on page load
+    app.layout = serve_layout
+
+    # geocoder used by the callbacks (see app_geolocator)
+    app.server.config['GEOLOCATOR'] = geolocator
 
+    # frames of the heatmap playback, streamed outside of the callbacks
+    app.server.add_url_rule('/_playback/<step>', 'playback_frames', playback_frames)
 
-app.layout = html.Div([
-    html.Script('''
-        function scrollToId(id) {
-            var element = document.getElementById(id);
-            var rect = element.getBoundingClientRect();
-            var offset = rect.top - 500;  // Hier definieren wir den Offset von 120 Pixeln
-            window.scrollBy({ top: offset, behavior: 'smooth' });
-        }
-    '''),
-    app.layout
-])
+    # point and batch queries of the anomaly series (JSON or Arrow), streamed exports
+    register_api(app.server, datasets, config['data_information'])
+    app.server.add_url_rule('/api/export/co2_development', 'export_co2_development', export_co2_development)
+
+    return app
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # PRELIMINARY INFORMATION
-@app.callback(
+@callback(
     Output('preliminary_information', 'style'),
     Output('hide_button', 'n_clicks'),
     Input('hide_button', 'n_clicks'),
     State('checkbox_show_again', 'value'),
+    prevent_initial_call=True
 )
 def show_preliminary_info(n_clicks, checkbox_value):
-    global config
-
-    preliminary_information = config['show_preliminary_info']
+    # the setting may be changed at runtime, so it is read from the state file (shared config is read-only)
+    preliminary_information = app_state()['show_preliminary_info']
 
     if not preliminary_information:
         return {'display': 'none'}, 0
@@ -674,14 +1035,13 @@ def show_preliminary_info(n_clicks, checkbox_value):
 
     # Wenn der Button geklickt wurde und die Checkbox ausgewählt ist, setze die Variable auf False
     elif n_clicks > 0 and 'disable' in checkbox_value:
-        config['show_preliminary_info'] = False
-        update_config_file(config)
+        update_state_file(config['filepaths']['app_state'], {**app_state(), 'show_preliminary_info': False})
         return {'display': 'none'}, 0
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # 00 CALLBACK FUNCTION: LOCATION / COORDINATES EXTRACTION FROM INPUT
-@app.callback(
+@callback(
     Output('00_output_txt_reference_headline', 'children'),
     Output('00_output_txt_reference_coordinates', 'children'),
     Output('00_output_txt_reference_location', 'children'),
@@ -694,7 +1054,8 @@ def show_preliminary_info(n_clicks, checkbox_value):
     [Input('00_input_btn_reference_coordinates', 'n_clicks')],
     [State('00_input_txt_coordinates', 'value')],
     [Input('00_input_btn_reference_location', 'n_clicks')],
-    [State('00_input_txt_location', 'value')]
+    [State('00_input_txt_location', 'value')],
+    prevent_initial_call=True
 )
 def localize_reference(coordinates_click, coordinates, location_click, location):
     """
@@ -713,7 +1074,7 @@ def localize_reference(coordinates_click, coordinates, location_click, location)
     """
     # in case the coordinates button is clicked
     if coordinates_click > 0:
-        location, status, message = find_location(coordinates)
+        location, status, message = find_location(coordinates, app_geolocator())
 
         style_input_txt_coordinates = config['dash_information']['00_style_input_txt'][status]
         text_input_txt_coordinates = message
@@ -735,7 +1096,7 @@ def localize_reference(coordinates_click, coordinates, location_click, location)
 
     # in case the location button is clicked
     elif location_click > 0:
-        coordinates, status, message = find_coordinates(location)
+        coordinates, status, message = find_coordinates(location, app_geolocator())
 
         style_input_txt_location = config['dash_information']['00_style_input_txt'][status]
         text_input_txt_location = message
@@ -749,7 +1110,7 @@ def localize_reference(coordinates_click, coordinates, location_click, location)
             coordinates = f"{round(coordinates.latitude, 7)}, {round(coordinates.longitude, 7)}"
 
             # relocate with coordinates for uniform city and country display in English
-            location, _, _ = find_location(coordinates)
+            location, _, _ = find_location(coordinates, app_geolocator())
 
             return headline, coordinates, location, \
                 no_update, no_update, no_update, \
@@ -767,67 +1128,250 @@ def localize_reference(coordinates_click, coordinates, location_click, location)
             no_update, no_update, no_update
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+# 00 CALLBACK FUNCTION: PINNING OF REFERENCES
+@callback(
+    Output('00_store_reference_pins', 'data'),
+    Output('00_output_txt_reference_pins', 'children'),
+    Output('00_input_btn_reference_pin', 'n_clicks'),
+    Output('00_input_btn_reference_clear', 'n_clicks'),
+    [Input('00_input_btn_reference_pin', 'n_clicks')],
+    [Input('00_input_btn_reference_clear', 'n_clicks')],
+    [State('00_output_txt_reference_coordinates', 'children')],
+    [State('00_output_txt_reference_location', 'children')],
+    [State('00_store_reference_pins', 'data')],
+    prevent_initial_call=True
+)
+def pin_reference(pin_click, clear_click, coordinates, location, pins):
+    """
+    Function for pinning the current reference (added to the references compared in all sections)
+    or for removing all pinned references.
+
+    :param pin_click: Counter of the clicks of the pin button
+    :param clear_click: Counter of the clicks of the clear button
+    :param coordinates: coordinates of the current reference, if given
+    :param location: location of the current reference, if given
+    :param pins: pinned references
+    :return: pinned references, text output of the pinned references, reset of button clicks (pin, clear)
+    """
+    if clear_click > 0:
+        pins = []
+    elif coordinates or location:
+        pins = collect_references(None, None, (pins or []) + [{'coordinates': coordinates, 'location': location}],
+                                  config['dash_information']['00_max_references'])
+    else:
+        return no_update, no_update, 0, no_update
+
+    if pins:
+        text_output_txt_pins = f"{content['00_navigation_and_reference']['reference_pins']} " + \
+                               '; '.join(reference_label(pin) for pin in pins)
+    else:
+        text_output_txt_pins = content['00_navigation_and_reference']['reference_pins_default']
+
+    return pins, text_output_txt_pins, 0, 0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# 00 CALLBACK FUNCTION: REFERENCE RESOLUTION
+@callback(
+    Output('00_store_references', 'data'),
+    [Input('00_output_txt_reference_coordinates', 'children')],
+    [Input('00_output_txt_reference_location', 'children')],
+    [Input('00_store_reference_pins', 'data')],
+    prevent_initial_call=True
+)
+def reference_context(coordinates, location, pins=None):
+    """
+    Function for resolving the references (current reference and pinned references) once per change
+    for all sections: grid cells of the coordinates and countries of the locations.
+
+    :param coordinates: coordinates of the current reference, if given
+    :param location: location of the current reference, if given
+    :param pins: pinned references, if given
+    :return: resolved references (see resolve_references), None if no reference is given
+    """
+    references = collect_references(coordinates, location, pins, config['dash_information']['00_max_references'])
+    if not references:
+        return None
+
+    return resolve_references(references, datasets['anomaly_matrix'].get(),
+                              config['dash_information']['01_countryname_changes'])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# 00 CLIENTSIDE CALLBACK FUNCTION: VISIBILITY OF THE SECTIONS BELOW THE FOLD (see assets/lazy_sections.js)
+# sets the visibility store of a section when it is scrolled into view or reached through its navigation link
+clientside_callback(
+    ClientsideFunction(namespace='lazy_sections', function_name='observe'),
+    [Output(store, 'data') for link, store in lazy_sections.values()],
+    [Input(link, 'n_clicks') for link, store in lazy_sections.values()],
+    [State('00_store_lazy_sections', 'data')]
+)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# 01 CLIENTSIDE CALLBACK FUNCTION: SIZE AND ZOOM STATE OF THE WORLD HEATMAP (SEE /assets/map_view.js)
+clientside_callback(
+    ClientsideFunction(namespace='map_view', function_name='update'),
+    Output('01_store_map_view', 'data'),
+    [Input('01_output_fig_global_heatmap_temp_anomalies', 'relayoutData')],
+    [State('01_store_map_view', 'data')]
+)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# 01 CLIENTSIDE CALLBACK FUNCTION: PLAYBACK OF THE WORLD HEATMAP (FRAMES STREAMED FROM /_playback, SEE playback.js)
+clientside_callback(
+    ClientsideFunction(namespace='playback', function_name='toggle'),
+    Output('01_input_btn_playback', 'children'),
+    [Input('01_input_btn_playback', 'n_clicks')],
+    [State('01_input_rdi_playback_step', 'value')],
+    [State('01_input_tab_map_layers', 'value')],
+    [State('01_store_playback', 'data')],
+    prevent_initial_call=True
+)
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 # 01 CALLBACK FUNCTION: WORLD HEATMAP WITH REFERENCE OUTPUT AND COUNTRY HIGHLIGHTING
-@app.callback(
+@callback(
     Output('01_output_fig_global_heatmap_temp_anomalies', 'figure'),
     Output('01_output_txt_reference_temp_anomaly', 'children'),
     Output('01_output_txt_figdata_temp_anomaly', 'children'),
-    [Input('00_output_txt_reference_coordinates', 'children')],
-    [State('00_output_txt_reference_location', 'children')],
+    [Input('01_input_tab_map_layers', 'value')],
+    [Input('00_store_references', 'data')],
     [Input('01_output_fig_global_heatmap_temp_anomalies', 'clickData')],
+    [Input('01_output_fig_global_heatmap_temp_anomalies', 'relayoutData')],
+    [State('01_store_map_view', 'data')],
     [State('01_output_fig_global_heatmap_temp_anomalies', 'figure')],
+    prevent_initial_call=True
 )
-def global_anomalies(coordinates, location, fig_data, current_fig):
+def global_anomalies(map_layer, references, fig_data, relayout_data, map_view, current_fig):
     """
     Function for input-independent display of the world heatmap based
-    on the latest coordinate-related temperature anomalies.
-    If a reference has been entered, the temperature anomaly of the nearest geo-coordinates is displayed.
+    on the latest coordinate-related temperature anomalies (grid cells) or the latest country mean anomalies.
+    If references have been entered, the temperature anomalies of their nearest geo-coordinates are displayed.
 
-    :param coordinates: coordinates, if given
-    :param location: location, if given
+    :param map_layer: map layer (string: grid / countries) to be displayed
+    :param references: resolved references (see reference_context), if given
     :param fig_data: data from figure
+    :param relayout_data: zoom state of the figure (last zoom or pan)
+    :param map_view: size of the figure and previous zoom state (see map_view.js)
     :param current_fig: -/-
     :return: figure of world-heatmap,
-                temperature anomaly of reference coordinates if given, style (visible / not visible) of text output
+                temperature anomalies of the reference coordinates if given,
+                style (visible / not visible) of text output
     """
+    countryname_changes = config['dash_information']['01_countryname_changes']
+    map_view_settings = config['dash_information']['01_map_view']
+    layer_settings = {layer['value']: layer
+                      for layer in config['dash_information']['01_input_tab_map_layers']}[map_layer]
+    map_view = extract_map_view(relayout_data, map_view)
+
+    # relayout without zoom or pan (i.e. autosize on page load)
+    if relayout_data is not None and not any(key.startswith('geo.') for key in relayout_data) and \
+            ctx.triggered_id == '01_output_fig_global_heatmap_temp_anomalies':
+        return no_update, no_update, no_update
 
-    # only latest values
-    df = df_anomaly_heatmap[df_anomaly_heatmap['Period'] == df_anomaly_heatmap['Period'].max()]
-
-    # visualization of temperature anomalies on a world map
-    fig = px.scatter_geo(df, title=None, hover_data={'Latitude': False, 'Longitude': False, 'Anomaly': ':.2f'},
-                         labels={'Anomaly': 'Temperature Anomaly in °C'}, lat='Latitude', lon='Longitude',
-                         color='Anomaly', color_continuous_scale="RdYlBu_r", color_continuous_midpoint=0,
-                         projection="natural earth", template='plotly', opacity=0.25)
+    # if map layer is countries
+    if map_layer == 'countries':
+        # latest country mean anomalies (area weighted anomalies of the grid cells of each country)
+        country_anomalies = datasets['country_anomalies'].get()
+        df = country_anomalies['countries'][['ADMIN', 'iso_code']].assign(Anomaly=country_anomalies['matrix'][-1])
+        df = df.dropna(subset=['iso_code', 'Anomaly'])
+
+        # visualization of country temperature anomalies on a world map
+        fig = px.choropleth(df, title=None, locations='iso_code', hover_name='ADMIN',
+                            hover_data={'iso_code': False, 'Anomaly': ':.2f'},
+                            labels={'Anomaly': layer_settings['hover_label']},
+                            color='Anomaly', color_continuous_scale="RdYlBu_r", color_continuous_midpoint=0,
+                            projection="natural earth", template='plotly')
+
+    # if map layer is based on the grid cells (grid (default), trend, rolling_mean, climatology)
+    else:
+        # grid level fitting the zoom and the size of the figure (coarser grids for zoomed-out or small maps)
+        pyramid = datasets['anomaly_pyramid'].get()
+        position = select_grid_level(pyramid, map_view, map_view_settings['default_size'],
+                                     map_view_settings['min_cell_pixels'])
+        level = pyramid[position]
+
+        # latest anomalies or statistics of the cells (see anomaly_statistics)
+        if map_layer == 'grid':
+            values = level['matrix'][-1]
+        else:
+            statistics = datasets['anomaly_statistics'].get()[position]
+            if map_layer == 'trend':
+                values = statistics['trend']
+            elif map_layer == 'rolling_mean':
+                values = statistics['rolling_mean']
+            else:
+                # climatology of the month of the latest values
+                values = statistics['climatology'][datasets['anomaly_matrix'].get()['periods']['Month'].iloc[-1] - 1]
+
+        # only the visible cells
+        visible = visible_cells(level['latitudes'], level['longitudes'], map_view, map_view_settings['default_size'],
+                                map_view_settings['margin'])
+        df = pd.DataFrame({'Longitude': level['longitudes'][visible], 'Latitude': level['latitudes'][visible],
+                           'Anomaly': values[visible]})
+
+        # visualization of temperature anomalies on a world map
+        fig = px.scatter_geo(df, title=None, hover_data={'Latitude': False, 'Longitude': False, 'Anomaly': ':.2f'},
+                             labels={'Anomaly': layer_settings['hover_label']}, lat='Latitude', lon='Longitude',
+                             color='Anomaly', color_continuous_scale="RdYlBu_r", color_continuous_midpoint=0,
+                             projection="natural earth", template='plotly', opacity=0.25)
+
+        # cells of coarser grids cover their area
+        if position > 0:
+            fig.update_traces(marker_size=level['cell_size'] * map_view_pixels_per_degree(
+                map_view, map_view_settings['default_size']))
+
+    # keep the zoom state of the map
+    fig.plotly_relayout({key: value for key, value in map_view.items() if key.startswith('geo.')})
 
     # hide legend
     fig.update_layout(coloraxis_showscale=False)
 
-    # if coordinates are given
-    if coordinates:
-        # extract latitude and longitude (rounded & odd values to fit dataset prerequisites)
-        latitude, longitude = extract_lat_lon(coordinates)
+    # highlighted countries (names of the geo data): shape on the grid, bold border on the countries
+    highlighted_countries = []
 
-        # add a marker to the world map at the reference coordinates
-        add_marker(fig, latitude, longitude)
+    def highlight_country(country):
+        if map_layer == 'countries':
+            highlighted_countries.extend(country if isinstance(country, list) else [country])
+        else:
+            add_country_shape(fig, datasets['geo_data'].get(), country)
 
-        # highlight reference country on worldmap
-        countryname_changes = config['dash_information']['01_countryname_changes']
-        add_country_shape(fig, gdf_countries, location, countryname_changes)
+    # time series of the grid cells of all references with coordinates (gathered at once)
+    references, reference_anomalies = gather_reference_anomalies(datasets['anomaly_matrix'].get(), references)
+
+    # if coordinates are given
+    if references:
+        # add markers to the world map at the reference grid cells (one trace)
+        add_marker(fig, [reference['latitude'] for reference in references],
+                   [reference['longitude'] for reference in references])
+
+        # highlight reference countries on worldmap (one shape trace)
+        reference_countries = list(dict.fromkeys(reference['geo_country'] for reference in references
+                                                 if reference['geo_country']))
+        if reference_countries:
+            highlight_country(reference_countries)
 
         # 1. Part output: Textual intro
         text_output_intro = content['01_global_temperature_anomalies']['reference_temp_anomaly_default'].split(':')[0]
-        # 2. Part output: extract temperature anomaly value from the dataset
-        anomaly_value = df[(df['Latitude'] == latitude) & (df['Longitude'] == longitude)]['Anomaly'].values[-1]
+        # 2. Part output: latest temperature anomaly values of the reference grid cells
+        anomaly_values = latest_valid_values(reference_anomalies)
 
-        # composition of the additional outputs (value and visibility)
-        text_output_txt_reference = f'{text_output_intro} @ {location} ({coordinates}): {round(anomaly_value, 2)}°C'
+        # composition of the additional outputs (one line per reference)
+        text_output_txt_reference = [f"{text_output_intro} @ {reference['location']} ({reference['coordinates']}): "
+                                     f"{round(anomaly_value, 2)}°C"
+                                     for reference, anomaly_value in zip(references, anomaly_values)]
+        text_output_txt_reference = text_output_txt_reference[0] if len(references) == 1 else \
+            [line for text in text_output_txt_reference for line in (text, html.Br())][:-1]
 
     else:
         text_output_txt_reference = no_update
 
-    if fig_data:
+    # if a grid cell is clicked
+    if fig_data and 'lat' in fig_data['points'][0]:
         # read latitude and longitude from figdata and combine to coordinates
         latitude = fig_data['points'][0]['lat']
         longitude = fig_data['points'][0]['lon']
@@ -837,12 +1381,11 @@ def global_anomalies(coordinates, location, fig_data, current_fig):
         add_marker(fig, latitude, longitude)
 
         # find a location if possible (no status or message needed)
-        location, _, _ = find_location(coordinates)
+        location, _, _ = find_location(coordinates, app_geolocator())
 
         if location:
             # highlight clicked country (if found) on worldmap
-            countryname_changes = config['dash_information']['01_countryname_changes']
-            add_country_shape(fig, gdf_countries, location, countryname_changes)
+            highlight_country(extract_country(location, countryname_changes))
         else:
             # otherwise
             location = '[no location available]'
@@ -854,33 +1397,46 @@ def global_anomalies(coordinates, location, fig_data, current_fig):
         anomaly_value = round(fig_data['points'][0]['marker.color'], 2)
 
         # composition of the additional outputs (value and visibility)
-        text_output_txt_fig_data = f'{text_output_intro} @ {location} ({coordinates}): {round(anomaly_value, 2)}°C'
+        text_output_txt_fig_data = f'{text_output_intro} @ {location} ({coordinates}): {round(anomaly_value, 2)}' \
+                                   f"{layer_settings['unit']}"
+
+    # if a country is clicked (no geocoding needed)
+    elif fig_data:
+        country = fig_data['points'][0].get('hovertext', fig_data['points'][0]['location'])
+        highlight_country(country)
+
+        # 1. Part output: Textual intro
+        text_output_intro = content['01_global_temperature_anomalies']['figdata_temp_anomaly_default'].split(':')[0]
+
+        # composition of the additional outputs (country mean value)
+        text_output_txt_fig_data = f"{text_output_intro} @ {country} (country mean): " \
+                                   f"{round(fig_data['points'][0]['z'], 2)}°C"
     else:
         text_output_txt_fig_data = no_update
 
+    # highlight countries by their border (shapes would cover the country anomalies)
+    if highlighted_countries:
+        fig.update_traces(marker_line_width=[2 if country in highlighted_countries else 0.5 for country in df['ADMIN']],
+                          selector=dict(type='choropleth'))
+
     fig.data = fig.data[::-1]
 
-    return fig, text_output_txt_reference, text_output_txt_fig_data
+    return figure_transport(fig), text_output_txt_reference, text_output_txt_fig_data
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # 02 CALLBACK FUNCTIONS
-@app.callback(
-    Output('02_output_fig_minmax_temp_anomaly', 'figure'),
-    Output('02_output_fig_mean_temp_anomalies', 'figure'),
-    [Input('02_input_sld_years', 'value')],
-    [Input('00_output_txt_reference_coordinates', 'children')]
-)
-def local_anomalies(selected_year, coordinates):
+def render_local_anomalies(selected_year, references):
     """
     Function for displaying the location-independent extreme values of the temperature anomalies as well as
     the global average values corresponding to the given year.
-    If a reference has been entered, the reference is inserted as comparison
+    If references have been entered, the references are inserted as comparison
 
     :param selected_year: given year based on dash slider
-    :param coordinates: coordinates, if given
+    :param references: resolved references (see reference_context), if given
     :return: polar line figure of extreme values, line figure of mean values
     """
+    df_anomaly_heatmap = datasets['anomaly_data'].get()
 
     # only values of selected year
     df_polar = df_anomaly_heatmap[df_anomaly_heatmap['Year'] == selected_year]
@@ -892,29 +1448,35 @@ def local_anomalies(selected_year, coordinates):
     df_polar_min, df_polar_max, df_polar_mean = extract_min_max_mean_anomalies(df_polar)
     df_polar_min_max_mean = pd.concat([df_polar_max, df_polar_min, df_polar_mean])
 
-    # if coordinates are given
-    if coordinates:
-        # extract latitude and longitude (rounded & odd values to fit dataset prerequisites)
-        latitude, longitude = extract_lat_lon(coordinates)
+    # percentiles per month from the quantile sketches of the selected year
+    df_polar_percentiles = extract_percentile_anomalies(datasets['anomaly_sketches'].get(), [selected_year],
+                                                        [5, 25, 50, 75, 95])
 
-        # extract specific values for given coordinates
-        df_polar_coordinates = df_polar[(df_polar['Latitude'] == latitude) &
-                                        (df_polar['Longitude'] == longitude)][['Month', 'Anomaly']]
+    # time series of the grid cells of all references with coordinates (gathered at once)
+    anomaly_matrix = datasets['anomaly_matrix'].get()
+    references, reference_anomalies = gather_reference_anomalies(anomaly_matrix, references)
 
-        # add type of values for comparison
-        df_polar_coordinates['Type'] = 'reference values'
+    # if coordinates are given
+    if references:
+        # one column per reference (type of values for comparison)
+        df_coordinates = pd.DataFrame(reference_anomalies, columns=[f'reference values @ {reference_label(reference)}'
+                                                                    for reference in references])
+        df_coordinates.insert(0, 'Year', anomaly_matrix['periods']['Year'].to_numpy())
+        df_coordinates.insert(1, 'Month', anomaly_matrix['periods']['Month'].to_numpy())
+
+        # extract specific values for selected year (one row per reference and month)
+        df_polar_coordinates = df_coordinates[df_coordinates['Year'] == selected_year].melt(
+            id_vars=['Month'], value_vars=df_coordinates.columns[2:], var_name='Type', value_name='Anomaly')
         # add values to dataframe
-        df_polar_min_max_mean = pd.concat([df_polar_min_max_mean, df_polar_coordinates])
-
-        # extract specific values for given coordinates
-        df_line_coordinates = df_anomaly_heatmap[(df_anomaly_heatmap['Latitude'] == latitude) &
-                                                 (df_anomaly_heatmap['Longitude'] == longitude)]
+        df_polar_min_max_mean = pd.concat([df_polar_min_max_mean,
+                                           df_polar_coordinates.dropna(subset='Anomaly')[['Month', 'Anomaly', 'Type']]])
 
-        df_line_coordinates = df_line_coordinates[['Anomaly', 'Year']].groupby('Year').mean().reset_index()
-        df_line_coordinates['Type'] = 'reference values'
+        # yearly means of all references at once
+        df_line_coordinates = df_coordinates.drop(columns='Month').groupby('Year').mean().reset_index().melt(
+            id_vars=['Year'], var_name='Type', value_name='Anomaly')
 
         # add values to dataframe
-        df_line = pd.concat([df_line, df_line_coordinates])
+        df_line = pd.concat([df_line, df_line_coordinates.dropna(subset='Anomaly')[['Year', 'Anomaly', 'Type']]])
 
     # determination of absolute min, max, min mean and max mean values for uniform display of figures
     abs_min_value = df_anomaly_heatmap['Anomaly'].min()
@@ -928,52 +1490,60 @@ def local_anomalies(selected_year, coordinates):
     df_polar_min_max_mean['Month'] = df_polar_min_max_mean['Month'].map(month_dict)
 
     # creating figures
-    fig_polar_line = create_polar_line_figure(df_polar_min_max_mean, abs_min_value, abs_max_value, months)
+    fig_polar_line = create_polar_line_figure(df_polar_min_max_mean, abs_min_value, abs_max_value, months,
+                                              df_polar_percentiles)
     fig_line = create_line_figure(df_line, abs_min_mean_value, abs_max_mean_value)
 
-    return fig_polar_line, fig_line
+    return figure_transport(fig_polar_line), figure_transport(fig_line)
+
+
+@callback(
+    Output('02_output_fig_minmax_temp_anomaly', 'figure'),
+    Output('02_output_fig_mean_temp_anomalies', 'figure'),
+    [Input('02_input_sld_years', 'value')],
+    [Input('00_store_references', 'data')],
+    [Input('02_store_section_visible', 'data')],
+    prevent_initial_call=True
+)
+def local_anomalies(selected_year, references, visible):
+    """
+    Callback of the section below the fold, rendered on demand (see render_lazy_section)
+
+    :param selected_year: given year based on dash slider
+    :param references: resolved references (see reference_context), if given
+    :param visible: True if the section has been scrolled into view or reached through the navigation
+    :return: outputs of the section
+    """
+    outputs = ['02_output_fig_minmax_temp_anomaly.figure', '02_output_fig_mean_temp_anomalies.figure']
+
+    return render_lazy_section(render_local_anomalies, outputs, visible, (selected_year, references))
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # 03 CALLBACK FUNCTION: GLOBAL TEMPERATURE IMPACT
-@app.callback(
-    Output('03_output_fig_temp_change_co2', 'figure'),
-    Output('03_output_fig_temp_change_co2_ranking', 'figure'),
-    # Output('03_output_txt_temp_change_co2_description', 'children'),
-    Output('03_input_ddl_treemap_grouping_options', 'style'),
-    [Input('03_input_tab_worldmap_treemap', 'value')],
-    [Input('03_input_ddl_treemap_grouping_options', 'value')],
-    [Input('00_output_txt_reference_location', 'children')]
-)
-def global_temperature_impact(map_type, treemap_option, location):
+def render_global_temperature_impact(map_type, treemap_option, references):
     """
     Function to show the impact on temperature anomalies due to CO2 emissions by country / grouping.
     Displayed either as a world map with country information only or as a treemap with additional grouping options.
-    Additional ranking of the largest polluters and, if given, the reference country.
+    Additional ranking of the largest polluters and, if given, the reference countries.
 
     :param map_type: type of map (string: world / treemap) to be displayed
     :param treemap_option: grouping options (string) for treemap visualization
-    :param location: location, if given
+    :param references: resolved references (see reference_context), if given
     :return: choropleth / treemap figure of co2-impact on temperature anomalies, bar figure for ranking top polluters,
                 description of displayed column, style (visible / not visible) of treemap grouping dropdown list
     """
-    # read needed columns
-    columns = config['dash_information']['03_df_co2_columns']
-
-    # only needed columns
-    df = df_co2_data[df_co2_data['year'] == df_co2_data['year'].max()][columns]
-
-    df = df[df['temperature_change_from_co2'] != 0]
+    # latest values, sorted by column 'temperature_change_from_co2' (materialized on first use)
+    co2_impact = datasets['co2_impact'].get()
+    co2_impact_view = co2_impact['view']
+    df = co2_impact_view['df']
 
-    # determination of absolute min and max values for uniform display of figures
-    abs_min_value = df['temperature_change_from_co2'].min()
-    abs_max_value = df['temperature_change_from_co2'].max()
+    # absolute min and max values for uniform display of figures
+    abs_min_value = co2_impact_view['min_value']
+    abs_max_value = co2_impact_view['max_value']
 
-    # label-creation
-    labels = {'temperature_change_from_co2':
-                  df_co2_codebook.loc['temperature_change_from_co2', 'description'].split('.')[0],
-              'co2':
-                  df_co2_codebook.loc['co2', 'description'].split('.')[0]}
+    # labels
+    labels = co2_impact_view['labels']
 
     # if tab is on worldmap (default)
     if map_type == 'world':
@@ -996,46 +1566,14 @@ def global_temperature_impact(map_type, treemap_option, location):
         # show dropdown list (only for treemap visualization)
         style_input_ddl_treemap = config['dash_information']['03_style_input_ddl_treemap']['visible']
 
-        if treemap_option.split('#')[0] == 'all':
-            parent_column = treemap_option.split('#')[1]
-            df_treemap = df.dropna(subset=parent_column)
+        # create treemap figure from precomputed hierarchy
+        fig = create_treemap_figure(co2_impact['treemap_hierarchies'][treemap_option], abs_min_value, abs_max_value)
 
-            fig = px.treemap(df_treemap, path=[parent_column, 'country'], values='temperature_change_from_co2',
-                             color='temperature_change_from_co2', color_continuous_scale='Reds',
-                             range_color=[abs_min_value, abs_max_value], hover_name='country')
+    # reference countries, if given
+    reference_countries = {reference['country'] for reference in references or [] if reference['country']}
 
-        else:
-            parent_value = treemap_option.split('#')[0]
-            parent_column = treemap_option.split('#')[1]
-            df_treemap = df[df[parent_column] == parent_value]
-
-            fig = px.treemap(df_treemap, path=['country'], values='temperature_change_from_co2',
-                             color='temperature_change_from_co2', color_continuous_scale='Reds',
-                             range_color=[abs_min_value, abs_max_value], hover_name='country')
-
-        # update for change in hover template
-        fig.update_traces(hovertemplate='<b>%{label}</b><br><br>Temperature change in °C: %{value}')
-        fig.update_layout(coloraxis_showscale=False)
-
-    # sort by column 'temperature_change_from_co2' for display order and filtering main polluters
-    df = df.sort_values('temperature_change_from_co2', ascending=True)
-
-    # filter data records with the 20 highest entries
-    df_top20 = df.tail(20)
-
-    # if a location is given
-    if location != '':
-        # only country
-        location = location.split(', ')[1]
-
-        # check if reference location is already in top 20 (TRUE/FALSE)
-        location_present = df_top20['country'].str.contains(location).any()
-
-        # if reference location is not yet included
-        if not location_present:
-            # filter and add data for reference location
-            df_location = df[df['country'] == location]
-            df_top20 = pd.concat([df_top20, df_location]).sort_values('temperature_change_from_co2', ascending=True)
+    # data records with the 20 highest entries (and the reference countries, if given and not yet included)
+    df_top20 = rank_top_df(co2_impact_view, 20, reference_countries)
 
     # # create bar figure (ranking)
     fig_ranking = px.bar(df_top20, orientation='h', x='temperature_change_from_co2', y='country',
@@ -1048,53 +1586,92 @@ def global_temperature_impact(map_type, treemap_option, location):
     fig_ranking.update_yaxes(title_text='')
     fig_ranking.update_xaxes(title_text='', gridcolor='black', tickvals=[i/10 for i in range(int(abs_max_value*10)+1)])
 
-    # change background-color, hide legend and highlight (=bold) reference location on y-axis (if given)
+    # change background-color, hide legend and highlight (=bold) reference locations on y-axis (if given)
     y_values = fig_ranking.data[0]['y']
     fig_ranking.update_layout(coloraxis_showscale=False, plot_bgcolor='white',
                               yaxis=dict(
                                   tickvals=y_values,
                                   ticktext=[country
-                                            if country != location
+                                            if country not in reference_countries
                                             else f'<b>{country}</b>' for country in y_values])
                               )
 
     # read data description of displayed column from codebook
     # column_description = df_co2_codebook.loc['temperature_change_from_co2', 'description']
 
-    return fig, fig_ranking, style_input_ddl_treemap
+    return figure_transport(fig), figure_transport(fig_ranking), style_input_ddl_treemap
+
+
+@callback(
+    Output('03_output_fig_temp_change_co2', 'figure'),
+    Output('03_output_fig_temp_change_co2_ranking', 'figure'),
+    # Output('03_output_txt_temp_change_co2_description', 'children'),
+    Output('03_input_ddl_treemap_grouping_options', 'style'),
+    [Input('03_input_tab_worldmap_treemap', 'value')],
+    [Input('03_input_ddl_treemap_grouping_options', 'value')],
+    [Input('00_store_references', 'data')],
+    [Input('03_store_section_visible', 'data')],
+    prevent_initial_call=True
+)
+def global_temperature_impact(map_type, treemap_option, references, visible):
+    """
+    Callback of the section below the fold, rendered on demand (see render_lazy_section)
+
+    :param map_type: type of map (string: world / treemap) to be displayed
+    :param treemap_option: grouping options (string) for treemap visualization
+    :param references: resolved references (see reference_context), if given
+    :param visible: True if the section has been scrolled into view or reached through the navigation
+    :return: outputs of the section
+    """
+    outputs = ['03_output_fig_temp_change_co2.figure', '03_output_fig_temp_change_co2_ranking.figure',
+               '03_input_ddl_treemap_grouping_options.style']
+
+    return render_lazy_section(render_global_temperature_impact, outputs, visible,
+                               (map_type, treemap_option, references))
 
 
 # ----------------------------------------------------------------------------------------------------------------------
-# 04 CALLBACK FUNCTIONS
-@app.callback(
-    Output('04_output_fig_co2_dev', 'figure'),
-    Output('04_output_fig_co2_cmp', 'figure'),
-    # Output('04_output_txt_co2_dev_description', 'children'),
-    Output('04_input_chkl_countries', 'style'),
+# 04 CLIENTSIDE CALLBACK FUNCTION: LINKS TO THE EXPORT OF THE DISPLAYED DATA (SEE /assets/export.js)
+clientside_callback(
+    ClientsideFunction(namespace='export', function_name='co2_development_links'),
+    Output('04_output_lnk_export_csv', 'href'),
+    Output('04_output_lnk_export_parquet', 'href'),
     [Input('04_input_ddl_grouping_options', 'value')],
     [Input('04_input_rsl_years', 'value')],
     [Input('04_input_chkl_countries', 'value')],
-    [Input('00_output_txt_reference_location', 'children')]
+    [Input('00_store_references', 'data')],
+    [State('04_store_export', 'data')]
 )
-def co2_development(grouping_option, xy_years, countries, location):
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# 04 CALLBACK FUNCTIONS
+def co2_development_view(grouping_option, xy_years, countries, references):
     """
-    Function to show the development of co2 consumption of individual countries or groups of countries.
-    Presentation of consumption over the entire period on the one hand,
-    and direct comparison between two selected years on the other.
-    If given, the reference country is added to the figures.
+    Groups / filters the co2 data of the needed year window as shown in section 04 (see render_co2_development),
+    also used by the export of the view
 
     :param grouping_option: hash-separated string for grouping control
     :param xy_years: List of years to be compared
     :param countries: List of countries - if no grouping (according to grouping_option)
-    :param location: location, if given
-    :return: line figure for co2-consumption over years, scatter figure for comparison of co2-consumption,
-                description of displayed column, style (visible / not visible) of country checklist
+    :param references: resolved references (see reference_context), if given
+    :return: view as dictionary (grouped / filtered dataframe - None if no countries are selected, column to color by,
+                entities to compare, matrices of the year window, co2 data of the reference countries,
+                style of the country checklist)
     """
-    # group / filter original dataframe depending on input (grouping_option)
-    if grouping_option is None:
-        return no_update, no_update, no_update
+    # co2 data of the needed year window (extended beyond the default years only if selected on the range slider)
+    co2_window = co2_data_window(min(xy_years[0], co2_data_default_years[0]),
+                                 max(xy_years[1], co2_data_default_years[1]))
+    df_co2_window = co2_window['df']
+    co2_window_indexes = co2_window['indexes']
+    co2_window_matrices = co2_window['matrices']
 
-    elif grouping_option.split('#')[0] == 'grouping':
+    # co2 data of all reference countries (gathered from the window at once)
+    df_reference = reference_co2_df(references, df_co2_window, co2_window_indexes)
+
+    # group / filter original dataframe depending on input (grouping_option)
+    df_development, color_figures, entities_comparison = None, None, None
+    if grouping_option.split('#')[0] == 'grouping':
         # extract the column to group by
         group = grouping_option.split('#')[1]
 
@@ -1102,11 +1679,14 @@ def co2_development(grouping_option, xy_years, countries, location):
         columns_grouping = set(config['dash_information']['04_df_co2_columns_grouping'])
 
         # group base dataframe
-        df_development = group_df(df_co2_data, columns_grouping, group, location)
+        df_development = group_df(df_co2_window, columns_grouping, group, df_reference)
 
         # define base of color for figures
         color_figures = group
 
+        # entities to compare (all groups)
+        entities_comparison = co2_window_matrices[group]['population'].index
+
         # update style depending on input (country checklist / no country checklist)
         style_input_chkl_countries = config['dash_information']['04_style_input_chkl_countries']['not_visible']
 
@@ -1121,11 +1701,15 @@ def co2_development(grouping_option, xy_years, countries, location):
         columns_filter = set(config['dash_information']['04_df_co2_columns_filter'])
 
         # filter base dataframe
-        df_development = filter_df(df_co2_data, columns_filter, filter_column, filter_value, location)
+        df_development = filter_df(df_co2_window, co2_window_indexes, columns_filter, filter_column, filter_value,
+                                   df_reference)
 
         # define base of color for figures
         color_figures = 'country'
 
+        # entities to compare (all countries matching the filter)
+        entities_comparison = co2_window_indexes['countries'][filter_column].get(filter_value, set())
+
         # update style depending on input (country checklist / no country checklist)
         style_input_chkl_countries = config['dash_information']['04_style_input_chkl_countries']['not_visible']
 
@@ -1133,9 +1717,7 @@ def co2_development(grouping_option, xy_years, countries, location):
         # update style depending on input (country checklist / no country checklist)
         style_input_chkl_countries = config['dash_information']['04_style_input_chkl_countries']['visible']
 
-        if not countries:
-            return no_update, no_update, style_input_chkl_countries
-        else:
+        if countries:
             # determine the column to filter by
             filter_column = 'country'
 
@@ -1146,38 +1728,105 @@ def co2_development(grouping_option, xy_years, countries, location):
             columns = config['dash_information']['04_df_co2_columns_filter']
 
             # group base dataframe
-            df_development = filter_df(df_co2_data, columns, filter_column, filter_value, location)
+            df_development = filter_df(df_co2_window, co2_window_indexes, columns, filter_column, filter_value,
+                                       df_reference)
 
             # define base of color for figures
             color_figures = 'country'
 
+            # entities to compare (selected countries)
+            entities_comparison = countries
+
+    return {'df': df_development, 'color': color_figures, 'entities': entities_comparison,
+            'matrices': co2_window_matrices, 'df_reference': df_reference, 'style': style_input_chkl_countries}
+
+
+def render_co2_development(grouping_option, xy_years, countries, references):
+    """
+    Function to show the development of co2 consumption of individual countries or groups of countries.
+    Presentation of consumption over the entire period on the one hand,
+    and direct comparison between two selected years on the other.
+    If given, the reference countries are added to the figures.
+
+    :param grouping_option: hash-separated string for grouping control
+    :param xy_years: List of years to be compared
+    :param countries: List of countries - if no grouping (according to grouping_option)
+    :param references: resolved references (see reference_context), if given
+    :return: line figure for co2-consumption over years, scatter figure for comparison of co2-consumption,
+                description of displayed column, style (visible / not visible) of country checklist
+    """
+    # group / filter original dataframe depending on input (grouping_option)
+    if grouping_option is None:
+        return no_update, no_update, no_update
+
+    view = co2_development_view(grouping_option, xy_years, countries, references)
+    if view['df'] is None:
+        return no_update, no_update, view['style']
+    df_development, color_figures, entities_comparison = view['df'], view['color'], view['entities']
+    co2_window_matrices, df_reference = view['matrices'], view['df_reference']
+    style_input_chkl_countries = view['style']
+    reference_countries = {reference['country'] for reference in references or [] if reference['country']}
+
     # division of the range slider into separate variables
     x_year = xy_years[0]
     y_year = xy_years[1]
 
     # create dataframe for comparison based on the years to be compared
-    df_comparison = xy_filter_df(df_development, color_figures, x_year, y_year)
+    df_comparison = xy_filter_df(co2_window_matrices, color_figures, entities_comparison, x_year, y_year,
+                                 df_reference)
 
     # create figures
     fig_development = create_co2_consumption_fig(df_development, color_figures, x_year, y_year)
     fig_comparison = create_co2_comparison_fig(df_comparison, color_figures, x_year, y_year)
 
-    # highlight (=bold) reference location in legend (if given)
-    if location != '':
+    # highlight (=bold) reference countries in legend (if given)
+    if reference_countries:
         for i, d in enumerate(fig_development.data):
-            if d.name == location:
+            if d.name in reference_countries:
                 fig_development.data[i].name = '<b>' + d.name + '</b>'
 
         for i, d in enumerate(fig_comparison.data):
-            if d.name == location:
+            if d.name in reference_countries:
                 fig_comparison.data[i].name = '<b>' + d.name + '</b>'
 
     # read data description of displayed column from codebook
+    df_co2_codebook = datasets['co2_codebook'].get()
     column_description = df_co2_codebook.loc['consumption_co2', 'description'], \
         df_co2_codebook.loc['consumption_co2_per_capita', 'description']
 
-    return fig_development, fig_comparison, style_input_chkl_countries
+    return figure_transport(fig_development), figure_transport(fig_comparison), style_input_chkl_countries
+
+
+@callback(
+    Output('04_output_fig_co2_dev', 'figure'),
+    Output('04_output_fig_co2_cmp', 'figure'),
+    # Output('04_output_txt_co2_dev_description', 'children'),
+    Output('04_input_chkl_countries', 'style'),
+    [Input('04_input_ddl_grouping_options', 'value')],
+    [Input('04_input_rsl_years', 'value')],
+    [Input('04_input_chkl_countries', 'value')],
+    [Input('00_store_references', 'data')],
+    [Input('04_store_section_visible', 'data')],
+    prevent_initial_call=True
+)
+def co2_development(grouping_option, xy_years, countries, references, visible):
+    """
+    Callback of the section below the fold, rendered on demand (see render_lazy_section)
+
+    :param grouping_option: hash-separated string for grouping control
+    :param xy_years: List of years to be compared
+    :param countries: List of countries - if no grouping (according to grouping_option)
+    :param references: resolved references (see reference_context), if given
+    :param visible: True if the section has been scrolled into view or reached through the navigation
+    :return: outputs of the section
+    """
+    outputs = ['04_output_fig_co2_dev.figure', '04_output_fig_co2_cmp.figure', '04_input_chkl_countries.style']
+
+    return render_lazy_section(render_co2_development, outputs, visible,
+                               (grouping_option, xy_years, countries, references))
 
 
-app.run_server(port=8051, debug=True)
-# app.run_server(port=8051)
+if __name__ == '__main__':
+    app = create_app()
+    app.run_server(port=8051, debug=True)
+    # app.run_server(port=8051)
@@ -0,0 +1,431 @@
+import io
+import json
+import math
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+from flask import Response, request
+
+# media type of the binary columnar responses (Arrow IPC stream)
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+# media types of the exports
+EXPORT_MEDIA_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet', 'netcdf': 'application/x-netcdf'}
+EXPORT_EXTENSIONS = {'csv': 'csv', 'parquet': 'parquet', 'netcdf': 'nc'}
+
+# periods of the queries (YYYY or YYYY-MM)
+PERIOD_PATTERN = re.compile(r'\d{4}(-(0[1-9]|1[0-2]))?')
+
+
+class QueryError(ValueError):
+    """
+    Invalid query parameters (answered with status 400)
+    """
+
+
+def locate_cells(anomaly_matrix, latitudes, longitudes):
+    """
+    Finds the grid cells of the given coordinates (nearest cell centers, longitudes wrapped to -180 - 180)
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param latitudes: latitudes of the coordinates
+    :param longitudes: longitudes of the coordinates
+    :return: positions of the cells in the matrix, latitudes and longitudes of the cell centers
+    """
+    grid_latitudes, grid_longitudes = anomaly_matrix['latitudes'], anomaly_matrix['longitudes']
+    cell_size = anomaly_matrix['cell_size']
+
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = (np.asarray(longitudes, dtype=float) + 180) % 360 - 180
+
+    if np.isnan(latitudes).any() or np.isnan(longitudes).any() or (np.abs(latitudes) > 90).any():
+        raise QueryError('latitudes must be between -90 and 90, longitudes must be numbers')
+
+    lat_positions = np.clip(np.rint((latitudes - grid_latitudes[0]) / cell_size), 0, len(grid_latitudes) - 1)
+    lon_positions = np.clip(np.rint((longitudes - grid_longitudes[0]) / cell_size), 0, len(grid_longitudes) - 1)
+    lat_positions, lon_positions = lat_positions.astype(np.int64), lon_positions.astype(np.int64)
+
+    return (lat_positions * len(grid_longitudes) + lon_positions, grid_latitudes[lat_positions],
+            grid_longitudes[lon_positions])
+
+
+def select_periods(anomaly_matrix, start, end):
+    """
+    Selects the periods of the given time range (periods are sorted)
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param start: first period (YYYY-MM or YYYY), all periods if not given
+    :param end: last period (YYYY-MM or YYYY), all periods if not given
+    :return: slice of the periods
+    """
+    for name, period in [('start', start), ('end', end)]:
+        if period is not None and not (isinstance(period, str) and PERIOD_PATTERN.fullmatch(period) or period == ''):
+            raise QueryError(f'{name} must be a period (YYYY or YYYY-MM)')
+
+    periods = anomaly_matrix['periods']['Period'].to_numpy().astype(str)
+
+    first = np.searchsorted(periods, start) if start else 0
+    # end of a year: all months of the year
+    last = np.searchsorted(periods, end + '-12' if end and len(end) == 4 else end, side='right') if end \
+        else len(periods)
+
+    return slice(int(first), int(last))
+
+
+def query_anomalies(anomaly_matrix, coordinates, start=None, end=None):
+    """
+    Time series of the grid cells of the given coordinates, gathered from the anomaly matrix at once
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param coordinates: list of coordinates (latitude, longitude)
+    :param start: first period (YYYY-MM or YYYY), if given
+    :param end: last period (YYYY-MM or YYYY), if given
+    :return: result as dictionary (coordinates, cell centers, periods and anomalies: coordinates x periods)
+    """
+    if not coordinates:
+        raise QueryError('no coordinates given')
+    try:
+        latitudes, longitudes = zip(*[(float(latitude), float(longitude)) for latitude, longitude in coordinates])
+    except (TypeError, ValueError):
+        raise QueryError('coordinates must be pairs of latitude and longitude')
+
+    cells, cell_latitudes, cell_longitudes = locate_cells(anomaly_matrix, latitudes, longitudes)
+    periods = select_periods(anomaly_matrix, start, end)
+
+    return {'latitudes': list(latitudes), 'longitudes': list(longitudes),
+            'cell_latitudes': cell_latitudes, 'cell_longitudes': cell_longitudes,
+            'periods': anomaly_matrix['periods']['Period'].to_numpy()[periods].astype(str),
+            'anomalies': anomaly_matrix['matrix'][periods][:, cells].T}
+
+
+def to_json_response(result):
+    """
+    :param result: query result (see query_anomalies)
+    :return: JSON response, one series per coordinates (missing values as null)
+    """
+    series = [{'latitude': latitude, 'longitude': longitude,
+               'cell_latitude': float(cell_latitude), 'cell_longitude': float(cell_longitude),
+               'anomalies': [None if math.isnan(value) else round(value, 4) for value in anomalies.tolist()]}
+              for latitude, longitude, cell_latitude, cell_longitude, anomalies
+              in zip(result['latitudes'], result['longitudes'], result['cell_latitudes'], result['cell_longitudes'],
+                     result['anomalies'])]
+
+    return Response(json.dumps({'periods': result['periods'].tolist(), 'series': series}),
+                    mimetype='application/json')
+
+
+def to_arrow_response(result):
+    """
+    :param result: query result (see query_anomalies)
+    :return: Arrow IPC stream response, one row per coordinates with the anomalies as fixed size list (float32,
+        missing values as null), the periods are stored in the schema metadata
+    """
+    import pyarrow as pa
+
+    anomalies = result['anomalies'].astype(np.float32).ravel()
+    table = pa.table({
+        'latitude': np.asarray(result['latitudes'], dtype=float),
+        'longitude': np.asarray(result['longitudes'], dtype=float),
+        'cell_latitude': np.asarray(result['cell_latitudes'], dtype=float),
+        'cell_longitude': np.asarray(result['cell_longitudes'], dtype=float),
+        'anomalies': pa.FixedSizeListArray.from_arrays(pa.array(anomalies, mask=np.isnan(anomalies)),
+                                                       len(result['periods']))},
+        metadata={'periods': json.dumps(result['periods'].tolist())})
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return Response(sink.getvalue(), mimetype=ARROW_MEDIA_TYPE)
+
+
+def select_cells(anomaly_matrix, lat_min, lat_max, lon_min, lon_max):
+    """
+    Selects the grid cells with centers in the given bounding box (wrapped around the date line if lon_min > lon_max)
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param lat_min: southern boundary
+    :param lat_max: northern boundary
+    :param lon_min: western boundary
+    :param lon_max: eastern boundary
+    :return: positions of the selected latitudes and longitudes in the grid
+    """
+    grid_latitudes, grid_longitudes = anomaly_matrix['latitudes'], anomaly_matrix['longitudes']
+
+    if lat_min > lat_max:
+        raise QueryError('lat_min must not be greater than lat_max')
+    lat_positions = np.flatnonzero((grid_latitudes >= lat_min) & (grid_latitudes <= lat_max))
+    if lon_min <= lon_max:
+        lon_positions = np.flatnonzero((grid_longitudes >= lon_min) & (grid_longitudes <= lon_max))
+    else:
+        lon_positions = np.concatenate([np.flatnonzero(grid_longitudes >= lon_min),
+                                        np.flatnonzero(grid_longitudes <= lon_max)])
+    if not len(lat_positions) or not len(lon_positions):
+        raise QueryError('no grid cells in the bounding box')
+
+    return lat_positions, lon_positions
+
+
+def anomaly_export_blocks(anomaly_matrix, lat_positions, lon_positions, periods, chunk_periods):
+    """
+    Anomalies of the selected cells and periods in blocks of periods (bounded memory for long global extracts)
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param lat_positions: positions of the selected latitudes (see select_cells)
+    :param lon_positions: positions of the selected longitudes (see select_cells)
+    :param periods: slice of the selected periods (see select_periods)
+    :param chunk_periods: number of periods per block
+    :return: generator of blocks (period labels, anomalies: periods x latitudes x longitudes)
+    """
+    cells = (lat_positions[:, np.newaxis] * len(anomaly_matrix['longitudes']) + lon_positions).ravel()
+    labels = anomaly_matrix['periods']['Period'].to_numpy().astype(str)
+
+    for first in range(periods.start, periods.stop, chunk_periods):
+        block = slice(first, min(first + chunk_periods, periods.stop))
+        yield labels[block], anomaly_matrix['matrix'][block][:, cells].reshape(-1, len(lat_positions),
+                                                                               len(lon_positions))
+
+
+def anomaly_export_frames(anomaly_matrix, lat_positions, lon_positions, blocks):
+    """
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param lat_positions: positions of the selected latitudes (see select_cells)
+    :param lon_positions: positions of the selected longitudes (see select_cells)
+    :param blocks: blocks of anomalies (see anomaly_export_blocks)
+    :return: generator of dataframes in the layout of the anomaly data (Period, Latitude, Longitude, Anomaly)
+    """
+    latitudes = np.repeat(anomaly_matrix['latitudes'][lat_positions], len(lon_positions))
+    longitudes = np.tile(anomaly_matrix['longitudes'][lon_positions], len(lat_positions))
+
+    for labels, anomalies in blocks:
+        yield pd.DataFrame({'Period': np.repeat(labels, len(latitudes)),
+                            'Latitude': np.tile(latitudes, len(labels)),
+                            'Longitude': np.tile(longitudes, len(labels)),
+                            'Anomaly': anomalies.ravel()})
+
+
+def stream_csv(frames):
+    """
+    :param frames: dataframes with the same columns
+    :return: generator of the CSV encoded dataframes (header with the first dataframe)
+    """
+    header = True
+    for df in frames:
+        yield df.to_csv(index=False, header=header).encode()
+        header = False
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Writable file object collecting the written bytes until they are taken (see stream_parquet)
+    """
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def stream_parquet(frames):
+    """
+    :param frames: dataframes with the same columns and types
+    :return: generator of the Parquet file, one row group per dataframe
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = ChunkSink()
+    writer = None
+    for df in frames:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression='zstd')
+        writer.write_table(table)
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+
+def stream_netcdf(anomaly_matrix, lat_positions, lon_positions, blocks, block_size):
+    """
+    Writes the anomalies block by block into a temporary NetCDF file (time x latitude x longitude), which is
+    streamed in blocks afterwards and removed (NetCDF files can not be written to a stream)
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param lat_positions: positions of the selected latitudes (see select_cells)
+    :param lon_positions: positions of the selected longitudes (see select_cells)
+    :param blocks: blocks of anomalies (see anomaly_export_blocks)
+    :param block_size: size of the streamed blocks in bytes
+    :return: generator of the NetCDF file
+    """
+    import netCDF4
+
+    file_descriptor, filepath = tempfile.mkstemp(suffix='.nc')
+    os.close(file_descriptor)
+    try:
+        with netCDF4.Dataset(filepath, 'w', format='NETCDF4') as dataset:
+            dataset.createDimension('time', None)
+            dataset.createDimension('latitude', len(lat_positions))
+            dataset.createDimension('longitude', len(lon_positions))
+            times = dataset.createVariable('time', str, ('time',))
+            times.long_name = 'period (YYYY-MM)'
+            dataset.createVariable('latitude', 'f4', ('latitude',))[:] = anomaly_matrix['latitudes'][lat_positions]
+            dataset.createVariable('longitude', 'f4', ('longitude',))[:] = \
+                anomaly_matrix['longitudes'][lon_positions]
+            anomalies = dataset.createVariable('anomaly', 'f4', ('time', 'latitude', 'longitude'), zlib=True,
+                                               fill_value=np.float32(np.nan))
+            anomalies.units = 'K'
+
+            position = 0
+            for labels, block in blocks:
+                times[position:position + len(labels)] = labels.astype(object)
+                anomalies[position:position + len(labels)] = block
+                position += len(labels)
+
+        with open(filepath, 'rb') as file:
+            while data := file.read(block_size):
+                yield data
+    finally:
+        os.remove(filepath)
+
+
+def export_response(chunks, data_format, filename):
+    """
+    :param chunks: generator of the encoded export
+    :param data_format: csv, parquet or netcdf
+    :param filename: name of the file (without extension)
+    :return: streamed response (download)
+    """
+    return Response(chunks, mimetype=EXPORT_MEDIA_TYPES[data_format],
+                    headers={'Content-Disposition':
+                             f'attachment; filename={filename}.{EXPORT_EXTENSIONS[data_format]}'})
+
+
+def export_format(formats):
+    """
+    :param formats: supported formats
+    :return: format requested via parameter "format" (csv if not given)
+    """
+    requested = request.args.get('format', 'csv')
+    if requested not in formats:
+        raise QueryError(f'format must be one of {", ".join(formats)}')
+
+    return requested
+
+
+def float_argument(name, default):
+    """
+    :param name: name of the query parameter
+    :param default: value if not given
+    :return: value of the query parameter as number
+    """
+    try:
+        return float(request.args.get(name, default))
+    except ValueError:
+        raise QueryError(f'{name} must be a number')
+
+
+def error_response(error):
+    """
+    :param error: query error
+    :return: JSON response with status 400
+    """
+    return Response(json.dumps({'error': str(error)}), status=400, mimetype='application/json')
+
+
+def response_format():
+    """
+    :return: format of the response: arrow if requested via parameter "format" or Accept header, otherwise json
+    """
+    requested = request.args.get('format')
+    if requested is None and request.is_json:
+        requested = (request.get_json(silent=True) or {}).get('format')
+    if requested is None:
+        requested = 'arrow' if request.accept_mimetypes.best == ARROW_MEDIA_TYPE else 'json'
+    if requested not in ('json', 'arrow'):
+        raise QueryError('format must be json or arrow')
+
+    return requested
+
+
+def register_api(server, datasets, settings):
+    """
+    Registers the query and export routes on the Flask server of the app:
+    GET /api/anomalies/point?lat=<lat>&lon=<lon>[&start=<YYYY-MM>][&end=<YYYY-MM>][&format=json|arrow]
+    POST /api/anomalies/batch with JSON {"coordinates": [[lat, lon], ...], "start": ..., "end": ..., "format": ...}
+    GET /api/export/anomalies[?lat_min=&lat_max=&lon_min=&lon_max=][&start=][&end=][&format=csv|parquet|netcdf]
+    The series are gathered from the anomaly matrix (periods x grid cells) of the worker, the exports are streamed.
+
+    :param server: Flask server of the Dash app
+    :param datasets: dataset handles (see create_datasets)
+    :param settings: data information of the configuration (api_* settings)
+    :return: no return
+    """
+    max_batch_size = settings['api_max_batch_coordinates']
+
+    def respond(coordinates, start, end):
+        try:
+            result = query_anomalies(datasets['anomaly_matrix'].get(), coordinates, start, end)
+            return to_arrow_response(result) if response_format() == 'arrow' else to_json_response(result)
+        except QueryError as error:
+            return error_response(error)
+
+    def point():
+        return respond([(request.args.get('lat'), request.args.get('lon'))], request.args.get('start'),
+                       request.args.get('end'))
+
+    def batch():
+        query = request.get_json(silent=True)
+        if not isinstance(query, dict) or not isinstance(query.get('coordinates'), list):
+            return error_response(QueryError('JSON body with a list of coordinates expected'))
+        if len(query['coordinates']) > max_batch_size:
+            return error_response(QueryError(f'at most {max_batch_size} coordinates per query'))
+
+        return respond(query['coordinates'], query.get('start'), query.get('end'))
+
+    def export_anomalies():
+        try:
+            anomaly_matrix = datasets['anomaly_matrix'].get()
+            data_format = export_format(EXPORT_MEDIA_TYPES)
+            lat_positions, lon_positions = select_cells(anomaly_matrix, float_argument('lat_min', -90),
+                                                        float_argument('lat_max', 90),
+                                                        float_argument('lon_min', -180),
+                                                        float_argument('lon_max', 180))
+            periods = select_periods(anomaly_matrix, request.args.get('start'), request.args.get('end'))
+            if periods.start >= periods.stop:
+                raise QueryError('no periods in range')
+        except QueryError as error:
+            return error_response(error)
+
+        blocks = anomaly_export_blocks(anomaly_matrix, lat_positions, lon_positions, periods,
+                                       settings['api_export_chunk_periods'])
+        if data_format == 'netcdf':
+            chunks = stream_netcdf(anomaly_matrix, lat_positions, lon_positions, blocks,
+                                   settings['api_export_block_size'])
+        else:
+            frames = anomaly_export_frames(anomaly_matrix, lat_positions, lon_positions, blocks)
+            chunks = stream_csv(frames) if data_format == 'csv' else stream_parquet(frames)
+
+        return export_response(chunks, data_format, 'temperature-anomalies')
+
+    server.add_url_rule('/api/anomalies/point', 'anomalies_point', point, methods=['GET'])
+    server.add_url_rule('/api/anomalies/batch', 'anomalies_batch', batch, methods=['POST'])
+    server.add_url_rule('/api/export/anomalies', 'export_anomalies', export_anomalies, methods=['GET'])
@@ -1,9 +1,19 @@
+import base64
+import json
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+
+# co2 data of the reference countries (see reference_co2_df)
+REFERENCE_CO2_COLUMNS = ['year', 'country', 'population', 'consumption_co2', 'consumption_co2_per_capita']
+
+# line colors of the references in the comparisons (first reference black, repeated if there are more references)
+REFERENCE_COLORS = ['black'] + px.colors.qualitative.Dark24
+
+# numeric array properties of the traces converted by compact_figure_arrays
+FIGURE_ARRAY_PROPERTIES = ['x', 'y', 'z', 'r', 'lat', 'lon', 'values', 'customdata', 'marker.color', 'marker.colors',
+                           'marker.size']
 
 
 def extract_lat_lon(coordinates):
@@ -26,14 +36,28 @@ def extract_lat_lon(coordinates):
     return rounded_lat, rounded_lon
 
 
-def find_location(coordinates):
+def create_geolocator():
+    """
+    Creates the default geocoder (Nominatim)
+
+    :return: geocoder
+    """
+    from geopy.geocoders import Nominatim
+    return Nominatim(user_agent="myGeocoder")
+
+
+def find_location(coordinates, geolocator=None):
     """
     Extracts location (city, country) from coordinates in comma separated string format.
 
     :param coordinates: coordinates, first latitude, then longitude, in comma separated string format
+    :param geolocator: geocoder (optional, i.e. a stub for load tests), default geocoder if not given
     :return: location (city, country), message in case of error, status (error / no error)
     """
-    geolocator = Nominatim(user_agent="myGeocoder")
+    # geocoding library only imported if a reference is given
+    from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+
+    geolocator = geolocator or create_geolocator()
 
     # input check for valid latitude and longitude values
     try:
@@ -88,14 +112,18 @@ def find_location(coordinates):
         return None, status, message
 
 
-def find_coordinates(location):
+def find_coordinates(location, geolocator=None):
     """
     Extracts coordinates from location (city, country) in comma separated string format.
 
     :param location: location (city, country) in comma separated string format
+    :param geolocator: geocoder (optional, i.e. a stub for load tests), default geocoder if not given
     :return: coordinates (latitude, longitude), message in case of error, status (error / no error)
     """
-    geolocator = Nominatim(user_agent="myGeocoder")
+    # geocoding library only imported if a reference is given
+    from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+
+    geolocator = geolocator or create_geolocator()
 
     # check if coordinates can be determined
     try:
@@ -117,18 +145,156 @@ def find_coordinates(location):
     return coordinates, status, message
 
 
+def extract_country(location, countryname_changes=None):
+    """
+    Extracts the country from location (city, country) in comma separated string format.
+    If given, the country name is translated (i.e. to the country names of the geo data).
+
+    :param location: location (city, country) in comma separated string format
+    :param countryname_changes: country names to be changed (optional)
+    :return: country
+    """
+    country = location.split(', ')[-1]
+    if countryname_changes is not None:
+        country = countryname_changes.get(country, country)
+
+    return country
+
+
+def collect_references(coordinates, location, pins, max_references=None):
+    """
+    Collects the references to compare: the current reference (if given) and the pinned references,
+    without duplicates and in order of their entry.
+
+    :param coordinates: coordinates of the current reference in comma separated string format, if given
+    :param location: location (city, country) of the current reference in comma separated string format, if given
+    :param pins: pinned references (list of dictionaries with coordinates and location), if given
+    :param max_references: maximum number of references (optional)
+    :return: list of references (dictionaries with coordinates and location)
+    """
+    references = []
+    for reference in [{'coordinates': coordinates, 'location': location}] + list(pins or []):
+        reference = {'coordinates': reference.get('coordinates') or '', 'location': reference.get('location') or ''}
+        if (reference['coordinates'] or reference['location']) and reference not in references:
+            references.append(reference)
+
+    return references[:max_references]
+
+
+def resolve_references(references, anomaly_matrix, countryname_changes):
+    """
+    Resolves the references once for all sections: the grid cell of the coordinates (position in the anomaly
+    matrix) and the country of the location. The data of the references is gathered by the sections
+    for all references at once (see gather_reference_anomalies and reference_co2_df).
+    The result is compact and JSON serializable (dcc.Store).
+
+    :param references: references (dictionaries with coordinates and location, see collect_references)
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param countryname_changes: country names of the co2 data which differ in the geo data
+    :return: list of resolved references as dictionaries, None if no references are given
+    """
+    if not references:
+        return None
+
+    grid_latitudes, grid_longitudes = anomaly_matrix['latitudes'], anomaly_matrix['longitudes']
+
+    # extract latitude and longitude (rounded & odd values to fit dataset prerequisites)
+    lat_lon = np.array([extract_lat_lon(reference['coordinates']) if reference['coordinates'] else (np.nan, np.nan)
+                        for reference in references], dtype=float).reshape(-1, 2)
+
+    # grid cells of all coordinates at once (only coordinates matching a grid cell)
+    lat_positions = np.clip(np.searchsorted(grid_latitudes, lat_lon[:, 0]), 0, len(grid_latitudes) - 1)
+    lon_positions = np.clip(np.searchsorted(grid_longitudes, lat_lon[:, 1]), 0, len(grid_longitudes) - 1)
+    in_grid = (grid_latitudes[lat_positions] == lat_lon[:, 0]) & (grid_longitudes[lon_positions] == lat_lon[:, 1])
+    cells = lat_positions * len(grid_longitudes) + lon_positions
+
+    resolved = []
+    for reference, (latitude, longitude), cell, valid in zip(references, lat_lon, cells, in_grid):
+        has_coordinates = bool(reference['coordinates'])
+        resolved.append({
+            'coordinates': reference['coordinates'], 'location': reference['location'],
+            'latitude': int(latitude) if has_coordinates else None,
+            'longitude': int(longitude) if has_coordinates else None,
+            'cell': int(cell) if valid else None,
+            'country': extract_country(reference['location']) if reference['location'] else None,
+            'geo_country': extract_country(reference['location'], countryname_changes)
+            if reference['location'] else None
+        })
+
+    return resolved
+
+
+def reference_label(reference):
+    """
+    :param reference: resolved reference (see resolve_references)
+    :return: label of the reference in the figures (location, otherwise coordinates)
+    """
+    return reference['location'] or reference['coordinates']
+
+
+def gather_reference_anomalies(anomaly_matrix, references):
+    """
+    Gathers the time series of the grid cells of all references with coordinates from the anomaly matrix at once.
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param references: resolved references (see resolve_references), if given
+    :return: references with coordinates, their anomalies (periods x references, missing values are NaN)
+    """
+    references = [reference for reference in references or [] if reference['coordinates']]
+
+    # coordinates outside of the grid have no values
+    cells = np.array([reference['cell'] if reference['cell'] is not None else -1 for reference in references],
+                     dtype=np.int64)
+    anomalies = anomaly_matrix['matrix'][:, np.maximum(cells, 0)]
+    anomalies[:, cells < 0] = np.nan
+
+    return references, anomalies
+
+
+def latest_valid_values(values):
+    """
+    :param values: values (periods x series, missing values are NaN)
+    :return: latest non-missing value of each series (NaN if a series has no values)
+    """
+    valid = ~np.isnan(values)
+    positions = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+
+    return np.where(valid.any(axis=0), values[positions, np.arange(values.shape[1])], np.nan)
+
+
+def reference_co2_df(references, df_input, indexes):
+    """
+    Gathers the co2 data of the reference countries from the given dataframe via its secondary indexes
+    (the rows of all reference countries at once).
+
+    :param references: resolved references (see resolve_references), if given
+    :param df_input: co2 data of the year window, sorted by year and consumption
+    :param indexes: secondary indexes of the given dataframe (see co2_data_build_indexes)
+    :return: co2 data of the reference countries, None if no reference country is given
+    """
+    countries = list(dict.fromkeys(reference['country'] for reference in references or [] if reference['country']))
+    if not countries:
+        return None
+
+    column_positions = indexes['positions']['country']
+    positions = [column_positions[country] for country in countries if country in column_positions]
+    positions = np.concatenate(positions) if positions else np.array([], dtype=int)
+
+    return df_input.iloc[positions][REFERENCE_CO2_COLUMNS].reset_index(drop=True)
+
+
 def add_marker(fig, latitude, longitude):
     """
     Adds marker at given coordination points
 
     :param fig: fig to which marker is added
-    :param latitude: given latitude
-    :param longitude: given longitude
+    :param latitude: given latitude (or list of latitudes, one trace for all markers)
+    :param longitude: given longitude (or list of longitudes)
     :return: no return
     """
     fig.add_trace(
         go.Scattergeo(
-            lat=[latitude], lon=[longitude],
+            lat=np.atleast_1d(latitude).tolist(), lon=np.atleast_1d(longitude).tolist(),
             mode='markers', showlegend=False,
             marker=dict(size=10, color='black', symbol='x'),
             hoverinfo='none',
@@ -139,27 +305,23 @@ def add_marker(fig, latitude, longitude):
     return fig
 
 
-def add_country_shape(fig, gdf, location, countryname_changes):
+def add_country_shape(fig, gdf, country):
     """
-    Adds shape of country (location) to choropleth map based on geojson data
+    Adds shape of country to choropleth map based on geojson data
 
     :param fig: fig to which shape is added
     :param gdf: geojson with country (geo-) informationen
-    :param location: location (city, country) in comma separated format
-    :param countryname_changes:
+    :param country: country (name of the geo data, see extract_country) or list of countries (one trace for all)
     :return: no return
     """
-    country = location.split(', ')[-1]
-    if country in countryname_changes.keys():
-        country = countryname_changes[country]
-
-    gdf_country = gdf[gdf['ADMIN'] == country]
+    countries = country if isinstance(country, list) else [country]
+    gdf_country = gdf[gdf['ADMIN'].isin(countries)]
 
     if not gdf_country.empty:
         fig.add_trace(go.Choropleth(
             geojson=gdf_country.geometry.__geo_interface__,
             locations=gdf_country.index,
-            z=[1],  # Konstante Farbe, da wir nur die Grenzen anzeigen möchten
+            z=[1] * len(gdf_country),  # Konstante Farbe, da wir nur die Grenzen anzeigen möchten
             colorscale="Viridis",
             showscale=False,
             marker_line_width=2,  # Grenzlinienbreite
@@ -170,6 +332,150 @@ def add_country_shape(fig, gdf, location, countryname_changes):
     return fig
 
 
+def extract_map_view(relayout_data, map_view=None):
+    """
+    Extracts the zoom state (center, rotation and scale of the projection) of a world map from its relayout data
+
+    :param relayout_data: relayout data of the figure (only the properties changed by the last zoom or pan)
+    :param map_view: previous map view (size of the figure in pixels and geo properties), if given
+    :return: map view as dictionary (geo properties as in the relayout data, i.e. 'geo.projection.scale')
+    """
+    map_view = dict(map_view or {})
+    map_view.update({key: value for key, value in (relayout_data or {}).items() if key.startswith('geo.')})
+
+    return map_view
+
+
+def map_view_pixels_per_degree(map_view, default_size):
+    """
+    :param map_view: map view (see extract_map_view)
+    :param default_size: size of the figure in pixels (width, height) if not given in the map view
+    :return: displayed size of one degree in pixels (the whole world fills the figure at scale 1)
+    """
+    width, height = map_view.get('width') or default_size[0], map_view.get('height') or default_size[1]
+
+    return min(width / 360, height / 180) * map_view.get('geo.projection.scale', 1)
+
+
+def select_grid_level(pyramid, map_view, default_size, min_cell_pixels):
+    """
+    Selects the finest level of the grid pyramid whose cells are displayed with at least the given size
+    (finer cells would not be visible as such and only increase the size of the figure)
+
+    :param pyramid: levels of the grid pyramid, finest first (see anomaly_data_build_pyramid)
+    :param map_view: map view (see extract_map_view)
+    :param default_size: size of the figure in pixels (width, height) if not given in the map view
+    :param min_cell_pixels: minimum displayed size of a cell in pixels
+    :return: position of the selected level
+    """
+    pixels_per_degree = map_view_pixels_per_degree(map_view, default_size)
+
+    for position, level in enumerate(pyramid):
+        if level['cell_size'] * pixels_per_degree >= min_cell_pixels:
+            return position
+
+    return len(pyramid) - 1
+
+
+def visible_cells(latitudes, longitudes, map_view, default_size, margin):
+    """
+    Selects the grid cells inside the visible extent of the map (around the center of the zoomed view)
+
+    :param latitudes: latitudes of the cells
+    :param longitudes: longitudes of the cells
+    :param map_view: map view (see extract_map_view)
+    :param default_size: size of the figure in pixels (width, height) if not given in the map view
+    :param margin: additional share of the visible extent (cells on the edges, distortion of the projection)
+    :return: boolean mask of the visible cells
+    """
+    if map_view.get('geo.projection.scale', 1) <= 1:
+        return np.ones(len(latitudes), dtype=bool)
+
+    width, height = map_view.get('width') or default_size[0], map_view.get('height') or default_size[1]
+    pixels_per_degree = map_view_pixels_per_degree(map_view, default_size)
+    center_lon = map_view.get('geo.center.lon', map_view.get('geo.projection.rotation.lon', 0))
+    center_lat = map_view.get('geo.center.lat', 0)
+
+    # distance in longitude across the antimeridian
+    lon_distance = (longitudes - center_lon + 180) % 360 - 180
+
+    return (np.abs(lon_distance) <= width / 2 / pixels_per_degree * (1 + margin)) & \
+        (np.abs(latitudes - center_lat) <= height / 2 / pixels_per_degree * (1 + margin))
+
+
+def stream_playback_frames(playback, step, chunk_frames):
+    """
+    Streams the frames of the heatmap playback: a header (JSON line) with the grid geometry and the labels of the
+    frames, followed by the frames as little-endian 16 bit integers (see anomaly_data_encode_frames) in chunks
+
+    :param playback: playback frames (see anomaly_playback)
+    :param step: month or year
+    :param chunk_frames: number of frames per chunk
+    :return: generator of the chunks (bytes)
+    """
+    frames = playback[step]
+    header = {'labels': list(frames['labels']), 'range': list(frames['range']), 'scale': 0.01, 'missing': -32768,
+              'cell_size': playback['cell_size'], 'latitudes': playback['latitudes'].tolist(),
+              'longitudes': playback['longitudes'].tolist()}
+    yield (json.dumps(header) + '\n').encode()
+
+    for start in range(0, len(frames['deltas']), chunk_frames):
+        yield frames['deltas'][start:start + chunk_frames].astype('<i2').tobytes()
+
+
+def create_placeholder_figure(text):
+    """
+    Creates lightweight placeholder figure (without data and axes) showing the given text
+
+    :param text: text to be shown
+    :return: placeholder figure
+    """
+    fig = go.Figure()
+    fig.update_xaxes(visible=False)
+    fig.update_yaxes(visible=False)
+    fig.update_layout(plot_bgcolor='white',
+                      annotations=[dict(text=text, showarrow=False, xref='paper', yref='paper', x=0.5, y=0.5)])
+
+    return fig
+
+
+def compact_figure_arrays(fig, min_length):
+    """
+    Binary transport of the large numeric arrays of a figure: arrays (or lists) with at least min_length values are
+    replaced by base64 encoded typed arrays ({dtype, bdata}) of float32 or the smallest integer type holding their
+    values, which are decoded by plotly.js in the browser
+
+    :param fig: figure (changed in place)
+    :param min_length: minimum number of values of the converted arrays
+    :return: figure
+    """
+    for trace in fig.data:
+        # properties read from the plain dictionary of the trace (lookups of the trace objects are validated)
+        properties = trace.to_plotly_json()
+        for name in FIGURE_ARRAY_PROPERTIES:
+            parent, _, prop = name.rpartition('.')
+            value = properties.get(parent, {}).get(prop) if parent else properties.get(prop)
+            if value is None or isinstance(value, (str, dict)):
+                continue
+
+            values = np.asarray(value)
+            if values.size < min_length or values.dtype.kind not in 'fiu':
+                continue
+            if values.dtype.kind == 'f':
+                values = values.astype('<f4')
+            else:
+                values = values.astype(next((dtype for dtype in ('<i1', '<u1', '<i2', '<u2', '<i4', '<u4')
+                                             if np.iinfo(dtype).min <= values.min() and
+                                             values.max() <= np.iinfo(dtype).max), '<f8'))
+
+            typed_array = {'dtype': values.dtype.str[1:], 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+            if values.ndim > 1:
+                typed_array['shape'] = ', '.join(map(str, values.shape))
+            trace[name] = typed_array
+
+    return fig
+
+
 def extract_min_max_mean_anomalies(df_input):
     """
     Calculates the minimum, maximum and average values of temperature anomalies of given dataframe
@@ -203,14 +509,69 @@ def extract_min_max_mean_anomalies(df_input):
     return df_min, df_max, df_mean
 
 
-def create_polar_line_figure(df_input, min_value, max_value, months):
+def extract_percentile_anomalies(sketches, years, percentiles):
+    """
+    Calculates percentiles of the temperature anomalies per month from the quantile sketches of the given years
+    (the sketches of the years are merged per month, no scan of the grid)
+
+    :param sketches: quantile sketches per period (see anomaly_data_build_sketches)
+    :param years: list of years
+    :param percentiles: list of percentiles (i.e. [5, 25, 50, 75, 95])
+    :return: dataframe with month numbers (1-12) and one column per percentile (no values for months without data)
+    """
+    df_periods = sketches['periods']
+    edges = sketches['edges']
+    df = pd.DataFrame({'Month': range(1, 13)})
+    values = np.full((12, len(percentiles)), np.nan)
+
+    for month in range(1, 13):
+        # merged sketch of the month
+        selection = ((df_periods['Month'] == month) & df_periods['Year'].isin(years)).to_numpy()
+        counts = sketches['counts'][selection].sum(axis=0)
+        if not counts.sum():
+            continue
+
+        # position of the percentiles in the cumulative counts, linear interpolation within the bin
+        cumulative_counts = np.cumsum(counts)
+        targets = np.asarray(percentiles) / 100 * cumulative_counts[-1]
+        bins = np.minimum(np.searchsorted(cumulative_counts, targets), len(counts) - 1)
+        previous_counts = np.where(bins > 0, cumulative_counts[bins - 1], 0)
+        shares = np.clip((targets - previous_counts) / np.maximum(counts[bins], 1), 0, 1)
+        values[month - 1] = edges[bins] + shares * (edges[bins + 1] - edges[bins])
+
+    for position, percentile in enumerate(percentiles):
+        df[percentile] = values[:, position]
+
+    return df
+
+
+def style_reference_traces(fig):
     """
-    Creates polar line figure based on given dataframe, minimum and maximum values for plot range
+    Changes the traces of the references (named 'reference values @ <reference>') to dashed lines,
+    one color per reference, the other traces are shown transparent
+
+    :param fig: figure with one trace per value type
+    :return: no return
+    """
+    references = 0
+    for trace in fig.data:
+        if trace.name.startswith('reference values'):
+            trace.line = dict(dash='dash', color=REFERENCE_COLORS[references % len(REFERENCE_COLORS)])
+            references += 1
+        else:
+            trace.opacity = 0.5
+
+
+def create_polar_line_figure(df_input, min_value, max_value, months, df_percentiles=None):
+    """
+    Creates polar line figure based on given dataframe, minimum and maximum values for plot range.
+    If percentiles are given, the ranges 5 - 95 % and 25 - 75 % are shown as bands with the median as line
 
     :param df_input: given dataframe
     :param min_value: minimum value for plot
     :param max_value: maximum value for plot
     :param months: list of months for legend
+    :param df_percentiles: percentiles 5, 25, 50, 75 and 95 per month (see extract_percentile_anomalies), if given
     :return: polar line figure
     """
     # define color map for line_polar
@@ -229,12 +590,8 @@ def create_polar_line_figure(df_input, min_value, max_value, months):
                         hover_name='Month', hover_data={'Type': False, 'Month': False},
                         labels={'Anomaly': 'Anomaly in °C'})
 
-    # change trace for reference comparison
-    for trace in fig.data:
-        if trace.name == 'reference values':
-            trace.line = dict(dash='dash', color='black')
-        else:
-            trace.opacity = 0.5
+    # change traces for reference comparison (one per reference)
+    style_reference_traces(fig)
 
     fig = go.Figure(fig)
 
@@ -267,6 +624,22 @@ def create_polar_line_figure(df_input, min_value, max_value, months):
             hoverinfo='none'
         ))
 
+    # percentile bands (lower limit without filling, upper limit filled to the lower limit) and median
+    if df_percentiles is not None:
+        # closed lines (january repeated)
+        df_closed = pd.concat([df_percentiles, df_percentiles.iloc[:1]])
+        theta = [months[month - 1] for month in df_closed['Month']]
+        for lower, upper, name, fill_color in [(5, 95, 'percentiles 5 - 95 % in given year', 'rgba(128,128,128,0.2)'),
+                                               (25, 75, 'percentiles 25 - 75 % in given year',
+                                                'rgba(128,128,128,0.35)')]:
+            fig.add_trace(go.Scatterpolar(r=df_closed[lower], theta=theta, mode='lines', line_width=0,
+                                          name=f'percentile {lower} % in given year', showlegend=False,
+                                          hoverinfo='skip'))
+            fig.add_trace(go.Scatterpolar(r=df_closed[upper], theta=theta, mode='lines', line_width=0, name=name,
+                                          fill='tonext', fillcolor=fill_color, hoverinfo='skip'))
+        fig.add_trace(go.Scatterpolar(r=df_closed[50], theta=theta, mode='lines', name='median in given year',
+                                      line=dict(color='grey', dash='dot'), hovertemplate='%{r:.2f}°C'))
+
     # reading and splitting the traces into two lists: One for the traces to be moved and one for the rest
     traces = fig.data
     traces_to_send_to_back = [trace for trace in traces if 'values' in trace.name]
@@ -296,12 +669,8 @@ def create_line_figure(df_input, min_value, max_value):
                   color='Type', color_discrete_map={'global mean values': 'green'}, line_shape='spline',
                   labels={'Anomaly': 'Anomaly in °C'})
 
-    # change trace for reference comparison
-    for trace in fig.data:
-        if trace.name == 'reference values':
-            trace.line = dict(dash='dash', color='black')
-        else:
-            trace.opacity = 0.5
+    # change traces for reference comparison (one per reference)
+    style_reference_traces(fig)
 
     fig.update_traces(mode="markers+lines", hovertemplate=None)
     fig.update_layout(hovermode="x unified")
@@ -322,20 +691,19 @@ def create_line_figure(df_input, min_value, max_value):
     return fig
 
 
-def group_df(df_input, columns, grouping_criteria, location):
+def group_df(df_input, columns, grouping_criteria, df_reference=None):
     """
     Groups given dataframe according to grouping criteria.
-    Adds data of the country if given
+    Adds data of the reference countries if given
 
     :param df_input: given dataframe
     :param columns: Required columns of the data frame
     :param grouping_criteria: Column by which the dataframe is grouped
-    :param location: location (city, country) in comma separated string format
+    :param df_reference: co2 data of the reference countries (see reference_co2_df), if given
     :return: grouped dataframe
     """
-    # only required columns (append columns list by grouping column)
-    columns.add(grouping_criteria)
-    columns = list(columns)
+    # only required columns (extended by grouping column, without changing the given columns)
+    columns = list(set(columns) | {grouping_criteria})
     df = df_input[columns]
     df = df.dropna(subset=grouping_criteria)
 
@@ -344,70 +712,155 @@ def group_df(df_input, columns, grouping_criteria, location):
     df = df.reset_index()
     df = df.sort_values(['year', 'consumption_co2', 'consumption_co2_per_capita'], ascending=[True, False, False])
 
-    if location != '':
-        location = location.split(', ')[1]
-        df_location = df_input[df_input['country'] == location][['year', 'population', 'consumption_co2',
-                                                                 'consumption_co2_per_capita', grouping_criteria]]
-        df_location[grouping_criteria] = location
+    if df_reference is not None:
+        df_location = df_reference[['year', 'population', 'consumption_co2', 'consumption_co2_per_capita']]
+        df_location[grouping_criteria] = df_reference['country']
         df = pd.concat([df, df_location])
 
     return df
 
 
-def filter_df(df_input, columns, filter_column, filter_criteria, location):
+def filter_df(df_input, indexes, columns, filter_column, filter_criteria, df_reference=None):
     """
     Filters dataframe according to filter criteria.
+    The rows are gathered via the secondary indexes of the (by year and consumption pre-sorted) dataframe.
 
-    :param df_input: given dataframe
+    :param df_input: given dataframe, sorted by year and consumption
+    :param indexes: secondary indexes of the given dataframe (see co2_data_build_indexes)
     :param columns: Required columns of the data frame
     :param filter_column: Column on which the filter is applied
     :param filter_criteria: Filter criteria
-    :param location: location (city, country) in comma separated string format
+    :param df_reference: co2 data of the reference countries (see reference_co2_df), if given
     :return: filtered dataframe
     """
     columns = list(columns)
 
-    # only required columns
-    if isinstance(filter_criteria, list):
-        df = df_input[df_input[filter_column].isin(filter_criteria)][columns]
-    else:
-        df = df_input[df_input[filter_column] == filter_criteria][columns]
+    column_positions = indexes['positions'][filter_column]
+    column_countries = indexes['countries'][filter_column]
 
-    df = df.sort_values(['year', 'consumption_co2', 'consumption_co2_per_capita'], ascending=[True, False, False])
+    # union of the row positions (and countries) of all filter values
+    filter_values = filter_criteria if isinstance(filter_criteria, list) else [filter_criteria]
+    positions = [column_positions[value] for value in filter_values if value in column_positions]
+    positions = np.sort(np.concatenate(positions)) if positions else np.array([], dtype=int)
+    countries = set().union(*[column_countries[value] for value in filter_values if value in column_countries])
 
-    if location != '':
-        location = location.split(', ')[1]
-        location_present = df['country'].str.contains(location).any()
-        if not location_present:
-            df_location = df_input[df_input['country'] == location][columns]
-            df = pd.concat([df, df_location])
+    # only required columns (sorting order is kept by ascending positions)
+    df = df_input.iloc[positions][columns]
+
+    # reference countries not yet included
+    if df_reference is not None:
+        df_location = df_reference[~df_reference['country'].isin(countries)]
+        if not df_location.empty:
+            df = pd.concat([df, df_location[columns]])
 
     return df
 
 
-def xy_filter_df(df_input, merge_column, x_year, y_year):
+def xy_filter_df(matrices, merge_column, entities, x_year, y_year, df_reference=None):
     """
-    Splits given dataframe into two dataframes with filtered years and merges back together for having
+    Selects two years from the entity x year matrices for having
     two separated columns according to 'consumption_co2_per_capita'.
-
-    :param df_input: given dataframe
-    :param merge_column: column on which dataframes are merged back together
-    :param x_year: year (integer) for filtering first dataframe.
-    :param y_year: year (integer) for filtering second dataframe.
+    Adds data of the reference countries if given.
+
+    :param matrices: entity x year matrices (see co2_data_build_year_matrices)
+    :param merge_column: entity column (country or grouping column) the comparison is based on
+    :param entities: entities (countries or groups) to be compared
+    :param x_year: year (integer) for first column.
+    :param y_year: year (integer) for second column.
+    :param df_reference: co2 data of the reference countries (see reference_co2_df), if given
     :return: dataframe with two columns 'consumption_co2_per_capita' for x and y
     """
-    df_x = df_input[df_input['year'] == x_year] \
-        .rename(columns={'consumption_co2_per_capita': 'consumption_co2_per_capita_x_year'}) \
-        .drop('year', axis=1)
+    def select_years(entity_matrices, names):
+        population = entity_matrices['population'].reindex(index=names, columns=[x_year, y_year])
+
+        # only entities with data in both years, ordered by consumption in first year
+        population = population.dropna()
+        consumption = entity_matrices['consumption_co2'].reindex(index=population.index, columns=[x_year])[x_year]
+        names = consumption.sort_values(ascending=False, kind='stable').index
+
+        consumption_per_capita = entity_matrices['consumption_co2_per_capita'].reindex(index=names,
+                                                                                       columns=[x_year, y_year])
+
+        df_selection = pd.DataFrame({
+            merge_column: names,
+            'consumption_co2_per_capita_x_year': consumption_per_capita[x_year].values,
+            'consumption_co2_per_capita_y_year': consumption_per_capita[y_year].values,
+            'mean_population': population.loc[names].mean(axis=1).values
+        })
+
+        return df_selection
+
+    entities = list(entities)
+    df = select_years(matrices[merge_column], entities)
+
+    # reference countries not yet included and with data in both years (in order of the references)
+    if df_reference is not None:
+        df_location = df_reference[~df_reference['country'].isin(entities)]
+        if not df_location.empty:
+            countries = df_location['country'].unique()
+            df_years = df_location.set_index(['country', 'year'])
+            population = df_years['population'].unstack('year').reindex(index=countries, columns=[x_year, y_year])
+            population = population.dropna()
+            consumption_per_capita = df_years['consumption_co2_per_capita'].unstack('year').reindex(
+                index=population.index, columns=[x_year, y_year])
+
+            df_location = pd.DataFrame({
+                merge_column: population.index,
+                'consumption_co2_per_capita_x_year': consumption_per_capita.iloc[:, 0].values,
+                'consumption_co2_per_capita_y_year': consumption_per_capita.iloc[:, 1].values,
+                'mean_population': population.mean(axis=1).values
+            })
+            df = pd.concat([df, df_location], ignore_index=True)
 
-    df_y = df_input[df_input['year'] == y_year] \
-        .rename(columns={'consumption_co2_per_capita': 'consumption_co2_per_capita_y_year'}) \
-        .drop('year', axis=1)
+    return df
 
-    df = pd.merge(df_x, df_y, on=[merge_column])
-    df['mean_population'] = (df['population_x'] + df['population_y']) / 2
 
-    return df
+def create_treemap_figure(hierarchy, min_value, max_value):
+    """
+    Creates treemap figure based on a precomputed hierarchy, minimum and maximum values for color range
+
+    :param hierarchy: precomputed hierarchy (see co2_data_build_treemap_hierarchies)
+    :param min_value: minimum value for color range
+    :param max_value: maximum value for color range
+    :return: treemap figure
+    """
+    fig = go.Figure(go.Treemap(
+        ids=hierarchy['ids'],
+        labels=hierarchy['labels'],
+        parents=hierarchy['parents'],
+        values=hierarchy['values'],
+        branchvalues='total',
+        marker=dict(colors=hierarchy['colors'], colorscale='Reds', cmin=min_value, cmax=max_value,
+                    showscale=False),
+        hovertemplate='<b>%{label}</b><br><br>Temperature change in °C: %{value}'
+    ))
+
+    fig.update_layout(margin=dict(t=60))
+
+    return fig
+
+
+def rank_top_df(impact_view, number, countries=None):
+    """
+    Selects the entries with the highest impact from the (ascending) pre-sorted impact view.
+    Adds the reference countries at the front (in ascending order) if given and not yet included.
+
+    :param impact_view: impact view (see co2_data_build_impact_view)
+    :param number: number of entries
+    :param countries: reference countries, if given
+    :return: dataframe with the highest entries in ascending order
+    """
+    df = impact_view['df']
+
+    first_position = max(len(df) - number, 0)
+    positions = list(range(first_position, len(df)))
+
+    # reference countries not yet included
+    country_positions = {impact_view['positions'].get(country) for country in countries or []}
+    positions = sorted(position for position in country_positions
+                       if position is not None and position < first_position) + positions
+
+    return df.iloc[positions]
 
 
 def create_co2_consumption_fig(df, color, left_year, right_year):
@@ -476,7 +929,11 @@ def create_co2_comparison_fig(df, color, x_year, y_year):
     :param y_year: Year to be added to y-axis label
     :return: scatter figure
     """
-    max_value = df[['consumption_co2_per_capita_x_year', 'consumption_co2_per_capita_y_year']].values.max()
+    max_value = df[['consumption_co2_per_capita_x_year', 'consumption_co2_per_capita_y_year']].max().max()
+
+    # no consumption data in the compared years (e.g. years of the full history)
+    if pd.isna(max_value):
+        max_value = 0
 
     fig = px.scatter(df, color=color, hover_name=color, size='mean_population', size_max=42,
                      x='consumption_co2_per_capita_x_year',
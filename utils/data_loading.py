@@ -1,8 +1,13 @@
 from pathlib import Path
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
 import yaml
 import pandas as pd
-import geopandas as gpd
-import netCDF4
 from datetime import timedelta, date
 
 
@@ -24,10 +29,35 @@ def read_config_file():
         raise FileNotFoundError
 
 
-def update_config_file(data):
-    file = Path('./config/config.yaml')
-    with open(file, 'w') as config_file:
-        yaml.dump(data, config_file, default_flow_style=False)
+def read_state_file(filepath, defaults):
+    """
+    reads the state of the app which is changed at runtime (i.e. show_preliminary_info)
+
+    :param filepath: filepath to state file
+    :param defaults: state as long as it was not changed (from config file)
+    :return: state data
+    """
+    state_data = dict(defaults)
+    file = Path(filepath)
+    if file.exists():
+        with open(file, 'r') as state_file:
+            state_data.update(json.load(state_file))
+    return state_data
+
+
+def update_state_file(filepath, data):
+    """
+    writes the state of the app which is changed at runtime (see read_state_file)
+
+    :param filepath: filepath to state file
+    :param data: state data
+    """
+    file = Path(filepath)
+    # written to a temporary file first, so that concurrent readers never see a partially written state file
+    temporary_file = file.with_name(f'{file.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(temporary_file, 'w') as state_file:
+        json.dump(data, state_file, indent=2)
+    os.replace(temporary_file, file)
 
 
 def read_content_file(filepath):
@@ -46,21 +76,85 @@ def read_content_file(filepath):
         raise FileNotFoundError
 
 
-def read_geo_data(filepath):
+def read_geo_data(filepath, columns=None):
     """
     reads geojson retrieved from https://datahub.io/core/geo-countries
+    (vectorized via pyogrio / Arrow, only the needed attribute columns)
 
     :param filepath: filepath to geojson
+    :param columns: attribute columns to be read (available ones), all if not given
     :return: geojson data of countries
     """
     file = Path(filepath)
     if file.exists():
-        geojson_data = gpd.read_file(file)
+        # heavy GIS stack only imported if geo data is needed
+        import geopandas as gpd
+        import pyogrio
+
+        if columns is not None:
+            columns = [column for column in columns if column in pyogrio.read_info(file)['fields']]
+
+        geojson_data = gpd.read_file(file, engine='pyogrio', use_arrow=True, columns=columns)
         return geojson_data
     else:
         raise FileNotFoundError
 
 
+def write_geo_cache(gdf, filepath, fingerprint):
+    """
+    writes country shapes as GeoParquet-File in Hilbert order of their bounding boxes (spatially close shapes in the
+    same row groups, bounding boxes as covering column), the fingerprint of the source data is kept in the metadata
+
+    :param gdf: country shapes as GeoPandas GeoDataframe
+    :param filepath: filepath to GeoParquet-File
+    :param fingerprint: fingerprint of the source data (see create_fingerprint)
+    :return: no return
+    """
+    import pyarrow.parquet as pq
+
+    file = Path(filepath)
+    file.parent.mkdir(parents=True, exist_ok=True)
+
+    gdf = gdf.iloc[gdf.hilbert_distance().argsort(kind='stable').to_numpy()]
+
+    # GeoParquet metadata is created by geopandas, the fingerprint is added afterwards
+    buffer = io.BytesIO()
+    gdf.to_parquet(buffer, index=False, compression='zstd', write_covering_bbox=True)
+    table = pq.read_table(buffer)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'fingerprint': fingerprint.encode()})
+
+    # written to a temporary file first, so that concurrent readers never see a partially written file
+    temporary_file = file.with_name(f'{file.name}.{os.getpid()}.tmp')
+    pq.write_table(table, temporary_file, compression='zstd', row_group_size=64)
+    os.replace(temporary_file, file)
+
+
+def read_geo_cache(filepath, fingerprint, columns=None):
+    """
+    reads country shapes from GeoParquet-File, if it was built from the current source data
+
+    :param filepath: filepath to GeoParquet-File
+    :param fingerprint: fingerprint of the current source data (see create_fingerprint)
+    :param columns: attribute columns to be read (without the bounding boxes), all if not given
+    :return: country shapes as GeoPandas GeoDataframe, None if not yet built or outdated
+    """
+    import geopandas as gpd
+    import pyarrow.parquet as pq
+
+    file = Path(filepath)
+    if not file.exists():
+        return None
+    schema = pq.read_schema(file)
+    if (schema.metadata or {}).get(b'fingerprint') != fingerprint.encode():
+        return None
+
+    geometry_column = json.loads(schema.metadata[b'geo'])['primary_column']
+    columns = [column for column in schema.names if column not in ('bbox', geometry_column)
+               and (columns is None or column in columns)]
+
+    return gpd.read_parquet(file, columns=columns + [geometry_column])
+
+
 def read_nasa_file(nc_filepath, json_filepath):
     """
     reads and if not yet processed filters Gridded Monthly Temperature Anomaly Data NetCDF-File retrieved from
@@ -78,6 +172,9 @@ def read_nasa_file(nc_filepath, json_filepath):
         df = pd.read_json(json_file)
         return df
     elif nc_file.exists():
+        # only needed for the (one-time) processing of the NetCDF-File
+        import netCDF4
+
         def days_to_date(days_since_1800):
             start_date = date(1800, 1, 1)
             target_date = start_date + timedelta(days=days_since_1800)
@@ -206,3 +303,350 @@ def read_country_groupings(filepath):
         return df_economies, df_eu, df_oecd
     else:
         raise FileNotFoundError
+
+
+def create_fingerprint(filepaths, settings):
+    """
+    Creates a fingerprint of the given source files (path, size, modification time) and settings
+    to detect whether data derived from them (i.e. cached or partitioned data) is still up-to-date
+
+    :param filepaths: filepaths of the source files
+    :param settings: settings the derived data depends on (json serializable)
+    :return: fingerprint as hex string
+    """
+    fingerprint = hashlib.sha1()
+
+    for filepath in filepaths:
+        file_stat = Path(filepath).stat()
+        fingerprint.update(f'{filepath}:{file_stat.st_size}:{file_stat.st_mtime_ns};'.encode())
+
+    fingerprint.update(json.dumps(settings, sort_keys=True, default=str).encode())
+
+    return fingerprint.hexdigest()
+
+
+def write_co2_partitions(df, dirpath, partition_years, fingerprint):
+    """
+    writes enriched CO2-Data partitioned by year ranges as Parquet-Files,
+    including a manifest (fingerprint, year range of each partition, available years).
+    The partitions are written into a new subdirectory, which is swapped in by replacing the manifest:
+    concurrent readers see either the previous or the new partitions, never a partially written state.
+
+    :param df: enriched CO2-Data as Pandas Dataframe
+    :param dirpath: path to directory of the partitions
+    :param partition_years: number of years per partition
+    :param fingerprint: fingerprint of the source data (see create_fingerprint)
+    :return: manifest of the partitions
+    """
+    directory = Path(dirpath)
+    directory.mkdir(parents=True, exist_ok=True)
+    previous_manifest = read_co2_partitions_manifest(dirpath)
+
+    version = Path(tempfile.mkdtemp(prefix='partitions-', dir=directory)).name
+    partitions = []
+    for partition_start, df_partition in df.groupby(df['year'] // partition_years * partition_years):
+        filename = f'{version}/co2_{partition_start}-{partition_start + partition_years - 1}.parquet'
+        df_partition.to_parquet(directory / filename, index=False)
+
+        partitions.append({'file': filename,
+                           'year_min': int(df_partition['year'].min()),
+                           'year_max': int(df_partition['year'].max())})
+
+    manifest = {'fingerprint': fingerprint,
+                'partitions': partitions,
+                'years': sorted(int(year) for year in df['year'].unique())}
+
+    # written to a temporary file first, the partitions are swapped in by replacing the manifest
+    temporary_file = directory / f'manifest.json.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary_file, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(temporary_file, directory / 'manifest.json')
+
+    # remove outdated partitions, the previous version is kept for readers of the previous manifest
+    previous_files = {partition['file'] for partition in (previous_manifest or {}).get('partitions', [])}
+    kept_versions = {version} | {Path(file).parent.name for file in previous_files}
+    for file in directory.glob('co2_*.parquet'):
+        if file.name not in previous_files:
+            file.unlink()
+    for subdirectory in directory.glob('partitions-*'):
+        if subdirectory.is_dir() and subdirectory.name not in kept_versions:
+            shutil.rmtree(subdirectory, ignore_errors=True)
+
+    return manifest
+
+
+def read_co2_partitions_manifest(dirpath):
+    """
+    reads manifest of the partitioned CO2-Data
+
+    :param dirpath: path to directory of the partitions
+    :return: manifest of the partitions, None if not yet partitioned
+    """
+    file = Path(dirpath) / 'manifest.json'
+    if file.exists():
+        with open(file, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        return manifest
+    else:
+        return None
+
+
+def read_co2_partitions(dirpath, year_min, year_max, columns=None):
+    """
+    reads partitioned CO2-Data of the given year window.
+    Only the partitions overlapping the window are read, the year filter is pushed down to the Parquet-Reader.
+
+    :param dirpath: path to directory of the partitions
+    :param year_min: first year of the window
+    :param year_max: last year of the window
+    :param columns: columns to read (default: all columns)
+    :return: CO2-Data of the year window as Pandas Dataframe
+    """
+    manifest = read_co2_partitions_manifest(dirpath)
+    if manifest is None:
+        raise FileNotFoundError
+
+    dfs = [pd.read_parquet(Path(dirpath) / partition['file'], columns=columns,
+                           filters=[('year', '>=', year_min), ('year', '<=', year_max)])
+           for partition in manifest['partitions']
+           if partition['year_max'] >= year_min and partition['year_min'] <= year_max]
+
+    if not dfs:
+        return pd.read_parquet(Path(dirpath) / manifest['partitions'][0]['file'], columns=columns).iloc[0:0]
+
+    df = pd.concat(dfs, ignore_index=True)
+
+    return df
+
+
+def write_grid_country_mapping(df, filepath, fingerprint):
+    """
+    writes grid cell -> country mapping as Parquet-File, the fingerprint of the source data is kept in the metadata
+
+    :param df: grid cell -> country mapping as Pandas Dataframe
+    :param filepath: filepath to Parquet-File
+    :param fingerprint: fingerprint of the source data (see create_fingerprint)
+    :return: no return
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    file = Path(filepath)
+    file.parent.mkdir(parents=True, exist_ok=True)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'fingerprint': fingerprint.encode()})
+
+    # written to a temporary file first, so that concurrent readers never see a partially written mapping
+    temporary_file = file.with_name(f'{file.name}.{os.getpid()}.tmp')
+    pq.write_table(table, temporary_file)
+    os.replace(temporary_file, file)
+
+
+def read_grid_country_mapping(filepath, fingerprint):
+    """
+    reads grid cell -> country mapping, if it was built from the current source data
+
+    :param filepath: filepath to Parquet-File
+    :param fingerprint: fingerprint of the current source data (see create_fingerprint)
+    :return: grid cell -> country mapping as Pandas Dataframe, None if not yet built or outdated
+    """
+    import pyarrow.parquet as pq
+
+    file = Path(filepath)
+    if not file.exists() or (pq.read_schema(file).metadata or {}).get(b'fingerprint') != fingerprint.encode():
+        return None
+
+    return pd.read_parquet(file)
+
+
+def write_shared_frame(df, filepath):
+    """
+    writes a (Geo-)Dataframe including its index as uncompressed Arrow-IPC-File, which can be memory-mapped
+    read-only by several processes (see read_shared_frame).
+    Numeric columns keep NaN as value (not as null), so they can be attached without copy.
+    Geometries are written as WKB.
+
+    :param df: Pandas Dataframe or GeoPandas GeoDataframe
+    :param filepath: filepath to Arrow-IPC-File
+    :return: no return
+    """
+    import pyarrow as pa
+
+    geometry_column = df.geometry.name if hasattr(df, 'geometry') else None
+
+    names, arrays = ['__index__'], [pa.array(df.index.to_numpy(), from_pandas=df.index.dtype.kind not in 'biuf')]
+    for column in df.columns:
+        if column == geometry_column:
+            array = pa.array(df[column].to_wkb(), type=pa.binary())
+        elif df[column].dtype.kind in 'biuf':
+            array = pa.array(df[column].to_numpy(), from_pandas=False)
+        else:
+            array = pa.array(df[column], from_pandas=True)
+        names.append(str(column))
+        arrays.append(array)
+
+    # column labels which are not strings (i.e. years of the entity x year matrices) are restored on read
+    metadata = {'index_name': json.dumps(df.index.name),
+                'columns': json.dumps([column for column in df.columns], default=lambda value: value.item()),
+                'columns_name': json.dumps(df.columns.name),
+                'geometry': json.dumps(geometry_column),
+                'crs': json.dumps(df.crs.to_string() if geometry_column and df.crs else None)}
+    table = pa.Table.from_arrays(arrays, names=names, metadata=metadata)
+
+    file = Path(filepath)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    # replaced atomically, files mapped by running processes are not changed
+    temporary_file = file.with_name(f'{file.name}.{os.getpid()}.tmp')
+    with pa.OSFile(str(temporary_file), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temporary_file, file)
+
+
+def read_shared_frame(filepath):
+    """
+    attaches a (Geo-)Dataframe written by write_shared_frame via read-only memory mapping.
+    Numeric and string columns use the mapped buffers without copy (shared between processes),
+    only geometries are decoded.
+
+    :param filepath: filepath to Arrow-IPC-File
+    :return: Pandas Dataframe or GeoPandas GeoDataframe (read-only)
+    """
+    file = Path(filepath)
+    if file.exists():
+        import numpy as np
+        import pyarrow as pa
+
+        table = pa.ipc.open_file(pa.memory_map(str(file), 'r')).read_all()
+        metadata = {key.decode(): json.loads(value) for key, value in table.schema.metadata.items()}
+
+        columns = {}
+        for name in table.column_names:
+            chunks = table.column(name).chunks
+            array = chunks[0] if len(chunks) == 1 else pa.concat_arrays(chunks)
+            if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+                columns[name] = pd.array(array, dtype=pd.StringDtype('pyarrow', na_value=np.nan))
+            elif pa.types.is_binary(array.type):
+                columns[name] = array.to_numpy(zero_copy_only=False)
+            else:
+                try:
+                    columns[name] = array.to_numpy(zero_copy_only=True)
+                except pa.ArrowInvalid:
+                    # i.e. columns with nulls or booleans
+                    columns[name] = array.to_pandas()
+
+        index = pd.Index(columns.pop('__index__'), name=metadata['index_name'], copy=False)
+        geometry_column = metadata['geometry']
+        if geometry_column is None:
+            df = pd.DataFrame(columns, index=index, copy=False)
+            if not all(isinstance(column, str) for column in metadata.get('columns', [])):
+                df.columns = pd.Index(metadata['columns'], name=metadata['columns_name'])
+            return df
+
+        # heavy GIS stack only imported if geo data is needed
+        import geopandas as gpd
+
+        geometry = gpd.GeoSeries.from_wkb(columns.pop(geometry_column), index=index, crs=metadata['crs'])
+        df = pd.DataFrame(columns, index=index, copy=False)
+        return gpd.GeoDataFrame(df, geometry=geometry.rename(geometry_column))
+    else:
+        raise FileNotFoundError
+
+
+def write_shared_value(value, directory, name, min_array_size=4096):
+    """
+    writes a dataset (nested dictionaries and lists of dataframes, numpy arrays, sets and scalars) as
+    memory-mappable files: dataframes as Arrow-IPC-Files (see write_shared_frame), numpy arrays as .npy files.
+    Small arrays, sets and scalars are kept in the returned description (JSON serializable).
+
+    :param value: dataset
+    :param directory: path to directory of the files
+    :param name: name of the dataset (prefix of the filenames)
+    :param min_array_size: minimum number of elements of an array written as file
+    :return: description of the dataset (see read_shared_value)
+    """
+    import numpy as np
+
+    files = []
+
+    def describe(item):
+        if isinstance(item, pd.DataFrame):
+            filename = f'{name}-{len(files)}.arrow'
+            write_shared_frame(item, Path(directory) / filename)
+            files.append(filename)
+            return {'frame': filename}
+        elif isinstance(item, np.ndarray):
+            if item.size < min_array_size:
+                return {'array': item.tolist(), 'dtype': item.dtype.str, 'shape': list(item.shape)}
+            filename = f'{name}-{len(files)}.npy'
+            # replaced atomically, files mapped by running processes are not changed
+            temporary_file = Path(directory) / f'{filename}.{os.getpid()}.tmp'
+            with open(temporary_file, 'wb') as array_file:
+                np.save(array_file, np.ascontiguousarray(item), allow_pickle=False)
+            os.replace(temporary_file, Path(directory) / filename)
+            files.append(filename)
+            return {'file': filename}
+        elif isinstance(item, dict):
+            return {'dict': [[key, describe(entry)] for key, entry in item.items()]}
+        elif isinstance(item, (list, tuple)):
+            return {'list': [describe(entry) for entry in item]}
+        elif isinstance(item, (set, frozenset)):
+            return {'set': sorted(item)}
+        elif isinstance(item, np.generic):
+            return {'value': item.item()}
+        elif item is None or isinstance(item, (str, int, float, bool)):
+            return {'value': item}
+        else:
+            raise TypeError(f'{type(item).__name__} of dataset {name} can not be shared')
+
+    Path(directory).mkdir(parents=True, exist_ok=True)
+
+    return describe(value)
+
+
+def shared_value_files(description):
+    """
+    lists the files of a dataset written by write_shared_value
+
+    :param description: description of the dataset (see write_shared_value)
+    :return: filenames
+    """
+    if 'frame' in description:
+        return [description['frame']]
+    elif 'file' in description:
+        return [description['file']]
+    elif 'dict' in description:
+        return [filename for key, entry in description['dict'] for filename in shared_value_files(entry)]
+    elif 'list' in description:
+        return [filename for entry in description['list'] for filename in shared_value_files(entry)]
+    else:
+        return []
+
+
+def read_shared_value(description, directory):
+    """
+    attaches a dataset written by write_shared_value: dataframes and large numpy arrays are memory-mapped read-only
+    (shared between processes)
+
+    :param description: description of the dataset (see write_shared_value)
+    :param directory: path to directory of the files
+    :return: dataset
+    """
+    import numpy as np
+
+    if 'frame' in description:
+        return read_shared_frame(Path(directory) / description['frame'])
+    elif 'file' in description:
+        # plain array on the mapped buffer
+        return np.load(Path(directory) / description['file'], mmap_mode='r', allow_pickle=False).view(np.ndarray)
+    elif 'array' in description:
+        return np.array(description['array'], dtype=np.dtype(description['dtype'])).reshape(description['shape'])
+    elif 'dict' in description:
+        return {key: read_shared_value(entry, directory) for key, entry in description['dict']}
+    elif 'list' in description:
+        return [read_shared_value(entry, directory) for entry in description['list']]
+    elif 'set' in description:
+        return set(description['set'])
+    else:
+        return description['value']
@@ -1,17 +1,20 @@
+import numpy as np
 import pandas as pd
 
 
-def co2_data_filter(df_input, columns, na_columns):
+def co2_data_filter(df_input, columns, na_columns, year_min, year_max):
     """
-    Filters the data frame to the necessary columns and deletes those rows
+    Filters the data frame to the necessary columns and the given year window and deletes those rows
     that do not contain any information or belong to Antarctica.
 
     :param df_input: original data from Our World in Data
     :param columns: Defined columns to keep
     :param na_columns: Columns where no na-values may exist
+    :param year_min: first year to keep
+    :param year_max: last year to keep
     :return: edited dataframe
     """
-    df = df_input[(df_input['year'] >= 1990) & (df_input['year'] <= 2020)][columns]
+    df = df_input[(df_input['year'] >= year_min) & (df_input['year'] <= year_max)][columns]
 
     df = df.dropna(subset=na_columns)
 
@@ -63,3 +66,481 @@ def co2_data_add_groupings(df_input, df_economies, df_eu, df_oecd):
     df = df.fillna({'EU member': 'no', 'OECD member': 'no'})
 
     return df
+
+
+def co2_data_build_indexes(df_input, index_columns):
+    """
+    Sorts the dataframe by year and consumption (the display order of the co2 consumption figures) and creates
+    secondary indexes for every value of the given columns.
+    Filters can then be answered by gathering the stored row positions instead of scanning the whole dataframe.
+
+    :param df_input: enriched co2 dataframe
+    :param index_columns: columns for which an index is created
+    :return: sorted dataframe,
+                indexes as dictionary ('positions': {column: {value: row positions}},
+                                       'countries': {column: {value: set of countries}})
+    """
+    df = df_input.sort_values(['year', 'consumption_co2', 'consumption_co2_per_capita'], ascending=[True, False, False])
+    df = df.reset_index(drop=True)
+
+    countries = df['country'].to_numpy()
+
+    indexes = {'positions': {}, 'countries': {}}
+    for column in index_columns:
+        # row positions per value in ascending order, i.e. still sorted by year and consumption
+        positions = df.groupby(column, sort=False).indices
+
+        indexes['positions'][column] = positions
+        indexes['countries'][column] = {value: set(countries[rows]) for value, rows in positions.items()}
+
+    return df, indexes
+
+
+def co2_data_build_year_matrices(df_input, grouping_columns):
+    """
+    Pivots population, consumption and consumption per capita into dense entity x year matrices,
+    once for the countries and once for every grouping column.
+    The values of a grouping are summed up per year, the consumption per capita is recalculated from those sums.
+
+    :param df_input: enriched co2 dataframe
+    :param grouping_columns: columns by which the countries can be grouped
+    :return: matrices as dictionary {'country' / grouping column: {value column: entity x year dataframe}}
+    """
+    value_columns = ['population', 'consumption_co2', 'consumption_co2_per_capita']
+
+    df = df_input.groupby(['country', 'year'])[value_columns].first()
+    matrices = {'country': {column: df[column].unstack('year') for column in value_columns}}
+
+    for grouping_column in grouping_columns:
+        df = df_input.dropna(subset=grouping_column)
+        df = df.groupby([grouping_column, 'year'])[['population', 'consumption_co2']].sum()
+        df['consumption_co2_per_capita'] = df['consumption_co2']*1000000 / df['population']
+
+        matrices[grouping_column] = {column: df[column].unstack('year') for column in value_columns}
+
+    return matrices
+
+
+def co2_data_build_impact_view(df_input, columns, df_codebook):
+    """
+    Materializes the latest year of the co2 data for the co2 impact section:
+    only countries with an impact, sorted ascending by column 'temperature_change_from_co2'.
+    Additionally, the extreme values, the labels from the codebook and the position of each country are determined.
+
+    :param df_input: enriched co2 dataframe
+    :param columns: Required columns of the data frame
+    :param df_codebook: co2 data codebook
+    :return: impact view as dictionary (dataframe, year, min and max value, labels, positions of countries)
+    """
+    year = df_input['year'].max()
+
+    df = df_input[df_input['year'] == year][columns]
+    df = df[df['temperature_change_from_co2'] != 0]
+    df = df.sort_values('temperature_change_from_co2', ascending=True, kind='stable')
+    df = df.reset_index(drop=True)
+
+    # label-creation (first sentence of the codebook description)
+    labels = {column: df_codebook.loc[column, 'description'].split('.')[0]
+              for column in ['temperature_change_from_co2', 'co2']}
+
+    impact_view = {
+        'df': df,
+        'year': year,
+        'min_value': df['temperature_change_from_co2'].min(),
+        'max_value': df['temperature_change_from_co2'].max(),
+        'labels': labels,
+        'positions': {country: position for position, country in enumerate(df['country'])}
+    }
+
+    return impact_view
+
+
+def co2_data_build_treemap_hierarchies(df_input, treemap_options):
+    """
+    Precomputes the treemap hierarchy (ids, labels, parents, values and colors) of the co2 impact
+    for every treemap option, so that no aggregation is necessary when the treemap is displayed.
+    Options 'all#<column>' have the values of the column as parents (summed values, value-weighted colors),
+    options '<value>#<column>' only contain the countries with the given value in the column.
+
+    :param df_input: impact dataframe of latest year (see co2_data_build_impact_view)
+    :param treemap_options: options of the treemap dropdown list (headers are skipped)
+    :return: hierarchies as dictionary {option value: {'ids', 'labels', 'parents', 'values', 'colors'}}
+    """
+    def aggregate(df, by):
+        # summed values and colors weighted by values (as aggregated by plotly express)
+        df = df.assign(weighted_color=df['temperature_change_from_co2'] * df['temperature_change_from_co2'])
+        df = df.groupby(by, sort=False)[['temperature_change_from_co2', 'weighted_color']].sum()
+        return df['temperature_change_from_co2'], df['weighted_color'] / df['temperature_change_from_co2']
+
+    hierarchies = {}
+    for option in treemap_options:
+        if option.get('disabled'):
+            continue
+
+        parent_value, parent_column = option['value'].split('#')
+
+        if parent_value == 'all':
+            df = df_input.dropna(subset=parent_column)
+
+            parent_values, parent_colors = aggregate(df, parent_column)
+            country_values, country_colors = aggregate(df, [parent_column, 'country'])
+            country_parents = country_values.index.get_level_values(parent_column)
+            countries = country_values.index.get_level_values('country')
+
+            hierarchies[option['value']] = {
+                'ids': list(parent_values.index) + list(country_parents + '/' + countries),
+                'labels': list(parent_values.index) + list(countries),
+                'parents': [''] * len(parent_values) + list(country_parents),
+                'values': list(parent_values) + list(country_values),
+                'colors': list(parent_colors) + list(country_colors)
+            }
+
+        else:
+            df = df_input[df_input[parent_column] == parent_value]
+
+            country_values, country_colors = aggregate(df, 'country')
+
+            hierarchies[option['value']] = {
+                'ids': list(country_values.index),
+                'labels': list(country_values.index),
+                'parents': [''] * len(country_values),
+                'values': list(country_values),
+                'colors': list(country_colors)
+            }
+
+    return hierarchies
+
+
+def anomaly_data_build_matrix(df_input):
+    """
+    Pivots the temperature anomalies into a dense period x grid cell matrix (cells in row-major order of the grid:
+    latitude, then longitude). Missing values are NaN.
+
+    :param df_input: temperature anomalies (Longitude, Latitude, Anomaly, Period, Year, Month)
+    :return: anomaly matrix as dictionary (periods: dataframe with Period, Year and Month,
+                latitudes and longitudes of the grid, cell size in degrees, matrix: periods x cells)
+    """
+    latitudes = np.unique(df_input['Latitude'].to_numpy())
+    longitudes = np.unique(df_input['Longitude'].to_numpy())
+    cell_size = float(np.diff(latitudes).min()) if len(latitudes) > 1 else 2.0
+
+    period_positions, periods = pd.factorize(df_input['Period'], sort=True)
+    cell_positions = np.searchsorted(latitudes, df_input['Latitude'].to_numpy()) * len(longitudes) + \
+        np.searchsorted(longitudes, df_input['Longitude'].to_numpy())
+
+    matrix = np.full((len(periods), len(latitudes) * len(longitudes)), np.nan)
+    matrix[period_positions, cell_positions] = df_input['Anomaly'].to_numpy(dtype=float)
+
+    # year and month of each period (first row of the period)
+    first_rows = np.unique(period_positions, return_index=True)[1]
+    df_periods = pd.DataFrame({'Period': np.asarray(periods),
+                               'Year': df_input['Year'].to_numpy()[first_rows],
+                               'Month': df_input['Month'].to_numpy()[first_rows]})
+
+    return {'periods': df_periods, 'latitudes': latitudes, 'longitudes': longitudes, 'cell_size': cell_size,
+            'matrix': matrix}
+
+
+def anomaly_data_build_pyramid(anomaly_matrix, factors):
+    """
+    Builds a pyramid of coarser grids from the anomaly matrix: each level aggregates blocks of factor x factor
+    grid cells to one cell (area weighted by the cosine of the latitude, missing values are left out).
+    Grids not divisible by the factor are padded, the cell centers are the mean of the existing cells of a block.
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param factors: aggregation factors of the coarser levels (i.e. [2, 4, 8] for 4°, 8° and 16° of a 2° grid)
+    :return: list of levels (finest first), each as dictionary (cell_size, latitudes and longitudes per cell,
+                matrix: periods x cells)
+    """
+    latitudes, longitudes = anomaly_matrix['latitudes'], anomaly_matrix['longitudes']
+    matrix = anomaly_matrix['matrix'].reshape(-1, len(latitudes), len(longitudes))
+
+    cell_latitudes, cell_longitudes = np.meshgrid(latitudes, longitudes, indexing='ij')
+    levels = [{'cell_size': anomaly_matrix['cell_size'], 'latitudes': cell_latitudes.ravel(),
+               'longitudes': cell_longitudes.ravel(), 'matrix': anomaly_matrix['matrix']}]
+
+    for factor in factors:
+        # padding to a multiple of the factor (missing cells)
+        n_lat, n_lon = -(-len(latitudes) // factor), -(-len(longitudes) // factor)
+        block_latitudes = np.pad(latitudes.astype(float), (0, n_lat * factor - len(latitudes)),
+                                 constant_values=np.nan).reshape(n_lat, factor)
+        block_longitudes = np.pad(longitudes.astype(float), (0, n_lon * factor - len(longitudes)),
+                                  constant_values=np.nan).reshape(n_lon, factor)
+
+        # cell area shrinks with the cosine of the latitude
+        weights = np.nan_to_num(np.cos(np.radians(block_latitudes)))[None, :, :, None, None]
+        level_matrix = np.empty((len(matrix), n_lat, n_lon))
+
+        # aggregated in chunks of periods (limits the temporary copies for long time series)
+        for start in range(0, len(matrix), 120):
+            values = np.pad(matrix[start:start + 120],
+                            ((0, 0), (0, n_lat * factor - len(latitudes)), (0, n_lon * factor - len(longitudes))),
+                            constant_values=np.nan).reshape(-1, n_lat, factor, n_lon, factor)
+            valid = ~np.isnan(values)
+            weighted_sums = (np.where(valid, values, 0) * weights).sum(axis=(2, 4))
+            weight_sums = (valid * weights).sum(axis=(2, 4))
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                level_matrix[start:start + 120] = np.where(weight_sums > 0, weighted_sums / weight_sums, np.nan)
+
+        level_latitudes, level_longitudes = np.meshgrid(np.nanmean(block_latitudes, axis=1),
+                                                        np.nanmean(block_longitudes, axis=1), indexing='ij')
+        levels.append({'cell_size': anomaly_matrix['cell_size'] * factor, 'latitudes': level_latitudes.ravel(),
+                       'longitudes': level_longitudes.ravel(), 'matrix': level_matrix.reshape(len(matrix), -1)})
+
+    return levels
+
+
+def anomaly_data_cell_trends(matrix, df_periods, min_periods):
+    """
+    Linear warming trend of every grid cell in °C per decade, computed for all cells at once as least-squares
+    slope from the sums over the periods (missing values are left out per cell)
+
+    :param matrix: anomalies as periods x cells matrix
+    :param df_periods: periods of the matrix (Year, Month)
+    :param min_periods: minimum number of values of a cell (fewer values: no trend)
+    :return: trends as array (one value per cell)
+    """
+    # time in decades (middle of the month), centered for numerical stability
+    time = (df_periods['Year'].to_numpy() + (df_periods['Month'].to_numpy() - 0.5) / 12) / 10
+    time = time - time.mean()
+
+    valid = ~np.isnan(matrix)
+    values = np.where(valid, matrix, 0)
+
+    count = valid.sum(axis=0)
+    sum_time = time @ valid
+    sum_time_squared = (time ** 2) @ valid
+    sum_values = values.sum(axis=0)
+    sum_time_values = time @ values
+
+    denominator = count * sum_time_squared - sum_time ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        trends = (count * sum_time_values - sum_time * sum_values) / denominator
+
+    return np.where((count >= max(min_periods, 2)) & (denominator > 0), trends, np.nan)
+
+
+def anomaly_data_rolling_means(matrix, window, min_periods):
+    """
+    Rolling means over the given number of periods for every grid cell, computed via cumulative sums
+    (missing values are left out, the first periods without a complete window have no value)
+
+    :param matrix: anomalies as periods x cells matrix
+    :param window: number of periods (i.e. 12 months)
+    :param min_periods: minimum number of values in a window (fewer values: no mean)
+    :return: rolling means as periods x cells matrix
+    """
+    valid = ~np.isnan(matrix)
+    zeros = np.zeros((1, matrix.shape[1]))
+    cumulative_sums = np.concatenate([zeros, np.cumsum(np.where(valid, matrix, 0), axis=0)])
+    cumulative_counts = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+
+    rolling_means = np.full(matrix.shape, np.nan)
+    if len(matrix) >= window:
+        sums = cumulative_sums[window:] - cumulative_sums[:-window]
+        counts = cumulative_counts[window:] - cumulative_counts[:-window]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolling_means[window - 1:] = np.where(counts >= min_periods, sums / counts, np.nan)
+
+    return rolling_means
+
+
+def anomaly_data_climatology(matrix, df_periods):
+    """
+    Mean anomaly of every calendar month and grid cell over all years (missing values are left out)
+
+    :param matrix: anomalies as periods x cells matrix
+    :param df_periods: periods of the matrix (Month)
+    :return: climatology as months (1 - 12) x cells matrix
+    """
+    months = df_periods['Month'].to_numpy()
+    valid = ~np.isnan(matrix)
+    values = np.where(valid, matrix, 0)
+
+    # indicator matrix months x periods: sums of all months in one product
+    indicator = (np.arange(1, 13)[:, None] == months[None, :]).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        climatology = (indicator @ values) / (indicator @ valid)
+
+    return climatology
+
+
+def anomaly_data_build_sketches(anomaly_matrix, bin_width, value_range):
+    """
+    Builds a quantile sketch of the grid cell anomalies of every period in one pass over the periods:
+    a histogram with fixed bins, so sketches of several periods are merged by adding their counts
+    (quantiles are exact up to the bin width, values outside the range are counted in the outer bins)
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param bin_width: width of the bins in °C
+    :param value_range: lower and upper limit of the bins in °C
+    :return: sketches as dictionary (periods: dataframe, edges: bin edges, counts: periods x bins)
+    """
+    edges = np.linspace(value_range[0], value_range[1], int(round((value_range[1] - value_range[0]) / bin_width)) + 1)
+    n_bins = len(edges) - 1
+    counts = np.zeros((len(anomaly_matrix['matrix']), n_bins), dtype=np.int64)
+
+    # streamed in chunks of periods, all histograms of a chunk with one bincount (offset bins per period)
+    for start in range(0, len(counts), 120):
+        values = anomaly_matrix['matrix'][start:start + 120]
+        period_positions, cell_positions = np.nonzero(~np.isnan(values))
+        bins = np.clip(((values[period_positions, cell_positions] - edges[0]) // bin_width).astype(np.int64),
+                       0, n_bins - 1)
+        counts[start:start + len(values)] = np.bincount(period_positions * n_bins + bins,
+                                                        minlength=len(values) * n_bins).reshape(len(values), n_bins)
+
+    return {'periods': anomaly_matrix['periods'], 'edges': edges, 'counts': counts}
+
+
+def anomaly_data_encode_frames(matrix, df_periods, step):
+    """
+    Encodes the anomalies of every period (or year) as frame for an animated playback: values in hundredths of °C
+    as 16 bit integers (missing values: -32768), each frame as difference to the previous one.
+    The differences wrap around like the integers, so adding up the frames restores the values exactly.
+
+    :param matrix: anomalies as periods x cells matrix
+    :param df_periods: periods of the matrix (Period, Year)
+    :param step: month (one frame per period) or year (one frame per year, mean values)
+    :return: frames as dictionary (labels: list of periods / years, range: min and max value in °C,
+                deltas: frames x cells)
+    """
+    if step == 'year':
+        # yearly means (periods are sorted), missing values are left out
+        years = df_periods['Year'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, np.diff(years) != 0])
+        valid = ~np.isnan(matrix)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.add.reduceat(np.where(valid, matrix, 0), starts, axis=0) / \
+                np.add.reduceat(valid, starts, axis=0)
+        labels = [str(year) for year in years[starts]]
+    else:
+        values = matrix
+        labels = df_periods['Period'].astype(str).tolist()
+
+    quantized = np.where(np.isnan(values), -32768, np.clip(np.round(np.nan_to_num(values) * 100), -32767, 32767))
+    quantized = quantized.astype(np.int32)
+    deltas = np.diff(quantized, axis=0, prepend=np.zeros((1, quantized.shape[1]), dtype=np.int32)).astype(np.int16)
+
+    return {'labels': labels, 'range': [float(np.nanmin(values)), float(np.nanmax(values))], 'deltas': deltas}
+
+
+def anomaly_data_map_countries(latitudes, longitudes, cell_size, gdf_countries):
+    """
+    Spatial join of the grid cells with the country shapes: every grid cell is assigned to the countries it overlaps,
+    with the share of the cell covered by the country (cells on borders belong to several countries).
+    Candidates are found via the spatial index (STRtree) of the country shapes, cells completely within a country
+    are assigned directly, only the cells on borders are intersected with the shapes.
+
+    :param latitudes: latitudes of the grid (cell centers)
+    :param longitudes: longitudes of the grid (cell centers)
+    :param cell_size: cell size in degrees
+    :param gdf_countries: country shapes (ADMIN, optionally ISO_A3, geometry)
+    :return: mapping as dataframe (Latitude, Longitude, ADMIN, ISO_A3, fraction), sorted by country and cell
+    """
+    # heavy GIS stack only imported if the mapping has to be built
+    import shapely
+
+    latitude, longitude = np.meshgrid(latitudes, longitudes, indexing='ij')
+    latitude, longitude = latitude.ravel(), longitude.ravel()
+    half_size = cell_size / 2
+    cells = shapely.box(longitude - half_size, latitude - half_size, longitude + half_size, latitude + half_size)
+    geometries = np.asarray(gdf_countries.geometry.values)
+
+    # candidate pairs (cell, country) via the spatial index, cells within a country are covered completely
+    cell_positions, country_positions = gdf_countries.sindex.query(cells, predicate='intersects')
+    within_cell_positions, within_country_positions = gdf_countries.sindex.query(cells, predicate='within')
+    within = np.isin(cell_positions * len(gdf_countries) + country_positions,
+                     within_cell_positions * len(gdf_countries) + within_country_positions)
+
+    # cells on borders: share of the cell area covered by the country (intersection of country and cell)
+    fraction = np.ones(len(cell_positions))
+    border = ~within
+    clipped = shapely.intersection(geometries[country_positions[border]], cells[cell_positions[border]])
+    fraction[border] = np.minimum(shapely.area(clipped) / cell_size ** 2, 1.0)
+
+    df = pd.DataFrame({'Latitude': latitude[cell_positions],
+                       'Longitude': longitude[cell_positions],
+                       'ADMIN': gdf_countries['ADMIN'].to_numpy()[country_positions],
+                       'ISO_A3': (gdf_countries['ISO_A3'].to_numpy()[country_positions]
+                                  if 'ISO_A3' in gdf_countries.columns else None),
+                       'fraction': fraction})
+
+    # cells only touching a country
+    df = df[df['fraction'] > 0]
+    df = df.sort_values(['ADMIN', 'Latitude', 'Longitude'], kind='stable').reset_index(drop=True)
+
+    return df
+
+
+def anomaly_data_build_country_means(anomaly_matrix, df_mapping):
+    """
+    Computes the area weighted mean anomaly of every country and period from the grid cells of the country
+    (weight: share of the cell covered by the country x cell area). Vectorized over all periods:
+    the cells of all countries are gathered at once and summed up per country, missing values are left out.
+
+    :param anomaly_matrix: anomaly matrix (see anomaly_data_build_matrix)
+    :param df_mapping: grid cell -> country mapping (see anomaly_data_map_countries), sorted by country
+    :return: country means as dictionary (countries: dataframe with ADMIN and ISO_A3, periods: dataframe,
+                matrix: periods x countries)
+    """
+    longitudes = anomaly_matrix['longitudes']
+    cell_positions = np.searchsorted(anomaly_matrix['latitudes'], df_mapping['Latitude'].to_numpy()) * \
+        len(longitudes) + np.searchsorted(longitudes, df_mapping['Longitude'].to_numpy())
+
+    # cell area shrinks with the cosine of the latitude
+    weights = df_mapping['fraction'].to_numpy() * np.cos(np.radians(df_mapping['Latitude'].to_numpy()))
+
+    country_positions, countries = pd.factorize(df_mapping['ADMIN'])
+    starts = np.flatnonzero(np.r_[True, np.diff(country_positions) != 0])
+
+    values = anomaly_matrix['matrix'][:, cell_positions]
+    valid = ~np.isnan(values)
+    weighted_sums = np.add.reduceat(np.where(valid, values, 0) * weights, starts, axis=1)
+    weight_sums = np.add.reduceat(valid * weights, starts, axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        matrix = np.where(weight_sums > 0, weighted_sums / weight_sums, np.nan)
+
+    df_countries = df_mapping.iloc[starts][['ADMIN', 'ISO_A3']].reset_index(drop=True)
+
+    return {'countries': df_countries, 'periods': anomaly_matrix['periods'], 'matrix': matrix}
+
+
+def anomaly_data_country_keys(df_countries, df_co2, countryname_changes):
+    """
+    Assigns the country names and iso codes of the co2 data to the countries of the geo data, so that
+    country anomalies can be displayed (iso codes) and joined with the co2 data (country names).
+    The iso codes are taken from the co2 data, the iso codes of the geo data (if valid, not i.e. '-99') are
+    only used for countries missing in the co2 data.
+
+    :param df_countries: countries of the geo data (ADMIN, ISO_A3)
+    :param df_co2: co2 data (country, iso_code)
+    :param countryname_changes: country names of the co2 data which differ in the geo data
+    :return: dataframe with ADMIN, country and iso_code
+    """
+    geo_to_co2_names = {geo_name: co2_name for co2_name, geo_name in countryname_changes.items()}
+    co2_iso_codes = dict(zip(df_co2['country'], df_co2['iso_code']))
+
+    countries = [geo_to_co2_names.get(admin, admin) for admin in df_countries['ADMIN']]
+    iso_codes = [co2_iso_codes[country] if isinstance(co2_iso_codes.get(country), str)
+                 else iso_code if isinstance(iso_code, str) and len(iso_code) == 3 and iso_code.isalpha()
+                 else None
+                 for iso_code, country in zip(df_countries['ISO_A3'], countries)]
+
+    return pd.DataFrame({'ADMIN': df_countries['ADMIN'].to_numpy(), 'country': countries, 'iso_code': iso_codes})
+
+
+def anomaly_data_country_yearly(country_means, df_country_keys):
+    """
+    Yearly mean anomalies of the countries in the format of the co2 data (to be joined on country and year)
+
+    :param country_means: country means (see anomaly_data_build_country_means)
+    :param df_country_keys: country names of the co2 data (see anomaly_data_country_keys)
+    :return: dataframe with country, year and anomaly
+    """
+    df = pd.DataFrame(country_means['matrix'], columns=df_country_keys['country'].to_numpy())
+    df = df.groupby(country_means['periods']['Year'].to_numpy()).mean()
+    df = df.rename_axis(index='year', columns='country').stack().rename('anomaly').reset_index()
+
+    return df
@@ -0,0 +1,528 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.data_loading import read_nasa_file, read_geo_data, read_co2_data, read_co2_data_codebook, \
+    read_cc_mapping, read_country_groupings, create_fingerprint, write_co2_partitions, \
+    read_co2_partitions_manifest, read_co2_partitions, write_shared_value, read_shared_value, shared_value_files, \
+    write_grid_country_mapping, read_grid_country_mapping, write_geo_cache, read_geo_cache
+from utils.data_processing import co2_data_filter, co2_data_add_continents, co2_data_add_groupings, \
+    co2_data_build_indexes, co2_data_build_year_matrices, co2_data_build_impact_view, \
+    co2_data_build_treemap_hierarchies, anomaly_data_build_matrix, anomaly_data_map_countries, \
+    anomaly_data_build_pyramid, anomaly_data_build_sketches, anomaly_data_cell_trends, anomaly_data_rolling_means, \
+    anomaly_data_climatology, anomaly_data_encode_frames, anomaly_data_build_country_means, anomaly_data_country_keys, \
+    anomaly_data_country_yearly
+from utils.profiling import profile_stage
+
+
+class FrozenDict(dict):
+    """
+    Read-only dictionary (i.e. configuration and datasets shared by all threads), every mutation raises a TypeError
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f'{type(self).__name__} is read-only')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+class FrozenList(list):
+    """
+    Read-only list (still a list for i.e. pandas column selections), every mutation raises a TypeError
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f'{type(self).__name__} is read-only')
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = extend = insert = pop = remove = clear = sort = \
+        reverse = _read_only
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+
+def protect(value):
+    """
+    Returns a read-only version of the given data without copying the underlying arrays:
+    dictionaries, lists and sets are frozen, numpy arrays and the numpy-backed columns of dataframes are
+    write-protected (other columns, i.e. Arrow-backed strings, are immutable anyway)
+
+    :param value: data (i.e. configuration, dataframe or dictionary of dataframes)
+    :return: read-only data
+    """
+    if isinstance(value, pd.DataFrame):
+        columns = {}
+        for position, column in enumerate(value.columns):
+            series = value.iloc[:, position]
+            columns[position] = protect(series.to_numpy()) if isinstance(series.dtype, np.dtype) else series.array
+
+        # frame (of the same type, i.e. GeoDataFrame) on the protected arrays, column labels are restored afterwards
+        df = type(value)(columns, index=value.index, copy=False)
+        df.columns = value.columns
+        if hasattr(value, 'geometry'):
+            df.set_geometry(value.geometry.name, inplace=True)
+        return df
+    elif isinstance(value, np.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    elif isinstance(value, dict):
+        return FrozenDict({key: protect(item) for key, item in value.items()})
+    elif isinstance(value, list):
+        return FrozenList(protect(item) for item in value)
+    elif isinstance(value, set):
+        return frozenset(value)
+    else:
+        return value
+
+
+class LazyDataset:
+    """
+    Handle of a dataset that is only loaded (materialized) on first use.
+    The handles of the dependencies are materialized before and passed to the loader.
+    Loading is thread-safe and happens only once, the dataset is read-only (see protect).
+    """
+
+    def __init__(self, name, loader, dependencies=()):
+        """
+        :param name: name of the dataset
+        :param loader: function loading the dataset, called with the values of the dependencies
+        :param dependencies: handles of the datasets the loader depends on
+        """
+        self.name = name
+        self.loader = loader
+        self.dependencies = list(dependencies)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._value = None
+        # load time of the loader in seconds (without dependencies)
+        self.load_time = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        """
+        Returns the dataset, loads it on first use
+
+        :return: dataset
+        """
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    values = [dependency.get() for dependency in self.dependencies]
+                    start = time.perf_counter()
+                    with profile_stage(f'load {self.name}') as stage:
+                        self._value = protect(self.loader(*values))
+                        stage['output'] = self._value
+                    self.load_time = time.perf_counter() - start
+                    self._loaded = True
+
+        return self._value
+
+    def set(self, value):
+        """
+        Sets the dataset without loading it (i.e. for externally loaded data)
+
+        :param value: dataset
+        :return: no return
+        """
+        with self._lock:
+            self._value = protect(value)
+            self._loaded = True
+
+    def release(self):
+        """
+        Releases the dataset, it is loaded again on next use
+
+        :return: no return
+        """
+        with self._lock:
+            self._value = None
+            self._loaded = False
+
+
+def load_datasets(handles, max_workers=None):
+    """
+    Loads the given datasets including their dependencies concurrently in a thread pool.
+    Each dataset is submitted as soon as its dependencies are loaded, so independent sources are loaded in parallel
+    and only joined where a loader needs them.
+
+    :param handles: handles of the datasets to load
+    :param max_workers: maximum number of threads (ThreadPoolExecutor default if None)
+    :return: dictionary of load times in seconds per dataset (only datasets loaded by this call)
+    """
+    # dependency graph of all datasets that are not loaded yet
+    pending = {}
+    stack = list(handles)
+    while stack:
+        handle = stack.pop()
+        if handle.name not in pending and not handle.loaded:
+            pending[handle.name] = handle
+            stack.extend(handle.dependencies)
+
+    graph = dict(pending)
+    load_times = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while pending or running:
+            # submit all datasets whose dependencies are neither pending nor running
+            for name, handle in list(pending.items()):
+                if all(dependency.name not in pending and dependency.name not in running
+                       for dependency in handle.dependencies):
+                    running[name] = executor.submit(handle.get)
+                    del pending[name]
+
+            done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for name in [name for name, future in running.items() if future in done]:
+                # re-raises errors of the loader
+                running.pop(name).result()
+                load_times[name] = graph[name].load_time
+
+    return load_times
+
+
+def publish_datasets(datasets, names, dirpath):
+    """
+    Loads the given datasets once (i.e. in the parent process of the workers) and publishes them as memory-mappable
+    files, which the worker processes attach read-only (see attach_datasets): dataframes as Arrow-IPC-Files,
+    the arrays of derived datasets (i.e. matrices, pyramid levels, statistics) as .npy files.
+    The co2 partitions are brought up-to-date as well, so the workers only read them.
+
+    :param datasets: dictionary of dataset handles (see create_datasets)
+    :param names: names of the datasets to publish
+    :param dirpath: path to directory of the published datasets
+    :return: manifest of the published datasets
+    """
+    load_datasets([datasets[name] for name in names] + [datasets['co2_partitions']])
+
+    directory = Path(dirpath)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    manifest = {'datasets': {}}
+    for name in names:
+        manifest['datasets'][name] = write_shared_value(datasets[name].get(), directory, name)
+
+    # the parent process does not need its own copies any longer (including the dependencies)
+    for dataset in datasets.values():
+        dataset.release()
+
+    # manifest is written last (and atomically), workers only attach complete datasets
+    with open(directory / 'manifest.json.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(directory / 'manifest.json.tmp', directory / 'manifest.json')
+
+    # files of previous publications which are no longer part of the manifest are removed
+    # (workers which already mapped them keep their mappings)
+    published_files = {filename for description in manifest['datasets'].values()
+                       for filename in shared_value_files(description)}
+    for file in directory.iterdir():
+        if file.is_file() and file.name != 'manifest.json' and file.name not in published_files:
+            file.unlink()
+
+    return manifest
+
+
+def attach_datasets(datasets, dirpath):
+    """
+    Replaces the loaders of the published datasets by read-only memory mappings of the published files.
+    The mapped buffers are shared by all worker processes instead of being loaded or derived by each of them.
+
+    :param datasets: dictionary of dataset handles (see create_datasets)
+    :param dirpath: path to directory of the published datasets
+    :return: names of the attached datasets
+    """
+    with open(Path(dirpath) / 'manifest.json', 'r') as manifest_file:
+        manifest = json.load(manifest_file)
+
+    for name, description in manifest['datasets'].items():
+        datasets[name].release()
+        datasets[name].loader = lambda description=description: read_shared_value(description, dirpath)
+        datasets[name].dependencies = []
+
+    return list(manifest['datasets'])
+
+
+def read_co2_data_window(config, year_min, year_max):
+    """
+    Reads the partitioned co2 data of the given year window and builds its indexes and entity x year matrices
+
+    :param config: configuration data
+    :param year_min: first year of the window
+    :param year_max: last year of the window
+    :return: co2 data of the window as dictionary (dataframe, indexes, matrices)
+    """
+    co2_data_index_columns = config['data_information']['co2_data_index_columns']
+    co2_data_grouping_columns = [option['value'].split('#')[1]
+                                 for option in config['dash_information']['04_input_ddl_grouping_options']
+                                 if option['value'].split('#')[0] == 'grouping']
+
+    with profile_stage(f'co2_data {year_min}-{year_max}: read partitions') as stage:
+        df = read_co2_partitions(config['filepaths']['owid_co2_partitions'], year_min, year_max)
+        stage['output'] = df
+    with profile_stage(f'co2_data {year_min}-{year_max}: build indexes') as stage:
+        df, indexes = co2_data_build_indexes(df, co2_data_index_columns)
+        stage['output'] = indexes
+    with profile_stage(f'co2_data {year_min}-{year_max}: build matrices') as stage:
+        matrices = co2_data_build_year_matrices(df, co2_data_grouping_columns)
+        stage['output'] = matrices
+
+    return {'df': df, 'indexes': indexes, 'matrices': matrices}
+
+
+def create_datasets(config):
+    """
+    Creates lazy handles for all datasets of the dashboard. Nothing is loaded until a handle is used.
+
+    :param config: configuration data
+    :return: dictionary of dataset handles
+    """
+    filepaths = config['filepaths']
+    data_information = config['data_information']
+
+    # year window of the default views and (if full history is enabled) of the whole enriched dataset
+    co2_data_default_years = data_information['co2_data_default_years']
+    if data_information['co2_data_full_history']:
+        co2_data_enriched_years = data_information['co2_data_history_years']
+    else:
+        co2_data_enriched_years = co2_data_default_years
+
+    co2_data_source_files = [filepaths['owid_co2_data'], filepaths['country_continent_mappings'],
+                             filepaths['country_grouping_mappings']]
+    co2_data_settings = [data_information['co2_data_columns'], data_information['co2_data_na_columns'],
+                         data_information['co2_data_drop_cc_combinations'], co2_data_enriched_years,
+                         data_information['co2_data_partition_years']]
+
+    datasets = {}
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # GLOBAL TEMPERATURE ANOMALIES: NASA FILE (original: nc; edited: json)
+    datasets['anomaly_data'] = LazyDataset(
+        'anomaly_data', lambda: read_nasa_file(filepaths['nasa_nc_data'], filepaths['nasa_json_data']))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # GEOJSON FOR COUNTRY BORDERS (needed columns only, cached as GeoParquet, only re-read if the GeoJSON has changed)
+    def load_geo_data():
+        geo_data_columns = data_information['geo_data_columns']
+        fingerprint = create_fingerprint([filepaths['geo_data']], geo_data_columns)
+
+        with profile_stage('geo_data: read cache') as stage:
+            gdf = read_geo_cache(filepaths['geo_data_cache'], fingerprint, geo_data_columns)
+            stage['output'] = gdf
+
+        if gdf is None:
+            with profile_stage('geo_data: read geojson') as stage:
+                gdf = read_geo_data(filepaths['geo_data'], geo_data_columns)
+                stage['output'] = gdf
+            write_geo_cache(gdf, filepaths['geo_data_cache'], fingerprint)
+
+        # spatial index built once at load (not on the first query of a callback)
+        with profile_stage('geo_data: spatial index'):
+            gdf.sindex
+
+        return gdf
+
+    datasets['geo_data'] = LazyDataset('geo_data', load_geo_data)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # CO2 DATA CODEBOOK: OWID (Our World In Data)
+    datasets['co2_codebook'] = LazyDataset(
+        'co2_codebook', lambda: read_co2_data_codebook(filepaths['owid_co2_codebook']))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # SOURCES OF THE CO2 DATA ENRICHMENT (only loaded if the partitions are outdated)
+    datasets['co2_raw_data'] = LazyDataset('co2_raw_data', lambda: read_co2_data(filepaths['owid_co2_data']))
+    datasets['cc_mapping'] = LazyDataset(
+        'cc_mapping', lambda: read_cc_mapping(filepaths['country_continent_mappings']))
+    datasets['country_groupings'] = LazyDataset(
+        'country_groupings', lambda: read_country_groupings(filepaths['country_grouping_mappings']))
+
+    def enrich_co2_data(df_co2_raw_data, df_cc_mapping, country_groupings):
+        df_countries_by_income, df_countries_eu, df_countries_oecd = country_groupings
+
+        with profile_stage('co2_enrichment: filter') as stage:
+            df = co2_data_filter(df_co2_raw_data, data_information['co2_data_columns'],
+                                 data_information['co2_data_na_columns'], *co2_data_enriched_years)
+            stage['output'] = df
+        with profile_stage('co2_enrichment: add continents') as stage:
+            df = co2_data_add_continents(df, df_cc_mapping, data_information['co2_data_drop_cc_combinations'])
+            stage['output'] = df
+        with profile_stage('co2_enrichment: add groupings') as stage:
+            df = co2_data_add_groupings(df, df_countries_by_income, df_countries_eu, df_countries_oecd)
+            stage['output'] = df
+        with profile_stage('co2_enrichment: write partitions'):
+            manifest = write_co2_partitions(df, filepaths['owid_co2_partitions'],
+                                            data_information['co2_data_partition_years'],
+                                            create_fingerprint(co2_data_source_files, co2_data_settings))
+
+        # sources are no longer needed once the partitions are written
+        for source in ['co2_raw_data', 'cc_mapping', 'country_groupings']:
+            datasets[source].release()
+
+        return manifest
+
+    datasets['co2_enrichment'] = LazyDataset('co2_enrichment', enrich_co2_data,
+                                             [datasets['co2_raw_data'], datasets['cc_mapping'],
+                                              datasets['country_groupings']])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # ENRICHED CO2 DATA, PARTITIONED BY YEAR RANGES (enrichment only if source data or settings have changed)
+    def load_co2_partitions():
+        manifest = read_co2_partitions_manifest(filepaths['owid_co2_partitions'])
+
+        if manifest is None or manifest['fingerprint'] != create_fingerprint(co2_data_source_files,
+                                                                             co2_data_settings):
+            # sources of the enrichment are loaded concurrently
+            load_datasets([datasets['co2_enrichment']])
+            manifest = datasets['co2_enrichment'].get()
+
+        return manifest
+
+    datasets['co2_partitions'] = LazyDataset('co2_partitions', load_co2_partitions)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # CO2 DATA OF THE DEFAULT YEAR WINDOW, INCLUDING INDEXES AND ENTITY X YEAR MATRICES
+    datasets['co2_data'] = LazyDataset('co2_data', lambda _: read_co2_data_window(config, *co2_data_default_years),
+                                       [datasets['co2_partitions']])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # LATEST YEAR CO2 IMPACT (SORTED, INCLUDING EXTREME VALUES AND LABELS) AND TREEMAP HIERARCHIES
+    def load_co2_impact(co2_data, df_co2_codebook):
+        with profile_stage('co2_impact: build view') as stage:
+            impact_view = co2_data_build_impact_view(co2_data['df'],
+                                                     config['dash_information']['03_df_co2_columns'], df_co2_codebook)
+            stage['output'] = impact_view
+        with profile_stage('co2_impact: build treemap hierarchies') as stage:
+            treemap_hierarchies = co2_data_build_treemap_hierarchies(
+                impact_view['df'], config['dash_information']['03_input_ddl_treemap_options'])
+            stage['output'] = treemap_hierarchies
+
+        return {'view': impact_view, 'treemap_hierarchies': treemap_hierarchies}
+
+    datasets['co2_impact'] = LazyDataset('co2_impact', load_co2_impact,
+                                         [datasets['co2_data'], datasets['co2_codebook']])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # TEMPERATURE ANOMALIES AS PERIOD X GRID CELL MATRIX
+    def load_anomaly_matrix(df_anomaly):
+        with profile_stage('anomaly_matrix: build matrix') as stage:
+            anomaly_matrix = anomaly_data_build_matrix(df_anomaly)
+            stage['output'] = anomaly_matrix
+
+        return anomaly_matrix
+
+    datasets['anomaly_matrix'] = LazyDataset('anomaly_matrix', load_anomaly_matrix, [datasets['anomaly_data']])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # PYRAMID OF COARSER ANOMALY GRIDS (i.e. 4°, 8° AND 16° FOR ZOOMED-OUT MAPS)
+    def load_anomaly_pyramid(anomaly_matrix):
+        with profile_stage('anomaly_pyramid: aggregate levels') as stage:
+            pyramid = anomaly_data_build_pyramid(anomaly_matrix, data_information['anomaly_data_pyramid_factors'])
+            stage['output'] = pyramid
+
+        return pyramid
+
+    datasets['anomaly_pyramid'] = LazyDataset('anomaly_pyramid', load_anomaly_pyramid, [datasets['anomaly_matrix']])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # QUANTILE SKETCHES (FIXED-BIN HISTOGRAMS) OF THE GRID CELL ANOMALIES PER PERIOD
+    def load_anomaly_sketches(anomaly_matrix):
+        with profile_stage('anomaly_sketches: build histograms') as stage:
+            sketches = anomaly_data_build_sketches(anomaly_matrix, data_information['anomaly_data_sketch_bin_width'],
+                                                   data_information['anomaly_data_sketch_range'])
+            stage['output'] = sketches
+
+        return sketches
+
+    datasets['anomaly_sketches'] = LazyDataset('anomaly_sketches', load_anomaly_sketches, [datasets['anomaly_matrix']])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # FRAMES OF THE HEATMAP PLAYBACK (DELTA ENCODED, PER MONTH AND PER YEAR) ON ONE LEVEL OF THE PYRAMID
+    def load_anomaly_playback(anomaly_matrix, pyramid):
+        level = pyramid[config['dash_information']['01_playback']['level']]
+        playback = {'cell_size': level['cell_size'], 'latitudes': level['latitudes'], 'longitudes': level['longitudes']}
+        for step in ['month', 'year']:
+            with profile_stage(f'anomaly_playback: encode frames per {step}') as stage:
+                playback[step] = anomaly_data_encode_frames(level['matrix'], anomaly_matrix['periods'], step)
+                stage['output'] = playback[step]
+
+        return playback
+
+    datasets['anomaly_playback'] = LazyDataset('anomaly_playback', load_anomaly_playback,
+                                               [datasets['anomaly_matrix'], datasets['anomaly_pyramid']])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # TRENDS, LATEST ROLLING MEANS AND CLIMATOLOGY OF THE GRID CELLS (PER LEVEL OF THE PYRAMID)
+    def load_anomaly_statistics(anomaly_matrix, pyramid):
+        rolling_window = data_information['anomaly_data_rolling_window']
+
+        statistics = []
+        for level in pyramid:
+            with profile_stage(f"anomaly_statistics: {level['cell_size']}° grid") as stage:
+                statistics.append({
+                    'trend': anomaly_data_cell_trends(level['matrix'], anomaly_matrix['periods'],
+                                                      data_information['anomaly_data_trend_min_periods']),
+                    # only the latest window is shown (one value per cell, not the whole history)
+                    'rolling_mean': anomaly_data_rolling_means(
+                        level['matrix'][-rolling_window:], rolling_window,
+                        data_information['anomaly_data_rolling_min_periods'])[-1],
+                    'climatology': anomaly_data_climatology(level['matrix'], anomaly_matrix['periods'])})
+                stage['output'] = statistics[-1]
+
+        return statistics
+
+    datasets['anomaly_statistics'] = LazyDataset('anomaly_statistics', load_anomaly_statistics,
+                                                 [datasets['anomaly_matrix'], datasets['anomaly_pyramid']])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # GRID CELL -> COUNTRY MAPPING (spatial join, only rebuilt if the geo data or the grid have changed)
+    def load_grid_country_mapping(anomaly_matrix):
+        grid = [anomaly_matrix['latitudes'].tolist(), anomaly_matrix['longitudes'].tolist(),
+                anomaly_matrix['cell_size']]
+        fingerprint = create_fingerprint([filepaths['geo_data']], grid)
+
+        with profile_stage('grid_country_mapping: read cache') as stage:
+            df_mapping = read_grid_country_mapping(filepaths['grid_country_mapping'], fingerprint)
+            stage['output'] = df_mapping
+
+        if df_mapping is None:
+            with profile_stage('grid_country_mapping: spatial join') as stage:
+                df_mapping = anomaly_data_map_countries(*grid, datasets['geo_data'].get())
+                stage['output'] = df_mapping
+            write_grid_country_mapping(df_mapping, filepaths['grid_country_mapping'], fingerprint)
+
+        return df_mapping
+
+    datasets['grid_country_mapping'] = LazyDataset('grid_country_mapping', load_grid_country_mapping,
+                                                   [datasets['anomaly_matrix']])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # COUNTRY MEAN ANOMALIES (PERIOD X COUNTRY MATRIX, YEARLY MEANS IN THE FORMAT OF THE CO2 DATA)
+    def load_country_anomalies(anomaly_matrix, df_mapping, co2_data):
+        with profile_stage('country_anomalies: build country means') as stage:
+            country_means = anomaly_data_build_country_means(anomaly_matrix, df_mapping)
+            stage['output'] = country_means
+        with profile_stage('country_anomalies: build yearly means') as stage:
+            df_country_keys = anomaly_data_country_keys(country_means['countries'], co2_data['df'],
+                                                        config['dash_information']['01_countryname_changes'])
+            df_yearly = anomaly_data_country_yearly(country_means, df_country_keys)
+            stage['output'] = df_yearly
+
+        return {'countries': df_country_keys, 'periods': country_means['periods'], 'matrix': country_means['matrix'],
+                'yearly': df_yearly}
+
+    datasets['country_anomalies'] = LazyDataset('country_anomalies', load_country_anomalies,
+                                                [datasets['anomaly_matrix'], datasets['grid_country_mapping'],
+                                                 datasets['co2_data']])
+
+    return datasets
@@ -0,0 +1,184 @@
+import importlib
+import json
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS is not recorded there
+    resource = None
+
+_profiling = {'enabled': False, 'stages': [], 'imports': []}
+_profiling_lock = threading.Lock()
+
+
+def enable_profiling():
+    """
+    Enables the startup profiling (stages and imports are recorded from now on)
+
+    :return: no return
+    """
+    _profiling['enabled'] = True
+
+
+def profiling_enabled():
+    """
+    :return: True if the startup profiling is enabled
+    """
+    return _profiling['enabled']
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process
+
+    :return: peak RSS in bytes, None if not available
+    """
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def data_size(value):
+    """
+    Number of rows and bytes of the given data (dataframes, arrays and lists, also nested in dictionaries).
+    For nested data the rows of the largest table and the bytes of all tables are returned.
+
+    :param value: data
+    :return: number of rows, number of bytes
+    """
+    if hasattr(value, 'memory_usage') and hasattr(value, 'index'):
+        memory_usage = value.memory_usage(deep=True)
+        return len(value), int(memory_usage.sum() if hasattr(memory_usage, 'sum') else memory_usage)
+    elif hasattr(value, 'nbytes') and hasattr(value, 'shape'):
+        return (value.shape[0] if value.shape else 1), int(value.nbytes)
+    elif isinstance(value, dict):
+        sizes = [data_size(item) for item in value.values()]
+        return max([size[0] for size in sizes], default=0), sum(size[1] for size in sizes)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        sizes = [data_size(item) for item in value]
+        return max([len(value)] + [size[0] for size in sizes]), sys.getsizeof(value) + sum(size[1] for size in sizes)
+    elif value is None:
+        return 0, 0
+    else:
+        return 0, sys.getsizeof(value)
+
+
+@contextmanager
+def profile_stage(name):
+    """
+    Records wall time, CPU time (of the current thread), peak RSS delta and output size of a loading or
+    enrichment stage, if the profiling is enabled. The output of the stage can be set via stage['output'].
+
+    :param name: name of the stage
+    :return: stage (dictionary)
+    """
+    stage = {}
+    if not _profiling['enabled']:
+        yield stage
+        return
+
+    peak_rss_before = peak_rss()
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.thread_time()
+    try:
+        yield stage
+    finally:
+        wall_time = time.perf_counter() - start_wall_time
+        cpu_time = time.thread_time() - start_cpu_time
+        peak_rss_after = peak_rss()
+        rows, size = data_size(stage.pop('output', None))
+
+        with _profiling_lock:
+            _profiling['stages'].append({
+                'name': name,
+                'thread': threading.current_thread().name,
+                'wall_time': round(wall_time, 4),
+                'cpu_time': round(cpu_time, 4),
+                # process-wide peak, concurrently running stages are included
+                'peak_rss_delta': None if peak_rss_before is None else peak_rss_after - peak_rss_before,
+                'rows': rows,
+                'bytes': size,
+            })
+
+
+def profile_imports(modules):
+    """
+    Imports the given (heavy) libraries and records their import times.
+    Modules are imported in the given order, so the time of an import excludes the already imported libraries.
+
+    :param modules: names of the modules
+    :return: no return
+    """
+    for module in modules:
+        already_imported = module in sys.modules
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+            error = None
+        except ImportError as e:
+            error = str(e)
+
+        _profiling['imports'].append({'module': module,
+                                      'import_time': round(time.perf_counter() - start, 4),
+                                      'already_imported': already_imported,
+                                      'version': getattr(sys.modules.get(module), '__version__', None),
+                                      'error': error})
+
+
+def create_profile_report():
+    """
+    Creates the report of the startup profiling (machine-readable, i.e. to compare releases)
+
+    :return: report as dictionary
+    """
+    with _profiling_lock:
+        stages = sorted(_profiling['stages'], key=lambda stage: -stage['wall_time'])
+
+    return {'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'peak_rss': peak_rss(),
+            'imports': sorted(_profiling['imports'], key=lambda item: -item['import_time']),
+            'stages': stages}
+
+
+def print_profile_report(report):
+    """
+    Prints ranked summary of the startup profiling (slowest imports and stages first)
+
+    :param report: report (see create_profile_report)
+    :return: no return
+    """
+    print('Startup profile: imports')
+    for item in report['imports']:
+        print(f"  {item['module']:<30} {item['import_time']:>8.3f}s  {item['version'] or item['error'] or ''}")
+
+    print('Startup profile: stages (wall time, CPU time, peak RSS delta, rows, size)')
+    for stage in report['stages']:
+        peak_rss_delta = '' if stage['peak_rss_delta'] is None else f"{stage['peak_rss_delta'] / 1e6:>9.1f}MB"
+        print(f"  {stage['name']:<40} {stage['wall_time']:>8.3f}s {stage['cpu_time']:>8.3f}s {peak_rss_delta:>11}"
+              f" {stage['rows']:>10} {stage['bytes'] / 1e6:>9.1f}MB")
+
+
+def write_profile_report(report, filepath):
+    """
+    Writes report of the startup profiling as JSON-File
+
+    :param report: report (see create_profile_report)
+    :param filepath: filepath to JSON-File
+    :return: no return
+    """
+    file = Path(filepath)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    with open(file, 'w') as report_file:
+        json.dump(report, report_file, indent=2)